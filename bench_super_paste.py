@@ -0,0 +1,405 @@
+"""
+Benchmarks for super_paste. Run from the repo root:
+
+    python bench_super_paste.py            # run everything, compare to the baseline
+    python bench_super_paste.py --save     # ... and make this run the new baseline
+    python bench_super_paste.py --quick    # smaller inputs, for a fast sanity check
+    python bench_super_paste.py --count 5000000  # throughput over millions of inputs
+
+Save a baseline on the last release before changing anything, then run again
+afterwards to see what got faster or slower.
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+
+import src.super_paste
+from src.client import request
+from src.daemon import PasteServer
+from src.patterns import ISSUE_TAG, parse_markdown_link, scan
+from src.projects import load_projects
+from src.rules import compile_rules
+from src.super_paste import (
+    _process_url,
+    find_issue_tag,
+    linkify_line,
+    main,
+    paste,
+)
+from test_super_paste import provider_tests
+
+ROOT = Path(__file__).parent
+SCRIPT = ROOT / "src" / "super_paste.py"
+BASELINE = ROOT / "bench_baseline.json"
+
+MB = 1024 * 1024
+
+# every path through `main`, keyed by the provider (or kind of text) it exercises
+CORPUS: Dict[str, List[str]] = {
+    **{tag: [url for url, _ in tests] for tag, tests in provider_tests.items()},
+    "jira": [
+        "https://test.atlassian.net/browse/PROJECT-3536",
+        "https://test.atlassian.net/secure/RapidBoard.jspa?rapidView=13&projectKey=PDE&view=planning&selectedIssue=PDE-2572&issueLimit=100",
+    ],
+    "text": ["the issue was PDE-123", "go/thing", "just some text"],
+}
+
+# inputs that would make a naive regex backtrack. Each is repeated to size
+PATHOLOGICAL: Dict[str, str] = {
+    "brackets": "[",
+    "bracket-parens": "](",
+    "unclosed-links": "[a](",
+    "capitals": "A",
+    "backticks": "`",
+    "caps-and-dashes": "AB-",
+    "angle-urls": "<https://",
+}
+
+PARSERS: Dict[str, Callable[[str], object]] = {
+    "find_issue_tag": find_issue_tag,
+    "parse_markdown_link": parse_markdown_link,
+    "scan": lambda text: sum(1 for _ in scan(text)),
+    "linkify_line": linkify_line,
+    "main": main,
+}
+
+WORDS = ["fix", "login", "api", "docs", "cache", "retry", "build", "deploy"]
+
+
+def synthetic_inputs(count: int, seed: int = 0) -> Iterator[str]:
+    """
+    Realistic looking clipboards, in roughly the mix people paste them: mostly
+    github and jira, some other providers, some plain text.
+    """
+    rng = random.Random(seed)
+
+    def w() -> str:
+        return rng.choice(WORDS)
+
+    def n(high: int) -> int:
+        return rng.randint(1, high)
+
+    makers: List[Callable[[], str]] = [
+        lambda: f"https://github.com/{w()}/{w()}-{w()}/pull/{n(9999)}",
+        lambda: f"https://github.com/{w()}/{w()}/issues/{n(9999)}",
+        lambda: f"https://github.com/{w()}/{w()}/blob/main/src/{w()}.py#L{n(500)}",
+        lambda: f"https://test.atlassian.net/browse/{w().upper()}-{n(9999)}",
+        lambda: f"https://gitlab.com/{w()}/{w()}/-/merge_requests/{n(999)}",
+        lambda: f"https://{w()}.slack.com/archives/C{n(10**7)}",
+        lambda: f"https://{w()}.com/{w()}?q={w()}",
+        lambda: f"{w().upper()}-{n(9999)}",
+        lambda: f"{w()} {w()} {w()}",
+    ]
+    weights = [30, 10, 10, 20, 5, 5, 10, 5, 5]
+
+    for _ in range(count):
+        yield rng.choices(makers, weights)[0]()
+
+
+def timed(func: Callable[[str], object], text: str) -> float:
+    start = time.perf_counter()
+    try:
+        func(text)
+    except ValueError:
+        # unformattable input is a fine outcome, as long as it's fast
+        pass
+    return time.perf_counter() - start
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def bench_providers(repeat: int) -> Dict[str, float]:
+    """
+    Per-call latency of `main` for every provider path, in microseconds.
+    """
+    results = {}
+    for provider, inputs in CORPUS.items():
+        samples = [timed(main, text) for _ in range(repeat) for text in inputs]
+        for pct in (50, 99):
+            results[f"main[{provider}] p{pct} us"] = percentile(samples, pct) * 1e6
+    return results
+
+
+def bench_allocations() -> Dict[str, float]:
+    """
+    Bytes allocated at peak during a single call of `main`, for each provider
+    path, averaged over its inputs. Lower means fewer temporary objects.
+    """
+    results = {}
+    for provider, inputs in CORPUS.items():
+        # warm up, so one-off caches (like compiled regexes) aren't counted
+        for text in inputs:
+            main(text)
+
+        tracemalloc.start()
+        total = 0
+        for text in inputs:
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            main(text)
+            total += tracemalloc.get_traced_memory()[1] - before
+        tracemalloc.stop()
+        results[f"main[{provider}] peak bytes"] = total / len(inputs)
+    return results
+
+
+def bench_throughput(count: int) -> Dict[str, float]:
+    inputs = list(synthetic_inputs(count))
+    start = time.perf_counter()
+    for text in inputs:
+        main(text)
+    elapsed = time.perf_counter() - start
+    return {"main calls/sec": count / elapsed}
+
+
+def bench_bulk(count: int, passes: int = 3) -> Dict[str, float]:
+    """
+    Steady-state cost of formatting a url, as in a long `--bulk` run: the same
+    mix of urls, over and over, in a warm process. The best pass is reported,
+    since it's the least disturbed by everything else on the machine.
+    """
+    urls = [text for text in synthetic_inputs(count) if text.startswith("http")]
+    for url in urls[:1000]:
+        _process_url(url)
+
+    best = float("inf")
+    for _ in range(passes):
+        start = time.perf_counter()
+        for url in urls:
+            _process_url(url)
+        best = min(best, time.perf_counter() - start)
+    return {"bulk _process_url ns": best / len(urls) * 1e9}
+
+
+def bench_memory(count: int) -> Dict[str, float]:
+    """
+    Peak memory allocated while formatting a stream of inputs. Inputs are
+    generated lazily, so this is (almost) entirely super_paste's own usage.
+    """
+    tracemalloc.start()
+    for text in synthetic_inputs(count):
+        main(text)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"main peak KB": peak / 1024}
+
+
+def bench_cold_start(runs: int) -> Dict[str, float]:
+    """
+    How long a paste takes from Alfred's point of view: a brand new process.
+    """
+    results = {}
+    for kind, text in [("url", CORPUS["github"][0]), ("text", "ABC-123")]:
+        samples = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run(
+                [sys.executable, str(SCRIPT), text], check=True, capture_output=True
+            )
+            samples.append(time.perf_counter() - start)
+        results[f"cold start[{kind}] p50 ms"] = percentile(samples, 50) * 1000
+    return results
+
+
+def bench_daemon(runs: int) -> Dict[str, float]:
+    """
+    Round trip latency of a paste against a warm daemon. This doesn't include
+    starting the client's own interpreter.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.sock")
+        server = PasteServer(path)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+
+        try:
+            samples = [
+                timed(lambda text: request(text, path), CORPUS["github"][0])
+                for _ in range(runs)
+            ]
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+    return {
+        "daemon round trip p50 ms": percentile(samples, 50) * 1000,
+        "daemon round trip p99 ms": percentile(samples, 99) * 1000,
+    }
+
+
+def bench_rules(repeat: int, rule_count: int = 500) -> Dict[str, float]:
+    """
+    Per-call latency of `main` with a large set of declarative rules loaded,
+    for a url a rule matches and for one that falls through to the providers.
+    Compare with `main[github]` to see what the rules cost.
+    """
+    rules = compile_rules(
+        [
+            {"host": f"host{i}.corp.com", "path": "/{project}/{id}", "tag": "{id}"}
+            for i in range(rule_count)
+        ]
+        + [{"subdomains_of": f"team{i}.corp.com", "tag": "team"} for i in range(50)]
+    )
+    urls = {
+        "matched": f"https://host{rule_count - 1}.corp.com/ops/1234",
+        "unmatched": CORPUS["github"][0],
+    }
+
+    results = {}
+    original = src.super_paste._rules, src.super_paste._rules_loaded
+    src.super_paste._rules, src.super_paste._rules_loaded = rules, True
+    try:
+        for name, url in urls.items():
+            samples = [timed(main, url) for _ in range(repeat)]
+            results[f"main[rules {name}] p50 us"] = percentile(samples, 50) * 1e6
+    finally:
+        src.super_paste._rules, src.super_paste._rules_loaded = original
+    return results
+
+
+def bench_instances(repeat: int, instance_count: int = 500) -> Dict[str, float]:
+    """
+    Per-call latency of `main` for a Jira url with hundreds of Jira instances
+    configured. Compare with `main[jira]`; it shouldn't depend on the count.
+    """
+    routes = src.super_paste.Routes(
+        src.super_paste.Instance(f"https://jira{i}.corp.com", "{issue}")
+        for i in range(instance_count)
+    )
+    url = f"https://jira{instance_count - 1}.corp.com/browse/ABC-123"
+
+    original = src.super_paste.JIRA_ROUTES
+    src.super_paste.JIRA_ROUTES = routes
+    try:
+        samples = [timed(main, url) for _ in range(repeat)]
+    finally:
+        src.super_paste.JIRA_ROUTES = original
+    return {f"main[{instance_count} jiras] p50 us": percentile(samples, 50) * 1e6}
+
+
+def bench_issue_keys(size_mb: int, project_count: int = 500) -> Dict[str, float]:
+    """
+    Finding every jira tag in a big log, with the plain regex and with a list
+    of known projects (which also skips things like UTF-8), in ms per MB.
+    """
+    index = load_projects(
+        [f"P{i}" for i in range(project_count)] + ["ABC"], "https://x.atlassian.net"
+    )
+    line = "INFO 12:00:01 UTF-8 decode ok for ABC-123 (SHA-256 abcdef) see P42-7\n"
+    text = line * (size_mb * MB // len(line))
+
+    finders: Dict[str, Callable[[str], object]] = {
+        "regex": lambda text: sum(1 for _ in ISSUE_TAG.finditer(text)),
+        "projects": lambda text: sum(1 for _ in index.find_all(text)),
+    }
+    return {
+        f"find issues[{name}] ms/MB": timed(finder, text) * 1000 / size_mb
+        for name, finder in finders.items()
+    }
+
+
+def bench_clipboard_sizes(max_mb: int) -> Dict[str, float]:
+    """
+    How long a paste takes for big clipboards: logs (which should come back
+    untouched, in the same time regardless of size) and a single long url.
+    """
+    line = "2024-01-01 12:00:00 INFO ABC-123 GET https://api.neat.com/v1 200\n"
+    kinds: Dict[str, Callable[[int], str]] = {
+        "log": lambda size: line * (size // len(line)),
+        "url": lambda size: "https://neat.com/?q=" + "a" * size,
+    }
+
+    results = {}
+    sizes = {"1KB": 1024, "1MB": MB, f"{max_mb}MB": max_mb * MB}
+    for kind, make in kinds.items():
+        for label, size in sizes.items():
+            text = make(size)
+            results[f"paste[{kind} {label}] ms"] = timed(paste, text) * 1000
+            del text
+    return results
+
+
+def bench_linear(max_mb: int) -> Dict[str, float]:
+    """
+    Times each parser on growing pathological inputs. If they're linear, the
+    time per MB stays flat as the input grows; the reported number is the
+    ratio of the largest input's time per MB to the smallest's (~1 is good).
+    """
+    results = {}
+    for parser_name, parser in PARSERS.items():
+        for input_name, chunk in PATHOLOGICAL.items():
+            per_mb = []
+            for size in (1, max_mb):
+                text = "[" + chunk * (size * MB // len(chunk))
+                per_mb.append(timed(parser, text) / size)
+            results[f"{parser_name}[{input_name}] growth"] = per_mb[1] / per_mb[0]
+    return results
+
+
+# for everything else, lower is better
+HIGHER_IS_BETTER = {"main calls/sec"}
+
+
+def compare(results: Dict[str, float], baseline: Dict[str, float]) -> None:
+    print(f"{'metric':<48} {'baseline':>12} {'now':>12} {'change':>8}")
+    for name, value in results.items():
+        if name not in baseline:
+            print(f"{name:<48} {'':>12} {value:>12.2f}")
+            continue
+
+        old = baseline[name]
+        change = (value - old) / old * 100 if old else 0
+        if name in HIGHER_IS_BETTER:
+            change = -change
+        # positive is always worse
+        flag = " !" if change > 10 else ""
+        print(f"{name:<48} {old:>12.2f} {value:>12.2f} {change:>+7.0f}%{flag}")
+
+
+def run(quick: bool, count: Optional[int] = None) -> Dict[str, float]:
+    scale = 1 if quick else 10
+    results: Dict[str, float] = {}
+    results.update(bench_providers(repeat=100 * scale))
+    results.update(bench_allocations())
+    results.update(bench_rules(repeat=1000 * scale))
+    results.update(bench_instances(repeat=1000 * scale))
+    results.update(bench_issue_keys(size_mb=2 if quick else 20))
+    results.update(bench_throughput(count=count or 10_000 * scale))
+    results.update(bench_bulk(count=100_000 * scale))
+    results.update(bench_memory(count=1_000 * scale))
+    results.update(bench_cold_start(runs=5 * scale))
+    results.update(bench_daemon(runs=200 * scale))
+    results.update(bench_clipboard_sizes(max_mb=10 if quick else 100))
+    # linear behavior only shows up with a real spread of sizes
+    results.update(bench_linear(max_mb=2 if quick else 10))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="benchmarks for super_paste")
+    parser.add_argument("--save", action="store_true", help="save as the baseline")
+    parser.add_argument("--quick", action="store_true", help="use smaller inputs")
+    parser.add_argument("--count", type=int, help="inputs for the throughput run")
+    args = parser.parse_args()
+
+    results = run(args.quick, args.count)
+    baseline = json.loads(BASELINE.read_text()) if BASELINE.exists() else {}
+    compare(results, baseline)
+
+    if args.save:
+        BASELINE.write_text(json.dumps(results, indent=2))
+        print(f"saved baseline to {BASELINE}")
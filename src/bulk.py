@@ -0,0 +1,164 @@
+"""
+Formats lots of inputs at once (say, every link in a wiki export) by spreading
+them across a pool of processes.
+
+Inputs are sent to workers in batches, since formatting one link is much
+quicker than handing it to another process. Results come back in the same
+order as the inputs, and only a few batches are in flight at once, so memory
+stays flat no matter how many inputs there are.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+try:
+    # deployed setup, everything is top-level
+    import super_paste
+    from canonical import Deduper, canonical_key, canonical_url, for_input, reusable
+except ImportError:
+    # testing setup, everything in a subdir
+    from . import super_paste
+    from .canonical import Deduper, canonical_key, canonical_url, for_input, reusable
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import (
+        Callable,
+        Deque,
+        Dict,
+        Iterable,
+        Iterator,
+        List,
+        Optional,
+        Tuple,
+    )
+
+DEFAULT_BATCH_SIZE = 1000
+# with dedup on, how many inputs are canonicalized before their new links are
+# sent off to be formatted
+DEDUP_WINDOW = 100_000
+
+
+class WorkerStats:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    @property
+    def per_second(self) -> float:
+        return self.count / self.seconds if self.seconds else 0.0
+
+
+def _convert(input_: str) -> str:
+    # same rule as documents: one bad input shouldn't stop the whole run
+    try:
+        return super_paste.main(input_)
+    except ValueError:
+        return input_
+
+
+def _convert_batch(batch: List[str]) -> Tuple[int, float, List[str]]:
+    """
+    Runs in a worker. Returns the worker's pid and how long the batch took
+    along with the results, for per-worker stats.
+    """
+    start = time.perf_counter()
+    res = [_convert(input_) for input_ in batch]
+    return os.getpid(), time.perf_counter() - start, res
+
+
+def _batches(inputs: Iterable[str], size: int) -> Iterator[List[str]]:
+    it = iter(inputs)
+    while batch := list(islice(it, size)):
+        yield batch
+
+
+def _convert_unique(
+    inputs: Iterable[str],
+    convert: Callable[[Iterable[str]], Iterator[str]],
+    deduper: Deduper,
+) -> Iterator[str]:
+    """
+    Formats the canonical form of each input, but only the first time that
+    form is seen; every input with that form reuses the result (see
+    `reusable`), so the output is the same as without deduping.
+    """
+    for window in _batches(inputs, DEDUP_WINDOW):
+        keys = []
+        # key -> canonical form, for links this run hasn't seen yet
+        new: Dict[bytes, str] = {}
+        for input_ in window:
+            canonical = canonical_url(input_)
+            keys.append(key := canonical_key(canonical))
+            if key not in new and deduper.get(key) is None:
+                new[key] = canonical
+
+        fresh = {
+            key: reusable(canonical, res)
+            for (key, canonical), res in zip(new.items(), convert(new.values()))
+        }
+        deduper.total += len(window)
+        deduper.formatted += len(fresh)
+        for input_, key in zip(window, keys):
+            reused = fresh.get(key) or deduper.get(key)
+            yield for_input(input_, reused)  # type: ignore
+
+        for key, reused in fresh.items():
+            deduper.set(key, reused)
+
+
+def convert_many(
+    inputs: Iterable[str],
+    jobs: Optional[int] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    stats: Optional[Dict[int, WorkerStats]] = None,
+    deduper: Optional[Deduper] = None,
+) -> Iterator[str]:
+    """
+    Formats each input like `main` does, across `jobs` processes (default: one
+    per CPU). Inputs that can't be formatted come back unchanged. If `stats`
+    is given, it's filled with a `WorkerStats` per worker pid. With a
+    `deduper`, each distinct link (see canonical.py) is only formatted once.
+    """
+    jobs = jobs or os.cpu_count() or 1
+    if stats is None:
+        stats = {}
+
+    def record(pid: int, seconds: float, results: List[str]) -> List[str]:
+        worker = stats.setdefault(pid, WorkerStats())
+        worker.count += len(results)
+        worker.seconds += seconds
+        return results
+
+    def convert_inline(inputs: Iterable[str]) -> Iterator[str]:
+        for batch in _batches(inputs, batch_size):
+            yield from record(*_convert_batch(batch))
+
+    def convert_in_pool(inputs: Iterable[str]) -> Iterator[str]:
+        assert pool is not None
+        pending: Deque = deque()
+        for batch in _batches(inputs, batch_size):
+            pending.append(pool.submit(_convert_batch, batch))
+            # enough to keep every worker busy, without reading ahead forever
+            if len(pending) >= jobs * 2:
+                yield from record(*pending.popleft().result())
+
+        while pending:
+            yield from record(*pending.popleft().result())
+
+    # with one job, it's not worth starting a pool
+    pool = ProcessPoolExecutor(jobs) if jobs > 1 else None
+    convert = convert_inline if pool is None else convert_in_pool
+    try:
+        if deduper is None:
+            yield from convert(inputs)
+        else:
+            yield from _convert_unique(inputs, convert, deduper)
+    finally:
+        if pool is not None:
+            pool.shutdown()
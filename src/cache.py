@@ -0,0 +1,187 @@
+"""
+Remembers what super_paste produced for a given input, so repeat pastes of the
+same link skip the formatting (and any slow `custom_url`/`custom_text` hooks).
+
+Results live in memory for the life of the process (which matters for the
+daemon) and in a small SQLite file that's shared by every paste. SQLite
+handles the locking, so concurrent pastes can't corrupt it. Inputs and
+outputs are stored as UTF-8 bytes rather than text, since a clipboard that
+isn't valid UTF-8 comes in with surrogates that SQLite won't take as text.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Dict, Iterable, Optional, Tuple
+
+DEFAULT_MAX_ENTRIES = 1000
+DEFAULT_TTL = 7 * 24 * 60 * 60  # a week, in seconds
+
+
+def _encode(text: str) -> bytes:
+    return text.encode("utf-8", "surrogateescape")
+
+
+def fingerprint(paths: Iterable[str], stamped: Iterable[str] = ()) -> str:
+    """
+    A hash of the files that determine what a paste produces. Any edit to the
+    config (urls, hooks, anything) gets a new fingerprint, which empties the
+    cache. `stamped` files are too big to read, so only their size and mtime
+    count. Missing files hash as empty.
+    """
+    digest = hashlib.sha1()
+    for path in paths:
+        try:
+            with open(path, "rb") as f:
+                digest.update(f.read())
+        except OSError:
+            pass
+        digest.update(b"\0")
+    for path in stamped:
+        try:
+            stat = os.stat(path)
+            digest.update(f"{stat.st_size}:{stat.st_mtime_ns}".encode())
+        except OSError:
+            pass
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    A bounded LRU cache of `input -> output`. Entries older than `ttl` seconds
+    are ignored, and once there are more than `max_entries`, the least recently
+    used are dropped.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        fingerprint: str,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        ttl: float = DEFAULT_TTL,
+    ):
+        self.fingerprint = fingerprint
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # input -> (output, created)
+        self._memory: OrderedDict[str, Tuple[str, float]] = OrderedDict()
+
+        # wait on other pastes rather than failing
+        self._db = sqlite3.connect(path, timeout=5, isolation_level=None)
+        self._db.executescript(
+            """
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+            CREATE TABLE IF NOT EXISTS results (
+                input BLOB PRIMARY KEY,
+                output BLOB NOT NULL,
+                fingerprint TEXT NOT NULL,
+                created REAL NOT NULL,
+                used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS results_used ON results (used);
+            CREATE TABLE IF NOT EXISTS counters (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            );
+            """
+        )
+
+    def get(self, input_: str) -> Optional[str]:
+        now = time.time()
+
+        if input_ in self._memory:
+            output, created = self._memory[input_]
+            if now - created < self.ttl:
+                self._memory.move_to_end(input_)
+                self._hit(input_, now)
+                return output
+            del self._memory[input_]
+
+        row = self._db.execute(
+            "SELECT output, created FROM results WHERE input = ? AND fingerprint = ?",
+            (_encode(input_), self.fingerprint),
+        ).fetchone()
+        # rows from before inputs were stored as bytes never match, and age out
+        if row and now - row[1] < self.ttl:
+            output = row[0].decode("utf-8", "surrogateescape")
+            self._remember(input_, output, row[1])
+            self._hit(input_, now)
+            return output
+
+        self._count("misses")
+        return None
+
+    def set(self, input_: str, output: str) -> None:
+        now = time.time()
+        self._remember(input_, output, now)
+
+        with self._db:
+            self._db.execute("BEGIN IMMEDIATE")
+            self._db.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)",
+                (_encode(input_), _encode(output), self.fingerprint, now, now),
+            )
+            # results from an old config will never be used again
+            self._db.execute(
+                "DELETE FROM results WHERE fingerprint != ? OR created < ?",
+                (self.fingerprint, now - self.ttl),
+            )
+            self._db.execute(
+                """
+                DELETE FROM results WHERE input IN (
+                    SELECT input FROM results ORDER BY used DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,),
+            )
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Hit and miss counts across every paste (not just this process), plus
+        how many entries are stored.
+        """
+        res = {"hits": 0, "misses": 0}
+        res.update(self._db.execute("SELECT name, value FROM counters"))
+        (res["entries"],) = self._db.execute(
+            "SELECT COUNT(*) FROM results WHERE fingerprint = ?", (self.fingerprint,)
+        ).fetchone()
+        return res
+
+    def clear(self) -> None:
+        self._memory.clear()
+        self._db.execute("DELETE FROM results")
+        self._db.execute("DELETE FROM counters")
+
+    def close(self) -> None:
+        self._db.close()
+
+    def _remember(self, input_: str, output: str, created: float) -> None:
+        self._memory[input_] = (output, created)
+        self._memory.move_to_end(input_)
+        if len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _hit(self, input_: str, now: float) -> None:
+        # other processes need to know this entry is still in use
+        self._db.execute(
+            "UPDATE results SET used = ? WHERE input = ?", (now, _encode(input_))
+        )
+        self._count("hits")
+
+    def _count(self, name: str) -> None:
+        self._db.execute(
+            """
+            INSERT INTO counters VALUES (?, 1)
+            ON CONFLICT (name) DO UPDATE SET value = value + 1
+            """,
+            (name,),
+        )
@@ -0,0 +1,174 @@
+"""
+Canonical forms of links, so different spellings of the same link can be
+formatted once in a bulk run.
+
+The same Jira issue shows up as `/browse/PDE-2572` and as a board url with
+`selectedIssue=PDE-2572`; GitHub links differ by a `#issuecomment-...` or a
+query string. Spellings only share a canonical form when formatting it gets
+the same link text, so deduping never changes the output: each spelling keeps
+its own href (see `reusable`), except for Jira, where every spelling links
+to `/browse/<tag>` anyway.
+"""
+
+from __future__ import annotations
+
+import hashlib
+
+try:
+    # deployed setup, everything is top-level
+    import super_paste
+    from urls import parse_url
+except ImportError:
+    # testing setup, everything in a subdir
+    from . import super_paste
+    from .urls import parse_url
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Dict, Optional, Tuple
+
+    try:
+        from urls import Url
+    except ImportError:
+        from .urls import Url
+
+    # the link text every spelling shares, or else their shared result; both
+    # `None` means each spelling comes back as it was
+    Reusable = Tuple[Optional[str], Optional[str]]
+
+# enough to tell tens of millions of links apart, at a fraction of their size
+KEY_SIZE = 16
+DEFAULT_MAX_ENTRIES = 10_000_000
+
+
+def _is_jira_issue(url: str, parsed_url: Url) -> bool:
+    return (
+        super_paste._classify_url(parsed_url) is super_paste.JIRA
+        and super_paste.find_issue_tag(url) is not None
+    )
+
+
+def _is_single_link(text: str) -> bool:
+    # anything else (lists, paragraphs, plain tags) is formatted whole
+    return text.startswith(("https://", "http://")) and len(text.split()) == 1
+
+
+def _claimed(url: str, parsed_url: Url) -> bool:
+    # these can put any part of the url in the link text
+    return bool(
+        super_paste.custom_url(url)
+        or super_paste._match_rules(url, parsed_url)
+        or super_paste._match_plugins(url, parsed_url)
+    )
+
+
+def canonical_url(url: str) -> str:
+    """
+    The canonical form of a url (or jira tag, or any other input). Inputs only
+    get a canonical form other than themselves when it's formatted exactly
+    like they are, down to the link text; anything else is left alone.
+    """
+    if not _is_single_link(url):
+        return url
+    parsed_url = parse_url(url)
+    if parsed_url is None or _claimed(url, parsed_url):
+        return url
+
+    provider = super_paste._classify_url(parsed_url)
+    if provider is super_paste.JIRA and super_paste.find_issue_tag(url):
+        # jira links already boil down to `/browse/<tag>`
+        canonical = super_paste._format_jira(url, parsed_url)[1]
+    elif provider is super_paste.GITHUB:
+        # the link text comes from the path, so query strings and comment
+        # anchors usually don't matter
+        canonical = parsed_url.text[: parsed_url.path_end]
+    else:
+        # other providers put more of the url (like gitlab's fragments) in the
+        # link text, or can't format some spellings at all
+        return url
+
+    if canonical == url or not _is_single_link(canonical):
+        return url
+    parsed_canonical = parse_url(canonical)
+    if (
+        parsed_canonical is None
+        or _claimed(canonical, parsed_canonical)
+        or super_paste._classify_url(parsed_canonical) is not provider
+    ):
+        return url
+    # rather than trusting the above, check that nothing it dropped mattered.
+    # Github links are their own href, so only the text has to match
+    text, href = provider.formatter(url, parsed_url)
+    canonical_text, canonical_href = provider.formatter(canonical, parsed_canonical)
+    if canonical_text != text or (
+        provider is super_paste.JIRA and canonical_href != href
+    ):
+        return url
+    return canonical
+
+
+def reusable(canonical: str, res: str) -> Reusable:
+    """
+    What other spellings of `canonical` can reuse from its result `res`.
+    """
+    if res == canonical:
+        # it couldn't be formatted, so neither can they
+        return None, None
+    parsed_url = parse_url(canonical)
+    if parsed_url is not None and _is_jira_issue(canonical, parsed_url):
+        return None, res
+
+    link = super_paste.parse_markdown_link(res)
+    if link and link[1] == canonical and super_paste.markdown_link(*link) == res:
+        return link[0], None
+    # a plain jira tag, say, which formats the same however it's spaced
+    return None, res
+
+
+def for_input(input_: str, reused: Reusable) -> str:
+    """
+    The result for `input_`, from what its canonical form's result left to
+    reuse. Links keep the input's own href, just as if it had been formatted.
+    """
+    text, res = reused
+    if res is not None:
+        return res
+    if text is None:
+        return input_
+    return super_paste.markdown_link(text, input_)
+
+
+def canonical_key(canonical: str) -> bytes:
+    return hashlib.blake2b(
+        canonical.encode("utf-8", "surrogatepass"), digest_size=KEY_SIZE
+    ).digest()
+
+
+class Deduper:
+    """
+    Results for canonical links already formatted in this run, keyed by a
+    hash of the link rather than the link itself, to keep memory down. Once
+    it's holding `max_entries` it starts over, so memory stays bounded on
+    endless inputs.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.results: Dict[bytes, Reusable] = {}
+        self.total = 0
+        self.formatted = 0
+
+    def get(self, key: bytes) -> Optional[Reusable]:
+        return self.results.get(key)
+
+    def set(self, key: bytes, result: Reusable) -> None:
+        if len(self.results) >= self.max_entries:
+            self.results.clear()
+        self.results[key] = result
+
+    @property
+    def ratio(self) -> float:
+        """
+        inputs per formatted link; 1.0 means there were no duplicates
+        """
+        return self.total / self.formatted if self.formatted else 1.0
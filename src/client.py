@@ -0,0 +1,80 @@
+#!/usr/local/bin/python3
+
+"""
+A tiny stand-in for super_paste.py that hands the clipboard to a running
+daemon (see daemon.py), so the paste doesn't pay for loading everything. If
+there's no daemon around, it does the work itself.
+
+This file should stay small and only import things that load quickly.
+"""
+
+import socket
+import sys
+
+try:
+    # deployed setup, everything is top-level
+    import config
+    from paths import SOCKET_PATH
+except ImportError:
+    # testing setup, everything in a subdir
+    from . import config
+    from .paths import SOCKET_PATH
+
+# if the daemon is wedged, it's faster to do the work ourselves
+TIMEOUT = 0.5
+
+
+def _timeout() -> float:
+    """
+    How long to wait on the daemon. A paste that fetches a page title can
+    spend up to TITLE_TIMEOUT on that alone, and giving up partway would only
+    mean fetching it again in-process.
+    """
+    if getattr(config, "FETCH_TITLES", False):
+        return TIMEOUT + getattr(config, "TITLE_TIMEOUT", 1.0)
+    return TIMEOUT
+
+
+def request(text: str, path: str = SOCKET_PATH) -> str:
+    """
+    Sends text to the daemon and returns its response. Raises `OSError` if the
+    daemon isn't running or doesn't answer in time.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(_timeout())
+        sock.connect(path)
+        # clipboards that aren't valid UTF-8 come through stdin as surrogates
+        sock.sendall(text.encode("utf-8", "surrogateescape"))
+        # signals the end of the input
+        sock.shutdown(socket.SHUT_WR)
+
+        chunks = []
+        while chunk := sock.recv(65536):
+            chunks.append(chunk)
+
+    return b"".join(chunks).decode("utf-8", "surrogateescape")
+
+
+def paste(text: str, path: str = SOCKET_PATH) -> str:
+    try:
+        return request(text, path)
+    except OSError:
+        pass
+
+    try:
+        # deployed setup, everything is top-level
+        from super_paste import paste as paste_in_process
+    except ImportError:
+        # testing setup, everything in a subdir
+        from .super_paste import paste as paste_in_process
+
+    return paste_in_process(text)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.stdout.write(paste(sys.argv[1]))
+    else:
+        # same as `super_paste.py --stdin`, minus streaming huge clipboards
+        data = sys.stdin.buffer.read().decode("utf-8", "surrogateescape")
+        sys.stdout.buffer.write(paste(data).encode("utf-8", "surrogateescape"))
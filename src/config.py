@@ -4,7 +4,16 @@ This file holds custom configuration for an otherwise generic super-paste
 At this time, it recognizes the following variables:
 
 - JIRA_URL
+- JIRA_PROJECTS
+- JIRA_INSTANCES
 - GHE_URL
+- GHE_INSTANCES
+- CACHE_RESULTS
+- FETCH_TITLES
+- TITLE_TIMEOUT
+- TITLE_INDEX
+- TRACE
+- HISTORY
 - process_url
 - process_text
 
@@ -14,7 +23,12 @@ See their docs below for more info about how you can customize super_paste behav
 When you download an update to the workflow, any changes to this file will be lost.
 """
 
-from typing import Optional, Tuple
+from __future__ import annotations
+
+# lets type checkers see these without slowing down every paste
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Optional, Tuple
 
 # The full url (without the trailing slash) of a Jira instance
 # it'll be slotted into urls like "{JIRA_URL}/browse/ABC-123"
@@ -22,15 +36,63 @@ from typing import Optional, Tuple
 # https://confluence.atlassian.com/jirakb/how-to-find-your-site-url-to-set-up-the-jira-data-center-and-server-mobile-app-954244798.html
 JIRA_URL = "https://test.atlassian.net"
 
+# Optionally, the Jira projects you actually use. If set, only tags for these projects
+# are linked (so `UTF-8` stays as it is), and each project can live on its own Jira.
+# This can be a list of project keys (which use JIRA_URL), a dict of key -> Jira url,
+# or the path to a JSON file of either. Jira's own project list works too:
+# save {JIRA_URL}/rest/api/2/project to a file and point this at it.
+JIRA_PROJECTS = None
+
 # If you use a hosted GitHub enterprise server, add its homepage here:
 GHE_URL = "https://hosted.git.test.com"
 
+# If you have more than one Jira or GitHub Enterprise, list the rest here. Each can be
+# a url, or a dict with:
+# - "url": like JIRA_URL or GHE_URL (it can include a path)
+# - "template" (optional): the link text. Jira links can use "{issue}" and "{project}";
+#   GHE pull requests and issues can use "{user}", "{repo}", and "{number}"
+# - "projects" (Jira only, optional): the project keys that live there, so plain tags
+#   like `ABC-123` link to the right Jira
+# JIRA_INSTANCES = [
+#     {"url": "https://jira.corp.com", "template": "{project}: {issue}", "projects": ["OPS"]}
+# ]
+JIRA_INSTANCES = []
+GHE_INSTANCES = []
+
+# Remember the output for recent inputs, so pasting the same link twice is instant.
+# Mostly useful if your custom functions below are slow. The cache is cleared
+# whenever this file changes.
+CACHE_RESULTS = False
+
+# For links to sites super_paste doesn't know about, use the page's title as the link
+# text instead of the domain. This means a network request, so pastes of new links
+# can take up to TITLE_TIMEOUT seconds; titles are cached, so repeats are instant.
+FETCH_TITLES = False
+TITLE_TIMEOUT = 1.0
+
+# Add titles to GitHub, GitLab and Jira links (`user/repo#3: Fix login`), from a local
+# index you fill from exports with `python3 super_paste.py --import-titles dump.json`.
+# Nothing is fetched at paste time.
+TITLE_INDEX = False
+
+# Log how long each part of every paste takes (and any errors, in full) to trace.jsonl
+# in the workflow's cache folder. Run `python3 super_paste.py --stats` for a summary.
+# The log includes the start of each clipboard, so only turn this on while you need it.
+TRACE = False
+
+# Keep a record of recent pastes (what was on the clipboard, and the link it became), so
+# you can find a link again with `python3 super_paste.py --history <text or host>`. The
+# record lives in the workflow's data folder and never grows past about 5MB.
+HISTORY = False
+
 
 def custom_url(url: str) -> Optional[Tuple[str, str]]:
     """
     If you want to create nice links to non-public resources, this function is
     the place to customize that behavior. If you aren't adding a case for the
     incoming url, then return `None` and the default super_paste will take over.
+    (Big clipboards that aren't links, like logs, are pasted back as-is without
+    calling this or `custom_text`.)
 
     If you are returning a custom link, return a 2-tuple of: (link_text, target).
     That will result in a url like `[link_text](target)`.
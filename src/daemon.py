@@ -0,0 +1,123 @@
+#!/usr/local/bin/python3
+
+"""
+Keeps super_paste loaded in a long-running process that listens on a unix
+socket. Pastes made through client.py are then answered without starting a
+new interpreter or importing anything.
+
+Start it with `python3 daemon.py`. Changes to config.py (or the rules file,
+or the installed plugins) are picked up on the next paste.
+"""
+
+import importlib
+import os
+import socketserver
+from typing import Optional
+
+try:
+    # deployed setup, everything is top-level
+    import config
+    import super_paste
+    from client import SOCKET_PATH
+except ImportError:
+    # testing setup, everything in a subdir
+    from . import config, super_paste
+    from .client import SOCKET_PATH
+
+
+def _mtime(path: str) -> Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+class PasteHandler(socketserver.StreamRequestHandler):
+    """
+    Reads the whole clipboard (the client closes its end when it's done
+    writing) and responds with exactly what super_paste.py would print.
+    """
+
+    server: "PasteServer"
+
+    def handle(self):
+        # bytes that aren't UTF-8 are kept as they were, like `--stdin` does
+        text = self.rfile.read().decode("utf-8", "surrogateescape")
+        try:
+            self.server.reload_if_changed()
+            res = super_paste.paste(text)
+        except Exception as e:
+            res = f"! Alfred ERR ! {e}"
+        try:
+            self.wfile.write(res.encode("utf-8", "surrogateescape"))
+        except BrokenPipeError:
+            # the client gave up waiting and is doing the paste itself
+            pass
+
+
+class PasteServer(socketserver.UnixStreamServer):
+    def __init__(
+        self,
+        path: str = SOCKET_PATH,
+        config_path: str = config.__file__,
+        rules_path: str = super_paste.RULES_PATH,
+        manifest_path: str = super_paste.PLUGIN_MANIFEST,
+    ):
+        # left behind by a daemon that didn't shut down cleanly
+        if os.path.exists(path):
+            os.unlink(path)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        super().__init__(path, PasteHandler)
+        os.chmod(path, 0o600)
+
+        self.config_path = config_path
+        self.config_mtime = _mtime(config_path)
+        self.rules_path = rules_path
+        self.rules_mtime = _mtime(rules_path)
+        self.manifest_path = manifest_path
+        self.manifest_mtime = _mtime(manifest_path)
+
+    def reload_if_changed(self) -> None:
+        """
+        Re-imports the config if it, the rules, or the plugin manifest changed
+        since we last looked. A broken config raises here (and on every paste until it's
+        fixed), just like it would when running the script directly.
+        """
+        mtime = _mtime(self.config_path)
+        rules_mtime = _mtime(self.rules_path)
+        manifest_mtime = _mtime(self.manifest_path)
+        if (
+            mtime == self.config_mtime
+            and rules_mtime == self.rules_mtime
+            and manifest_mtime == self.manifest_mtime
+        ):
+            return
+
+        importlib.reload(config)
+        # super_paste copies its settings out of config (and loads the rules
+        # and plugins once), so it needs a fresh copy
+        importlib.reload(super_paste)
+        self.config_mtime = mtime
+        self.rules_mtime = rules_mtime
+        self.manifest_mtime = manifest_mtime
+
+    def server_close(self) -> None:
+        super().server_close()
+        try:
+            # unix socket addresses are paths
+            os.unlink(self.server_address)  # type: ignore
+        except OSError:
+            pass
+
+
+def serve(path: str = SOCKET_PATH) -> None:
+    with PasteServer(path) as server:
+        server.serve_forever()
+
+
+if __name__ == "__main__":
+    try:
+        serve()
+    except KeyboardInterrupt:
+        pass
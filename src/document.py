@@ -0,0 +1,239 @@
+"""
+Keeps markdown files (READMEs, runbooks) linkified as they're edited.
+
+`--stream` scans every line of a document for links. That's fine once, but
+not on every save of a big file where one line changed. So a rewrite
+remembers the lines it produced, as short hashes, and the next rewrite of the
+same file only linkifies the lines that aren't among them: the ones added or
+edited since. Everything else costs a hash and a set lookup.
+
+`rewrite_tree` does the same for a whole folder of notes, one level up: it
+remembers a hash of every file it left behind, and skips files that haven't
+changed since without even opening them. The line hashes of each file are
+kept in the folder's index too, so a folder of thousands of notes is one
+file of state, and a note that's deleted takes its hashes with it. The index
+lives in the folder itself, so it goes away along with the folder.
+
+Linkifying is idempotent (existing links, code, and fenced blocks are left
+alone), so a line that was already rewritten never needs another look, and
+rewriting a file twice in a row changes nothing the second time.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import marshal
+import os
+import time
+
+try:
+    # deployed setup, everything is top-level
+    import super_paste
+    from paths import cache_path
+    from patterns import markdown_lines
+except ImportError:
+    # testing setup, everything in a subdir
+    from . import super_paste
+    from .paths import cache_path
+    from .patterns import markdown_lines
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Any, Dict, Iterable, Iterator, Optional, Set, Tuple
+
+# bump this when the saved format changes, so old state is ignored
+_STATE_VERSION = 2
+# the size of a line's key, from `_line_key`
+_KEY_SIZE = 8
+
+# files that `rewrite_tree` linkifies
+MARKDOWN_EXTENSIONS = (".md", ".markdown")
+# where `rewrite_tree` keeps its index, inside the folder it rewrote
+TREE_INDEX = ".super_paste.marshal"
+# files bigger than this are hashed through mmap instead of being read in
+MMAP_THRESHOLD = 1024 * 1024
+
+# how files are read and written. newline="" keeps line endings exactly as
+# they were, and surrogateescape lets invalid utf-8 through untouched
+_TEXT = {"encoding": "utf-8", "newline": "", "errors": "surrogateescape"}
+
+
+def _line_key(line: str) -> bytes:
+    # lines read with surrogateescape can hold lone surrogates
+    data = line.encode("utf-8", "surrogatepass")
+    return hashlib.blake2b(data, digest_size=_KEY_SIZE).digest()
+
+
+class DocumentRewriter:
+    """
+    Linkifies documents, skipping any line it produced on its last run.
+    """
+
+    def __init__(self, done: Iterable[bytes] = ()):
+        # keys of lines that are already linkified
+        self.done: Set[bytes] = set(done)
+        # how many lines the last run actually had to linkify, and whether any
+        # of them came out different
+        self.rewritten = 0
+        self.changed = False
+
+    def rewrite(self, lines: Iterable[str]) -> Iterator[str]:
+        done = self.done
+        seen: Set[bytes] = set()
+        self.rewritten = 0
+        self.changed = False
+        for line, linkable in markdown_lines(lines):
+            if linkable:
+                key = _line_key(line)
+                if key not in done:
+                    linked = super_paste.linkify_line(line)
+                    self.rewritten += 1
+                    if linked != line:
+                        line, key = linked, _line_key(linked)
+                        self.changed = True
+                seen.add(key)
+            yield line
+        # only lines in the latest version are worth remembering
+        self.done = seen
+
+
+def _state_path(path: str) -> str:
+    name = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()
+    return cache_path(f"rewrite-{name}.marshal")
+
+
+def _load_state(state_path: str, fingerprint: str) -> Tuple[bytes, ...]:
+    try:
+        with open(state_path, "rb") as f:
+            version, saved_fingerprint, done = marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        return ()
+    if version != _STATE_VERSION or saved_fingerprint != fingerprint:
+        # the config changed, so every line might link differently now
+        return ()
+    return done
+
+
+def rewrite_file(path: str, state_path: Optional[str] = None) -> Tuple[int, int]:
+    """
+    Linkifies the markdown file at `path` in place, and returns how many lines
+    it has and how many of them had to be linkified. The file is only replaced
+    if something changed, and then atomically, so an editor never sees half of
+    it.
+    """
+    state_path = state_path or _state_path(path)
+    fingerprint = super_paste.config_fingerprint()
+    rewriter = DocumentRewriter(_load_state(state_path, fingerprint))
+    lines = _rewrite_in_place(path, rewriter)
+    _save(state_path, (_STATE_VERSION, fingerprint, tuple(rewriter.done)))
+
+    return lines, rewriter.rewritten
+
+
+def _rewrite_in_place(path: str, rewriter: DocumentRewriter) -> int:
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    lines = 0
+    try:
+        with open(path, **_TEXT) as in_, open(tmp_path, "w", **_TEXT) as out:
+            for line in rewriter.rewrite(in_):
+                lines += 1
+                out.write(line)
+
+        if rewriter.changed:
+            import shutil
+
+            shutil.copymode(path, tmp_path)
+            os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    return lines
+
+
+def _file_digest(path: str, size: int) -> bytes:
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        if size >= MMAP_THRESHOLD:
+            import mmap
+
+            # hashed straight out of the page cache, without copying it
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                digest.update(mapped)
+        else:
+            digest.update(f.read())
+    return digest.digest()
+
+
+def _markdown_files(root: str) -> Iterator[str]:
+    for dirpath, dirnames, filenames in os.walk(root):
+        # .git and friends
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+        for name in sorted(filenames):
+            if name.endswith(MARKDOWN_EXTENSIONS):
+                yield os.path.join(dirpath, name)
+
+
+def _save(path: str, data: Any) -> None:
+    # written next to the real file and moved into place, so it's never torn
+    with open(f"{path}.{os.getpid()}", "wb") as f:
+        marshal.dump(data, f)
+    os.replace(f"{path}.{os.getpid()}", path)
+
+
+def rewrite_tree(root: str, index_path: Optional[str] = None) -> Dict[str, float]:
+    """
+    Linkifies every markdown file under `root` in place, skipping files that
+    haven't changed since the last run. Unchanged size and mtime means the
+    file wasn't touched; otherwise its contents are hashed, so a file that
+    was only touched (or was rewritten by us) isn't linkified again. Returns
+    counts of files, bytes, and files that got new links, and how long it
+    took.
+    """
+    start = time.perf_counter()
+    index_path = index_path or os.path.join(root, TREE_INDEX)
+    fingerprint = super_paste.config_fingerprint()
+
+    # relative path -> (mtime_ns, size, digest, line keys) as of the last run.
+    # The keys are joined into one string, which is far smaller to save and
+    # quicker to load than a tuple of them
+    index: Dict[str, Tuple[int, int, bytes, bytes]] = {}
+    try:
+        with open(index_path, "rb") as f:
+            version, saved_fingerprint, saved = marshal.load(f)
+        if version == _STATE_VERSION and saved_fingerprint == fingerprint:
+            index = saved
+    except (OSError, EOFError, ValueError, TypeError):
+        pass
+
+    stats = {"files": 0, "linkified": 0, "bytes": 0}
+    seen: Dict[str, Tuple[int, int, bytes, bytes]] = {}
+    for path in _markdown_files(root):
+        name = os.path.relpath(path, root)
+        stat = os.stat(path)
+        stats["files"] += 1
+        stats["bytes"] += stat.st_size
+
+        old = index.get(name)
+        if old and old[:2] == (stat.st_mtime_ns, stat.st_size):
+            seen[name] = old
+            continue
+
+        digest = _file_digest(path, stat.st_size)
+        keys = old[3] if old else b""
+        if not old or old[2] != digest:
+            rewriter = DocumentRewriter(
+                keys[i : i + _KEY_SIZE] for i in range(0, len(keys), _KEY_SIZE)
+            )
+            _rewrite_in_place(path, rewriter)
+            if rewriter.changed:
+                stats["linkified"] += 1
+                stat = os.stat(path)
+                digest = _file_digest(path, stat.st_size)
+            keys = b"".join(rewriter.done)
+        seen[name] = (stat.st_mtime_ns, stat.st_size, digest, keys)
+
+    # files that were deleted drop out of the index, line keys and all
+    _save(index_path, (_STATE_VERSION, fingerprint, seen))
+    stats["seconds"] = time.perf_counter() - start
+    return stats
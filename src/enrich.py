@@ -0,0 +1,291 @@
+"""
+Fetches page titles, so links to sites super_paste doesn't know about paste as
+`[Some Article](...)` rather than `[neat.com](...)`.
+
+Titles are fetched concurrently with asyncio, reusing keep-alive connections
+to each host, and every request has a deadline; a page that's slow to answer
+just keeps its domain as the link text. Found titles are cached on disk, so
+pasting the same link again doesn't touch the network.
+
+This only uses the standard library, so there's a tiny HTTP/1.1 client here
+rather than a dependency.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import html
+import re
+import ssl
+from urllib.parse import urljoin, urlsplit
+
+try:
+    # deployed setup, everything is top-level
+    from cache import ResultCache
+    from paths import cache_path
+except ImportError:
+    # testing setup, everything in a subdir
+    from .cache import ResultCache
+    from .paths import cache_path
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Dict, Iterable, List, Optional, Tuple
+
+    Key = Tuple[str, str, int]
+    Connection = Tuple[asyncio.StreamReader, asyncio.StreamWriter]
+
+# seconds
+DEFAULT_TIMEOUT = 1.0
+
+# titles are in the <head>, so there's no need to read whole pages
+MAX_BODY_BYTES = 64 * 1024
+MAX_REDIRECTS = 3
+CONNECTIONS_PER_HOST = 4
+REDIRECTS = {301, 302, 303, 307, 308}
+
+TITLE = re.compile(rb"<title[^>]*>([^<]*)</title", re.IGNORECASE)
+
+
+class ConnectionPool:
+    """
+    Keeps idle keep-alive connections per host, and limits how many requests
+    run against one host at once.
+    """
+
+    def __init__(self, per_host: int = CONNECTIONS_PER_HOST):
+        self.per_host = per_host
+        # how many connections were actually opened, which is handy in tests
+        self.opened = 0
+        self._idle: Dict[Key, List[Connection]] = {}
+        self._limits: Dict[Key, asyncio.Semaphore] = {}
+        self._ssl: Optional[ssl.SSLContext] = None
+
+    async def get(self, url: str) -> Tuple[int, Dict[str, str], bytes]:
+        """
+        Makes a GET request, returning the status, headers (with lowercase
+        names) and up to `MAX_BODY_BYTES` of the body.
+        """
+        parts = urlsplit(url)
+        host = parts.hostname or ""
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        key = (parts.scheme, host, port)
+        path = parts.path or "/"
+        if parts.query:
+            path += f"?{parts.query}"
+
+        limit = self._limits.setdefault(key, asyncio.Semaphore(self.per_host))
+        async with limit:
+            conn, reused = await self._connect(key)
+            try:
+                status, headers, body, reusable = await _exchange(*conn, host, path)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                conn[1].close()
+                if not reused:
+                    raise
+                # the server hung up on an idle connection; try a fresh one
+                conn, _ = await self._connect(key, fresh=True)
+                status, headers, body, reusable = await _exchange(*conn, host, path)
+            except BaseException:
+                conn[1].close()
+                raise
+
+            if reusable:
+                self._idle.setdefault(key, []).append(conn)
+            else:
+                conn[1].close()
+
+        return status, headers, body
+
+    async def _connect(
+        self, key: Key, fresh: bool = False
+    ) -> Tuple[Connection, bool]:
+        idle = self._idle.get(key, [])
+        while idle and not fresh:
+            reader, writer = idle.pop()
+            if not reader.at_eof() and not writer.is_closing():
+                return (reader, writer), True
+            writer.close()
+
+        scheme, host, port = key
+        context = None
+        if scheme == "https":
+            context = self._ssl = self._ssl or ssl.create_default_context()
+
+        self.opened += 1
+        return await asyncio.open_connection(host, port, ssl=context), False
+
+    def close(self) -> None:
+        for conns in self._idle.values():
+            for _, writer in conns:
+                writer.close()
+        self._idle.clear()
+
+
+async def _exchange(
+    reader: asyncio.StreamReader, writer: asyncio.StreamWriter, host: str, path: str
+) -> Tuple[int, Dict[str, str], bytes, bool]:
+    """
+    Sends one request and reads the response. The last value is whether the
+    connection can be used for another request.
+    """
+    writer.write(
+        f"GET {path} HTTP/1.1\r\n"
+        f"Host: {host}\r\n"
+        "User-Agent: super_paste\r\n"
+        "Accept: text/html\r\n"
+        "\r\n".encode("latin-1")
+    )
+    await writer.drain()
+
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionResetError("connection closed before a response")
+    version, status, *_ = status_line.decode("latin-1").split(None, 2)
+
+    headers = {}
+    while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        body, complete = await _read_chunked(reader)
+    elif "content-length" in headers:
+        length = int(headers["content-length"])
+        body = await reader.readexactly(min(length, MAX_BODY_BYTES))
+        complete = length <= MAX_BODY_BYTES
+    else:
+        # the body runs until the server closes the connection
+        body = await reader.read(MAX_BODY_BYTES)
+        complete = False
+
+    reusable = (
+        complete
+        and version == "HTTP/1.1"
+        and headers.get("connection", "").lower() != "close"
+    )
+    return int(status), headers, body, reusable
+
+
+async def _read_chunked(reader: asyncio.StreamReader) -> Tuple[bytes, bool]:
+    body = b""
+    while len(body) <= MAX_BODY_BYTES:
+        size = int((await reader.readline()).split(b";")[0], 16)
+        if size == 0:
+            # skip any trailers
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            return body, True
+        body += await reader.readexactly(size)
+        await reader.readexactly(2)  # the chunk's trailing \r\n
+    return body, False
+
+
+def parse_title(body: bytes) -> Optional[str]:
+    if match := TITLE.search(body):
+        title = html.unescape(match.group(1).decode("utf-8", errors="replace"))
+        return " ".join(title.split()) or None
+    return None
+
+
+async def fetch_title(
+    url: str, pool: ConnectionPool, timeout: float = DEFAULT_TIMEOUT
+) -> Optional[str]:
+    """
+    The title of the page at url, following a few redirects. Raises if the
+    request fails or takes longer than `timeout` seconds in total.
+    """
+
+    async def follow() -> Optional[str]:
+        target = url
+        for _ in range(MAX_REDIRECTS + 1):
+            status, headers, body = await pool.get(target)
+            if status in REDIRECTS and "location" in headers:
+                target = urljoin(target, headers["location"])
+                continue
+            if status != 200:
+                # might be temporary, so don't let it be cached
+                raise ValueError(f"got status {status} from {target}")
+            if "html" in headers.get("content-type", "html"):
+                return parse_title(body)
+            return None
+        raise ValueError(f"too many redirects from {url}")
+
+    return await asyncio.wait_for(follow(), timeout)
+
+
+async def fetch_titles_async(
+    urls: Iterable[str], timeout: float, deadline: float
+) -> Dict[str, Optional[str]]:
+    """
+    Fetches every url concurrently. Each gets `timeout` seconds, and anything
+    not done after `deadline` seconds is abandoned. Urls that failed or ran
+    out of time are left out of the result (so they aren't cached); pages
+    that loaded but had no title map to `None`.
+    """
+    pool = ConnectionPool()
+    tasks = {
+        asyncio.ensure_future(fetch_title(url, pool, timeout)): url for url in urls
+    }
+    try:
+        if not tasks:
+            return {}
+        done, pending = await asyncio.wait(list(tasks), timeout=deadline)
+        for task in pending:
+            task.cancel()
+
+        return {
+            tasks[task]: task.result()
+            for task in done
+            if not task.cancelled() and task.exception() is None
+        }
+    finally:
+        pool.close()
+
+
+_title_cache: Optional[ResultCache] = None
+
+
+def _get_title_cache() -> ResultCache:
+    global _title_cache
+    if _title_cache is None:
+        # titles don't depend on the config, so the fingerprint never changes
+        _title_cache = ResultCache(
+            cache_path("titles.sqlite3"),
+            "titles",
+            max_entries=10_000,
+            ttl=30 * 24 * 60 * 60,
+        )
+    return _title_cache
+
+
+def fetch_titles(
+    urls: Iterable[str],
+    timeout: float = DEFAULT_TIMEOUT,
+    deadline: Optional[float] = None,
+    cache: Optional[ResultCache] = None,
+) -> Dict[str, Optional[str]]:
+    """
+    Titles for each url, from the cache where possible. Fetches the rest
+    (see `fetch_titles_async`) and caches what it finds. Urls that couldn't be
+    fetched in time are missing from the result.
+    """
+    cache = cache or _get_title_cache()
+
+    res: Dict[str, Optional[str]] = {}
+    missing = []
+    for url in dict.fromkeys(urls):
+        cached = cache.get(url)
+        if cached is None:
+            missing.append(url)
+        else:
+            # pages without a title are cached as empty strings
+            res[url] = cached or None
+
+    if missing:
+        fetched = asyncio.run(fetch_titles_async(missing, timeout, deadline or timeout))
+        for url, title in fetched.items():
+            cache.set(url, title or "")
+        res.update(fetched)
+
+    return res
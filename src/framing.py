@@ -0,0 +1,56 @@
+"""
+A tiny framed protocol, so one super_paste process can answer any number of
+pastes over a pipe: `python3 super_paste.py --framed`.
+
+Each request and response is a frame: the length of the body in bytes (as
+ASCII digits), a newline, then the body, which is UTF-8:
+
+    21\\nhttps://github.com/a\\n
+
+Unlike splitting on newlines, bodies can contain anything, including
+newlines and whole documents.
+"""
+
+from __future__ import annotations
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import BinaryIO, Optional
+
+# enough digits for any sane clipboard; a longer header means garbage input
+MAX_HEADER = 20
+
+# lets clipboards that aren't valid UTF-8 survive a round trip
+ERRORS = "surrogateescape"
+
+
+def decode(data: bytes) -> str:
+    return data.decode("utf-8", ERRORS)
+
+
+def encode(text: str) -> bytes:
+    return text.encode("utf-8", ERRORS)
+
+
+def read_frame(stream: BinaryIO) -> Optional[bytes]:
+    """
+    The next frame's body, or `None` at the end of the stream. Raises
+    `ValueError` for anything that isn't a valid frame.
+    """
+    header = stream.readline(MAX_HEADER + 1)
+    if not header:
+        return None
+
+    length = header[:-1]
+    if not header.endswith(b"\n") or not length.isdigit():
+        raise ValueError(f"invalid frame header: {header[:MAX_HEADER]!r}")
+
+    body = stream.read(int(length))
+    if len(body) < int(length):
+        raise ValueError(f"frame ended early: got {len(body)} of {int(length)} bytes")
+    return body
+
+
+def write_frame(stream: BinaryIO, body: bytes) -> None:
+    stream.write(b"%d\n" % len(body))
+    stream.write(body)
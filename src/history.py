@@ -0,0 +1,146 @@
+"""
+A record of recent pastes, for finding a link again later.
+
+The history is a single file of fixed-size slots, used as a ring: each paste
+overwrites the oldest slot, so the file never grows past its initial size
+and nothing is ever rewritten or compacted. The file is memory mapped, so a
+paste only writes its own slot and the header.
+
+    header: magic, slot size, slot count, sequence number of the next paste
+    slot:   sequence number (0 if unused), time, payload length, payload
+
+The payload is the provider, link text, host, and input, separated by NULs
+(and cut short to fit the slot). Writers take an exclusive `flock` for the
+few microseconds it takes to claim a slot and fill it in, so concurrent
+pastes (say, the daemon and a script) never land in the same slot or leave a
+half written one; readers take a shared lock.
+"""
+
+from __future__ import annotations
+
+import fcntl
+import mmap
+import os
+import struct
+import time
+from collections import namedtuple
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Iterator, List, Optional
+
+MAGIC = b"SPH1"
+HEADER = struct.Struct("<4sIIQ")
+# room for the header to grow without moving the slots
+HEADER_SIZE = 64
+SLOT = struct.Struct("<QdH")
+
+DEFAULT_SLOTS = 10_000
+DEFAULT_SLOT_SIZE = 512
+# the longest provider, tag, or host kept; the input gets whatever's left
+MAX_FIELD_BYTES = 128
+
+Entry = namedtuple("Entry", ["time", "provider", "tag", "host", "input"])
+
+
+def _encode(text: str, limit: int) -> bytes:
+    # NULs separate fields
+    return text.replace("\0", "").encode("utf-8", "surrogatepass")[:limit]
+
+
+class History:
+    def __init__(
+        self,
+        path: str,
+        slots: int = DEFAULT_SLOTS,
+        slot_size: int = DEFAULT_SLOT_SIZE,
+    ):
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                if os.pread(self._fd, len(MAGIC), 0) in (b"", b"\0" * len(MAGIC)):
+                    # brand new (or never finished being made). The slots are
+                    # all zeroes, which means unused
+                    os.ftruncate(self._fd, HEADER_SIZE + slots * slot_size)
+                    os.pwrite(self._fd, HEADER.pack(MAGIC, slot_size, slots, 1), 0)
+
+                header = os.pread(self._fd, HEADER.size, 0)
+                if len(header) < HEADER.size or not header.startswith(MAGIC):
+                    raise ValueError(f"{path} isn't a paste history file")
+                _, slot_size, slots, _ = HEADER.unpack(header)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+            # an existing file keeps the layout it was made with
+            self.slots = slots
+            self.slot_size = slot_size
+            self._map = mmap.mmap(self._fd, HEADER_SIZE + slots * slot_size)
+        except BaseException:
+            os.close(self._fd)
+            raise
+
+    def append(
+        self,
+        provider: str,
+        tag: str,
+        host: str,
+        input_: str,
+        when: Optional[float] = None,
+    ) -> None:
+        fields = [_encode(field, MAX_FIELD_BYTES) for field in (provider, tag, host)]
+        room = self.slot_size - SLOT.size - sum(map(len, fields)) - len(fields)
+        payload = b"\0".join([*fields, _encode(input_, room)])
+        when = time.time() if when is None else when
+
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            magic, slot_size, slots, seq = HEADER.unpack_from(self._map, 0)
+            offset = HEADER_SIZE + (seq % slots) * slot_size
+            start = offset + SLOT.size
+            self._map[start : start + len(payload)] = payload
+            SLOT.pack_into(self._map, offset, seq, when, len(payload))
+            HEADER.pack_into(self._map, 0, magic, slot_size, slots, seq + 1)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def entries(self) -> List[Entry]:
+        """
+        Every recorded paste, newest first.
+        """
+        fcntl.flock(self._fd, fcntl.LOCK_SH)
+        try:
+            slots = []
+            for i in range(self.slots):
+                offset = HEADER_SIZE + i * self.slot_size
+                seq, when, length = SLOT.unpack_from(self._map, offset)
+                if seq:
+                    start = offset + SLOT.size
+                    slots.append((seq, when, self._map[start : start + length]))
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+        slots.sort(key=lambda slot: -slot[0])
+        return [
+            # cutting a field short can split a character
+            Entry(when, *payload.decode("utf-8", "replace").split("\0", 3))
+            for _, when, payload in slots
+        ]
+
+    def search(self, query: str = "", limit: int = 20) -> Iterator[Entry]:
+        """
+        The newest pastes whose link text or host contains `query` (ignoring
+        case), or just the newest pastes if there's no query.
+        """
+        query = query.lower()
+        found = 0
+        for entry in self.entries():
+            if found == limit:
+                return
+            if query in entry.tag.lower() or query in entry.host.lower():
+                found += 1
+                yield entry
+
+    def close(self) -> None:
+        self._map.close()
+        os.close(self._fd)
@@ -0,0 +1,42 @@
+"""
+Where super_paste keeps files between pastes.
+
+These are the folders Alfred gives the workflow, but they're worked out here
+instead of read from Alfred's environment variables, so commands run from a
+terminal (`--plugins`, `--import-titles`, `--history`, `--stats`, the
+daemon) use the same files as pastes made through Alfred. Off of macOS
+(tests, mostly) everything goes in `~/.super_paste`.
+"""
+
+import os
+import sys
+
+# the same as in info.plist
+BUNDLE_ID = "xavdid.alfred.superpaste"
+
+_HOME = os.path.expanduser("~")
+_FALLBACK_DIR = os.path.join(_HOME, ".super_paste")
+
+if sys.platform == "darwin":
+    # safe to delete at any time
+    CACHE_DIR = os.path.join(
+        _HOME,
+        "Library/Caches/com.runningwithcrayons.Alfred/Workflow Data",
+        BUNDLE_ID,
+    )
+    # things the user would miss
+    DATA_DIR = os.path.join(
+        _HOME, "Library/Application Support/Alfred/Workflow Data", BUNDLE_ID
+    )
+else:
+    CACHE_DIR = _FALLBACK_DIR
+    DATA_DIR = _FALLBACK_DIR
+
+# where the daemon listens. Unix socket paths are limited to about 100 bytes,
+# which the cache folder above can go past
+SOCKET_PATH = os.path.join(_FALLBACK_DIR, "super_paste.sock")
+
+
+def cache_path(name: str) -> str:
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    return os.path.join(CACHE_DIR, name)
@@ -0,0 +1,110 @@
+"""
+Precompiled patterns for finding links and tags in text.
+
+Clipboards can hold huge, weird blobs, so every pattern here is written to
+stay linear: no greedy wildcard followed by something that can force it to
+backtrack across the whole input.
+"""
+
+from __future__ import annotations
+
+import re
+from collections import namedtuple
+
+# `typing.TYPE_CHECKING`, without paying to import typing on every paste
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Iterable, Iterator, Optional, Tuple
+
+# a few capital letters, followed by a dash and a number. The lookbehind means
+# a match can only start at the beginning of a run of capitals; otherwise a long
+# run with no dash after it gets re-scanned from every letter
+ISSUE_TAG = re.compile(r"(?<![A-Z_])[A-Z_]{2,}-\d+")
+
+# anything shaped like a real Jira key: the project (group 1) starts with a
+# letter and can have digits. Used with a list of known projects, so this can
+# be looser than ISSUE_TAG; the same lookbehind keeps it linear
+ISSUE_KEY = re.compile(r"(?<![\w-])([A-Z][A-Z0-9_]+)-\d+\b")
+
+# the entire string must be the link
+GO_LINK = re.compile(r"^go/[\w_-]+$")
+
+# the things we might find in running text. Order matters: anything that's
+# already a link (or is code, or a url in an html attribute like `<img src="...">`,
+# or the `[text]` of a reference link) is matched first so it can be left alone.
+# Bracket and paren groups can't contain other brackets, and parens only nest one
+# level deep (like `/wiki/Foo_(bar)`), so an unclosed one only scans as far as the
+# next one instead of to the end of the line
+TOKENS = re.compile(
+    r"(?P<code>`[^`\n]*`)"
+    r"|(?P<link>\[[^\[\]\n]*\]\([^()\n]*(?:\([^()\n]*\)[^()\n]*)*\))"
+    r"|(?P<reference>\[[^\[\]\n]*\])"
+    r"|(?P<autolink><https?://[^<>\s]*>)"
+    r"|(?P<attr>=[\"']https?://[^\"'\s<>]*)"
+    r"|(?P<url>https?://(?:[^\s<>()\[\]`]|\([^\s<>()\[\]`]*\))+)"
+    r"|(?P<tag>(?<![\w-])[A-Z_][A-Z0-9_]+-\d+\b)"
+    r"|(?P<go_link>(?<![\w/.-])go/[\w-]+(?![\w/-]))"
+)
+
+# a reference-style link's target, like `[docs]: https://neat.com`. Linking
+# that url would break every `[text][docs]` that points at it
+REFERENCE_DEFINITION = re.compile(r" {0,3}\[[^\[\]\n]+\]:")
+
+# token kinds that should be formatted; everything else is already fine
+LINKABLE = frozenset({"url", "tag", "go_link"})
+
+
+# `kind` is the name of the group in TOKENS that matched
+Token = namedtuple("Token", ["kind", "text", "start", "end"])
+
+
+def scan(text: str) -> Iterator[Token]:
+    """
+    Finds every code span, markdown link, url, jira tag and go/ link in text in
+    a single left-to-right pass.
+    """
+    for match in TOKENS.finditer(text):
+        kind = match.lastgroup
+        assert kind  # every alternative is a named group
+        yield Token(kind, match.group(), match.start(), match.end())
+
+
+def markdown_lines(lines: Iterable[str]) -> Iterator[Tuple[str, bool]]:
+    """
+    Pairs each line of a document with whether it's prose that can be
+    linkified. Fenced code blocks (fences included) and reference definitions
+    are not.
+    """
+    in_fence = False
+    for line in lines:
+        if line.lstrip().startswith(("```", "~~~")):
+            in_fence = not in_fence
+            yield line, False
+        elif in_fence or REFERENCE_DEFINITION.match(line):
+            yield line, False
+        else:
+            yield line, True
+
+
+def parse_markdown_link(text: str) -> Optional[Tuple[str, str]]:
+    """
+    Pulls the text and target out of something that starts with a markdown
+    link. Matches exactly what `re.match(r"\\[(.*)\\]\\((.*)\\)", text)` would,
+    but with two string searches instead of a regex that backtracks
+    quadratically on inputs full of brackets and parens.
+    """
+    if not text.startswith("["):
+        return None
+
+    # `.` doesn't cross lines
+    line = text.split("\n", 1)[0]
+    # both groups are greedy, so they end as late as possible
+    close_paren = line.rfind(")")
+    if close_paren == -1:
+        return None
+
+    separator = line.rfind("](", 1, close_paren)
+    if separator == -1:
+        return None
+
+    return line[1:separator], line[separator + 2 : close_paren]
@@ -0,0 +1,147 @@
+"""
+Providers from other packages, for internal tools that deserve nice links.
+
+A plugin is a module, registered under the `super_paste.providers` entry
+point group, with:
+
+    HOSTS = ("tickets.corp.com",)          # exact hosts it formats
+    SUBDOMAINS_OF = ("wiki.corp.com",)     # every subdomain of these
+
+    def format(url, parsed_url):
+        # the link text and target, or None to leave it to everything else
+        return "ticket", url
+
+Finding entry points (and importing every plugin to see its hosts) is far
+too slow for a paste, so it's done once, by `python3 super_paste.py
+--plugins`, which saves a manifest of host -> module. A paste only looks its
+host up in the manifest, and imports just the plugin that claims it; with
+dozens of plugins installed, a paste that doesn't use them never loads one.
+Run `--plugins` again after installing or removing a plugin.
+"""
+
+from __future__ import annotations
+
+import marshal
+import os
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+    try:
+        from urls import Url
+    except ImportError:
+        from .urls import Url
+
+GROUP = "super_paste.providers"
+# bump this when the manifest format changes, so old ones are ignored
+_MANIFEST_VERSION = 1
+
+
+class PluginTable:
+    """
+    Plugin module names indexed by host, like `RuleTable`.
+    """
+
+    def __init__(self, hosts: Dict[str, str], subdomains: Dict[str, str]):
+        self.hosts = hosts
+        self.subdomains = subdomains
+
+    def __bool__(self) -> bool:
+        return bool(self.hosts or self.subdomains)
+
+    def find(self, host: str) -> Optional[str]:
+        """
+        The module that claims a host: an exact match, or else the closest
+        parent domain it's a subdomain of.
+        """
+        if module := self.hosts.get(host):
+            return module
+        dot = host.find(".")
+        while dot != -1:
+            if module := self.subdomains.get(host[dot + 1 :]):
+                return module
+            dot = host.find(".", dot + 1)
+        return None
+
+    def match(self, url: str, parsed_url: Url) -> Optional[Tuple[str, str]]:
+        """
+        Formats a url with the plugin for its host, importing it if this is
+        the first time it's been needed.
+        """
+        module_name = self.find(parsed_url.netloc)
+        if module_name is None:
+            return None
+
+        import importlib
+
+        try:
+            module = importlib.import_module(module_name)
+        except ImportError:
+            # uninstalled since the manifest was built
+            return None
+        return module.format(url, parsed_url)
+
+
+def discover() -> Iterator[Tuple[str, str]]:
+    """
+    `(name, module)` for every installed plugin.
+    """
+    from importlib.metadata import entry_points
+
+    found = entry_points()
+    if hasattr(found, "select"):
+        group = found.select(group=GROUP)
+    else:
+        # python 3.9 and older return a dict of group -> entry points
+        group = found.get(GROUP, [])  # type: ignore
+    for entry_point in group:
+        # `module:attr` is allowed, but the module is the plugin
+        yield entry_point.name, entry_point.value.split(":", 1)[0]
+
+
+def build_manifest(plugins: Iterable[Tuple[str, str]], path: str) -> PluginTable:
+    """
+    Imports each plugin to find the hosts it claims, and saves them to
+    `path`. If two plugins claim the same host, the first one wins.
+    """
+    import importlib
+
+    hosts: Dict[str, str] = {}
+    subdomains: Dict[str, str] = {}
+    for name, module_name in plugins:
+        try:
+            module = importlib.import_module(module_name)
+        except ImportError as e:
+            raise ValueError(f"couldn't import plugin {name} ({module_name}): {e}")
+        if not callable(getattr(module, "format", None)):
+            raise ValueError(f"plugin {name} ({module_name}) has no `format`")
+
+        for host in getattr(module, "HOSTS", ()):
+            hosts.setdefault(host, module_name)
+        for host in getattr(module, "SUBDOMAINS_OF", ()):
+            subdomains.setdefault(host, module_name)
+
+    # written next to the real one and moved into place, so a paste never
+    # reads half a manifest
+    tmp_path = f"{path}.{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        marshal.dump((_MANIFEST_VERSION, hosts, subdomains), f)
+    os.replace(tmp_path, path)
+
+    return PluginTable(hosts, subdomains)
+
+
+def load_manifest(path: str) -> PluginTable:
+    """
+    The manifest saved by `build_manifest`. A missing or outdated one is the
+    same as no plugins.
+    """
+    try:
+        with open(path, "rb") as f:
+            version, hosts, subdomains = marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        return PluginTable({}, {})
+    if version != _MANIFEST_VERSION:
+        return PluginTable({}, {})
+    return PluginTable(hosts, subdomains)
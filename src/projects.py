@@ -0,0 +1,83 @@
+"""
+Finds Jira issue keys for a known list of projects.
+
+Without a list, anything shaped like `ABC-123` is treated as an issue, which
+also catches things like `UTF-8` and `SHA-256`. With one, only keys for real
+projects count, and each is linked to the Jira instance its project lives on.
+
+Text is scanned once for anything shaped like a key (a regex, which runs in C
+and can't backtrack), and each candidate's project is looked up in a dict.
+That's linear in the length of the text, and the number of projects doesn't
+matter at all.
+"""
+
+from __future__ import annotations
+
+try:
+    # deployed setup, everything is top-level
+    from patterns import ISSUE_KEY
+except ImportError:
+    # testing setup, everything in a subdir
+    from .patterns import ISSUE_KEY
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Any, Dict, Iterator, Optional, Tuple
+
+
+class ProjectIndex:
+    """
+    Maps project keys (like `ABC`) to the base url of the Jira instance that
+    hosts them.
+    """
+
+    def __init__(self, projects: Dict[str, str]):
+        self.projects = projects
+
+    def __len__(self) -> int:
+        return len(self.projects)
+
+    def find_all(self, text: str) -> Iterator[Tuple[str, str]]:
+        """
+        Every issue key for a known project in text, in order, along with the
+        url of its Jira instance.
+        """
+        projects = self.projects
+        for match in ISSUE_KEY.finditer(text):
+            if (jira_url := projects.get(match.group(1))) is not None:
+                yield match.group(), jira_url
+
+    def find(self, text: str) -> Optional[Tuple[str, str]]:
+        return next(self.find_all(text), None)
+
+
+def _keys_from_export(data: Any) -> Any:
+    # Jira's `/rest/api/2/project` returns a list of objects with a `key`
+    if isinstance(data, list) and data and isinstance(data[0], dict):
+        return [project["key"] for project in data]
+    return data
+
+
+def load_projects(projects: Any, default_url: str) -> ProjectIndex:
+    """
+    Builds an index from the `JIRA_PROJECTS` setting: a dict of project key to
+    Jira url, a list of keys that all live on `default_url`, or the path to a
+    JSON file holding either (or a project list exported from Jira).
+    """
+    if isinstance(projects, str):
+        import json
+
+        try:
+            with open(projects) as f:
+                projects = _keys_from_export(json.load(f))
+        except (OSError, ValueError) as e:
+            raise ValueError(f"couldn't load Jira projects from {projects}: {e}")
+
+    if isinstance(projects, dict):
+        index = {key: url.rstrip("/") for key, url in projects.items()}
+    elif isinstance(projects, (list, tuple, set, frozenset)):
+        index = dict.fromkeys(projects, default_url)
+    else:
+        raise ValueError("JIRA_PROJECTS should be a dict, a list, or a file path")
+
+    return ProjectIndex(index)
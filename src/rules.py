@@ -0,0 +1,213 @@
+"""
+Declarative link rules, for teams with internal sites that want nice links
+without writing Python in `config.py`.
+
+Rules live in a JSON file outside the workflow (so reinstalling doesn't wipe
+them), shaped like:
+
+    [
+        {"host": "tickets.corp.com", "path": "/{project}/{id}", "tag": "{project}-{id}"},
+        {"subdomains_of": "wiki.corp.com", "path": "/pages/**", "tag": "wiki"},
+        {"host": "go.corp.com", "tag": "go/{1}", "href": "https://go.corp.com/{1}"}
+    ]
+
+- `host` matches exactly; `subdomains_of` matches any subdomain of a host
+- `path` (optional) is matched segment by segment: `{name}` captures a
+  segment, `*` matches any one segment, and a final `**` matches the rest.
+  Without a path, any path matches. Every path segment is also available by
+  position, as `{1}`, `{2}`, etc.
+- `tag` is the link text, and `href` (optional) replaces the link target.
+  Both can use captured segments, plus `{host}` and `{url}`.
+
+The first matching rule for a host wins. Parsing JSON on every paste would be
+wasteful, so the compiled rules are saved with `marshal` and reused until the
+rules file changes.
+"""
+
+from __future__ import annotations
+
+import marshal
+import os
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Any, Dict, List, Optional, Tuple
+
+    try:
+        from urls import Url
+    except ImportError:
+        from .urls import Url
+
+    # alternating literal text and placeholder names, starting with text
+    Template = Tuple[str, ...]
+    # (path segments or None, tag template, href template or None)
+    CompiledRule = Tuple[Optional[Tuple[str, ...]], Template, Optional[Template]]
+
+# bump this when the compiled format changes, so old caches are ignored
+_CACHE_VERSION = 1
+
+
+class RuleTable:
+    """
+    Rules indexed by host, so finding the rules for a url takes a dict lookup
+    per host label, however many rules there are.
+    """
+
+    def __init__(
+        self,
+        hosts: Dict[str, List[CompiledRule]],
+        subdomains: Dict[str, List[CompiledRule]],
+    ):
+        self.hosts = hosts
+        self.subdomains = subdomains
+
+    def __bool__(self) -> bool:
+        return bool(self.hosts or self.subdomains)
+
+    def _candidates(self, host: str) -> List[CompiledRule]:
+        res = list(self.hosts.get(host, ()))
+        # each proper suffix: a.b.corp.com -> b.corp.com -> corp.com -> com
+        dot = host.find(".")
+        while dot != -1:
+            res.extend(self.subdomains.get(host[dot + 1 :], ()))
+            dot = host.find(".", dot + 1)
+        return res
+
+    def match(self, url: str, parsed_url: Url) -> Optional[Tuple[str, str]]:
+        """
+        The link text and target for a url, if a rule matches it.
+        """
+        candidates = self._candidates(parsed_url.netloc)
+        if not candidates:
+            return None
+
+        segments = parsed_url.path.split("/")[1:]
+        for template, tag, href in candidates:
+            captured = _match_path(template, segments)
+            if captured is None:
+                continue
+
+            values = {str(i): s for i, s in enumerate(segments, start=1)}
+            values.update(captured, host=parsed_url.netloc, url=url)
+            return _render(tag, values), _render(href, values) if href else url
+
+        return None
+
+
+def _match_path(
+    template: Optional[Tuple[str, ...]], segments: List[str]
+) -> Optional[Dict[str, str]]:
+    if template is None:
+        return {}
+
+    if template and template[-1] == "**":
+        template = template[:-1]
+        if len(segments) < len(template):
+            return None
+    elif len(segments) != len(template):
+        return None
+
+    captured = {}
+    for expected, actual in zip(template, segments):
+        if expected.startswith("{") and expected.endswith("}"):
+            captured[expected[1:-1]] = actual
+        elif expected != "*" and expected != actual:
+            return None
+    return captured
+
+
+def _compile_template(template: str) -> Template:
+    """
+    Splits a template into its text and placeholders, so rendering it is just
+    a join: `"{a}-{b}!"` becomes `("", "a", "-", "b", "!")`.
+    """
+    parts = []
+    start = 0
+    while (open_ := template.find("{", start)) != -1:
+        close = template.find("}", open_)
+        if close == -1:
+            break
+        parts.append(template[start:open_])
+        parts.append(template[open_ + 1 : close])
+        start = close + 1
+    parts.append(template[start:])
+    return tuple(parts)
+
+
+def _render(template: Template, values: Dict[str, str]) -> str:
+    try:
+        return "".join(
+            values[part] if i % 2 else part for i, part in enumerate(template)
+        )
+    except KeyError as e:
+        raise ValueError(f"rule has an unknown placeholder: {{{e.args[0]}}}") from e
+
+
+def compile_rules(rules: Any) -> RuleTable:
+    """
+    Validates parsed rules and indexes them by host. Raises `ValueError` with
+    a readable message for anything malformed.
+    """
+    if not isinstance(rules, list):
+        raise ValueError("rules file should contain a list of rules")
+
+    hosts: Dict[str, List[CompiledRule]] = {}
+    subdomains: Dict[str, List[CompiledRule]] = {}
+    for i, rule in enumerate(rules):
+        if not isinstance(rule, dict) or not isinstance(rule.get("tag"), str):
+            raise ValueError(f"rule {i} needs a `tag`")
+
+        path, href = rule.get("path"), rule.get("href")
+        compiled = (
+            tuple(path.strip("/").split("/")) if path else None,
+            _compile_template(rule["tag"]),
+            _compile_template(href) if href else None,
+        )
+
+        if "host" in rule:
+            hosts.setdefault(rule["host"], []).append(compiled)
+        elif "subdomains_of" in rule:
+            subdomains.setdefault(rule["subdomains_of"], []).append(compiled)
+        else:
+            raise ValueError(f"rule {i} needs a `host` or `subdomains_of`")
+
+    return RuleTable(hosts, subdomains)
+
+
+def load_rules(path: str, cache_path: str) -> RuleTable:
+    """
+    Loads the rules at `path`, using the compiled copy at `cache_path` if the
+    rules haven't changed since it was written. A missing rules file is the
+    same as no rules.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return RuleTable({}, {})
+    key = (_CACHE_VERSION, stat.st_mtime_ns, stat.st_size)
+
+    try:
+        with open(cache_path, "rb") as f:
+            cached_key, hosts, subdomains = marshal.load(f)
+        if cached_key == key:
+            return RuleTable(hosts, subdomains)
+    except (OSError, EOFError, ValueError, TypeError):
+        # missing or unreadable; we'll write a new one
+        pass
+
+    import json
+
+    with open(path) as f:
+        try:
+            table = compile_rules(json.load(f))
+        except json.JSONDecodeError as e:
+            raise ValueError(f"couldn't parse rules file {path}: {e}") from e
+
+    # write to a temp file and move it into place, so a concurrent paste never
+    # reads half a cache
+    tmp_path = f"{cache_path}.{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        marshal.dump((key, table.hosts, table.subdomains), f)
+    os.replace(tmp_path, cache_path)
+
+    return table
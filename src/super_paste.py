@@ -1,16 +1,96 @@
 #!/usr/local/bin/python3
 
-import re
+# This script is run from scratch for every paste, so startup time is most of
+# the time a paste takes. Keep top-level imports to what every paste needs:
+# `typing` is only imported by type checkers, and we parse urls ourselves
+# rather than importing `urllib`.
+from __future__ import annotations
+
+import os
 import sys
-from typing import Optional, Tuple
-from urllib.parse import urlparse
+import time
+
+# before anything of ours is imported, for tracing (see tracing.py). `time` is
+# imported by the interpreter itself, so it's free
+_LOAD_STARTED = time.perf_counter()
+_STARTUP_CPU = time.process_time()
+
+# `typing.TYPE_CHECKING`, without importing typing
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import (
+        Any,
+        Callable,
+        Dict,
+        Iterable,
+        Iterator,
+        List,
+        Optional,
+        TextIO,
+        Tuple,
+    )
+    from projects import ProjectIndex
+    from history import History
+    from plugins import PluginTable
+    from rules import RuleTable
+    from titles import TitleIndex
+    from urls import Url
+
+    # every provider formatter gets the original url and its parsed form, and
+    # returns a 2-tuple of the link text and target
+    Formatter = Callable[[str, Url], Tuple[str, str]]
+    HostTrie = Dict[str, Any]
 
 try:
     # deployed setup, everything is top-level
+    import config
     from config import GHE_URL, JIRA_URL, custom_text, custom_url
+    from paths import CACHE_DIR, DATA_DIR
+    from patterns import (
+        GO_LINK,
+        ISSUE_TAG,
+        LINKABLE,
+        markdown_lines,
+        parse_markdown_link,
+        scan,
+    )
+    from urls import parse_url
 except ImportError:
     # testing setup, everything in a subdir
+    from . import config
     from .config import GHE_URL, JIRA_URL, custom_text, custom_url
+    from .paths import CACHE_DIR, DATA_DIR
+    from .patterns import (
+        GO_LINK,
+        ISSUE_TAG,
+        LINKABLE,
+        markdown_lines,
+        parse_markdown_link,
+        scan,
+    )
+    from .urls import parse_url
+
+# newer settings are optional, so configs from older versions keep working
+CACHE_RESULTS: bool = getattr(config, "CACHE_RESULTS", False)
+FETCH_TITLES: bool = getattr(config, "FETCH_TITLES", False)
+TITLE_TIMEOUT: float = getattr(config, "TITLE_TIMEOUT", 1.0)
+JIRA_PROJECTS: Any = getattr(config, "JIRA_PROJECTS", None)
+JIRA_INSTANCES: List[Any] = getattr(config, "JIRA_INSTANCES", [])
+GHE_INSTANCES: List[Any] = getattr(config, "GHE_INSTANCES", [])
+TRACE: bool = getattr(config, "TRACE", False)
+TITLE_INDEX: bool = getattr(config, "TITLE_INDEX", False)
+HISTORY: bool = getattr(config, "HISTORY", False)
+
+# declarative link rules; see rules.py for the format
+RULES_PATH = os.path.join(DATA_DIR, "rules.json")
+# hosts claimed by installed provider plugins, saved by `--plugins`
+PLUGIN_MANIFEST = os.path.join(CACHE_DIR, "plugins.marshal")
+# recent pastes, searchable with `--history`
+HISTORY_PATH = os.path.join(DATA_DIR, "history.bin")
+# issue and pull request titles, imported with `--import-titles`
+TITLES_PATH = os.path.join(DATA_DIR, "titles.sqlite3")
+# timings of each paste when TRACE is on, summarized by `--stats`
+TRACE_PATH = os.path.join(CACHE_DIR, "trace.jsonl")
 
 
 def find_issue_tag(text: str) -> Optional[str]:
@@ -18,13 +98,13 @@ def find_issue_tag(text: str) -> Optional[str]:
     Looks for jira tags in text. They're a few capital letters, followed by a
     dash and a number.
     """
-    if match := re.search(r"[A-Z_]{2,}-\d+", text):
+    if match := ISSUE_TAG.search(text):
         return match.group()
     return None
 
 
 def find_go_link(text: str) -> Optional[str]:
-    if match := re.search(r"^go/[\w_-]+$", text):
+    if match := GO_LINK.match(text):
         return match.group()
     return None
 
@@ -33,161 +113,1093 @@ def markdown_link(link_text: str, href: str):
     return f"[{link_text}]({href})"
 
 
+class Instance:
+    """
+    A self-hosted Jira or GitHub Enterprise that lives at `url` (which can
+    include a path). `template` is the link text for its issues (and for
+    GHE, pull requests); `projects` are the Jira projects that live there.
+    """
+
+    __slots__ = ("url", "template", "projects", "netloc", "path")
+
+    def __init__(self, url: str, template: str, projects: Iterable[str] = ()):
+        self.url = url.rstrip("/")
+        self.template = template
+        self.projects = tuple(projects)
+
+        parsed_url = parse_url(self.url)
+        if parsed_url is None:
+            raise ValueError(f"invalid instance url: `{url}`")
+        self.netloc = parsed_url.netloc
+        self.path = parsed_url.path
+
+
+def _load_instances(
+    default_url: str, settings: Iterable[Any], template: str
+) -> List[Instance]:
+    """
+    Reads a list of instances from the config. Each is a url or a dict with a
+    `url` and optionally a `template` and `projects`. The single url from the
+    older setting goes last (if it's set), so an entry for the same url can
+    override it.
+    """
+    res = []
+    for setting in settings:
+        if isinstance(setting, str):
+            setting = {"url": setting}
+        res.append(
+            Instance(
+                setting["url"],
+                setting.get("template", template),
+                setting.get("projects", ()),
+            )
+        )
+    if default_url:
+        res.append(Instance(default_url, template))
+    return res
+
+
+class Routes:
+    """
+    Instances indexed by host. Finding the instance for a url is a dict lookup
+    plus a path check for the (usually one) instance on that host, no matter
+    how many instances there are. Longer paths go first, so the most specific
+    instance wins.
+    """
+
+    __slots__ = ("by_host", "by_url", "by_project")
+
+    def __init__(self, instances: Iterable[Instance]):
+        self.by_host: Dict[str, List[Instance]] = {}
+        self.by_url: Dict[str, Instance] = {}
+        # for plain tags: which Jira each project lives on
+        self.by_project: Dict[str, str] = {}
+
+        for instance in instances:
+            self.by_host.setdefault(instance.netloc, []).append(instance)
+            self.by_url.setdefault(instance.url, instance)
+            for project in instance.projects:
+                self.by_project.setdefault(project, instance.url)
+
+        for candidates in self.by_host.values():
+            # sorting is stable, so the first instance for a url still wins ties
+            candidates.sort(key=lambda instance: len(instance.path), reverse=True)
+
+    def match(self, parsed_url: Url) -> Optional[Instance]:
+        for instance in self.by_host.get(parsed_url.netloc, ()):
+            if parsed_url.path.startswith(instance.path):
+                return instance
+        return None
+
+
+JIRA_TEMPLATE = "{issue}"
+GHE_TEMPLATE = "{user}/{repo}#{number}"
+
+JIRA_ROUTES = Routes(_load_instances(JIRA_URL, JIRA_INSTANCES, JIRA_TEMPLATE))
+GHE_ROUTES = Routes(_load_instances(GHE_URL, GHE_INSTANCES, GHE_TEMPLATE))
+
+
+_project_index: Optional[ProjectIndex] = None
+
+
+def _get_project_index() -> ProjectIndex:
+    global _project_index
+    if _project_index is None:
+        try:
+            # deployed setup, everything is top-level
+            from projects import load_projects
+        except ImportError:
+            # testing setup, everything in a subdir
+            from .projects import load_projects
+
+        _project_index = load_projects(JIRA_PROJECTS, JIRA_URL)
+        # projects listed with their instance count as known, too
+        _project_index.projects.update(JIRA_ROUTES.by_project)
+    return _project_index
+
+
+def find_issues(text: str) -> Iterator[Tuple[str, str]]:
+    """
+    Every jira tag in text, with the url of the Jira it belongs to. If
+    `JIRA_PROJECTS` is set, only tags for those projects count.
+    """
+    if JIRA_PROJECTS is not None:
+        yield from _get_project_index().find_all(text)
+    else:
+        for match in ISSUE_TAG.finditer(text):
+            tag = match.group()
+            yield tag, JIRA_ROUTES.by_project.get(tag[: tag.rindex("-")], JIRA_URL)
+
+
+def _jira_text(issue: str, instance: Optional[Instance]) -> str:
+    # the default template is by far the most common, and needs no formatting
+    if instance is None or instance.template == JIRA_TEMPLATE:
+        return issue
+    return instance.template.format(issue=issue, project=issue[: issue.rindex("-")])
+
+
+# what formatted the paste in progress, for the history
+_provider: Optional[str] = None
+# whether the paste in progress settled for a fallback (like the domain, when
+# a page title couldn't be fetched in time), which shouldn't be cached
+_fell_back = False
+
+
 def _process_text(text: str) -> str:
     """
     Function called for non-url strings. Primary used to pull issue tags out
     of text. If it doesn't find a tag, it returns the text, unaltered.
     """
-    if jira := find_issue_tag(text):
-        return markdown_link(jira, f"{JIRA_URL}/browse/{jira}")
+    global _provider
+    if issue := next(find_issues(text), None):
+        jira, jira_url = issue
+        link_text = _jira_text(jira, JIRA_ROUTES.by_url.get(jira_url))
+        _provider = "jira"
+        href = f"{jira_url}/browse/{jira}"
+        return markdown_link(_with_title(link_text, href), href)
 
     if go_link := find_go_link(text):
+        _provider = "go"
         return markdown_link(go_link, f"http://{go_link}")
 
     return text
 
 
+def _format_slack(url: str, parsed_url: Url) -> Tuple[str, str]:
+    # todo: check for thread?
+    return "slack", url
+
+
+def _format_zappy(url: str, parsed_url: Url) -> Tuple[str, str]:
+    return "screenshot", url
+
+
+def _format_jira(url: str, parsed_url: Url) -> Tuple[str, str]:
+    issue_tag = find_issue_tag(url)
+    if issue_tag:
+        # don't transform links that don't match a configured url even if one's defined
+        if instance := JIRA_ROUTES.match(parsed_url):
+            return (
+                _jira_text(issue_tag, instance),
+                f"{instance.url}/browse/{issue_tag}",
+            )
+        return (
+            issue_tag,
+            f"{parsed_url.scheme}://{parsed_url.netloc}/browse/{issue_tag}",
+        )
+
+    return "JIRA", url
+
+
+def _format_github(url: str, parsed_url: Url) -> Tuple[str, str]:
+    instance = GHE_ROUTES.match(parsed_url)
+    # special case for GHE because those gists aren't on a subdomain
+    if instance and parsed_url.path.startswith("/gist/", len(instance.path)):
+        return "gist", url
+
+    # segments are counted from the instance's path, which might not be the root
+    offset = instance.path.count("/") if instance else 0
+    try:
+        user = parsed_url.path_segment(offset + 1)
+        repo = parsed_url.path_segment(offset + 2)
+        kind = parsed_url.path_segment(offset + 3)
+    except IndexError:
+        # not inside a repo
+        kind = ""
+
+    if kind in ("pull", "issues"):
+        # pull out the repo name nicely
+        try:
+            number = parsed_url.path_segment(offset + 4)
+        except IndexError:
+            number = ""
+        if number:
+            template = instance.template if instance else GHE_TEMPLATE
+            return template.format(user=user, repo=repo, number=number), url
+
+    if "/commit/" in url:
+        return "commit", url
+
+    if kind == "blob":
+        # link to a specific folder/file; maybe with a line number
+        # https://github.com/zapier/zapier-platform/blob/asdf.../packages/core/src/checks/trigger-has-id.js#L16
+        last_part = parsed_url.path_segment(-1)
+        # trailing slash in directory
+        if last_part == "":
+            last_part = parsed_url.path_segment(-2)
+
+        # no dot means it's a directory
+        slash = "" if "." in last_part else "/"
+        fragment = f"#{fragment}" if (fragment := parsed_url.fragment) else ""
+        return f"{user}/{repo} | {slash}{last_part}{fragment}", url
+
+    return "github", url
+
+
+def _format_gist(url: str, parsed_url: Url) -> Tuple[str, str]:
+    return "gist", url
+
+
+GITLAB_SEPARATORS = {"issues": "#", "merge_requests": "!", "commit": "@"}
+
+
+def _format_gitlab(url: str, parsed_url: Url) -> Tuple[str, str]:
+    # if it's not a url we can nicely format, just bail
+    if not (
+        "/-/issues/" in url or "/-/merge_requests/" in url or "/-/commit/" in url
+    ):
+        return "gitlab", url
+
+    # https://gitlab.com/xavdid/some-project/-/issues/1
+    # https://gitlab.com/xavdid/some-project/-/merge_requests/2
+    # https://gitlab.com/xavdid/team/some-other-project/-/merge_requests/50
+    # https://gitlab.com/xavdid/team/some-other-project/-/commit/11530b842858ccc0c915507b8f27af015a247fae
+
+    # pull out the repo name nicely; may have a subteam
+    parts = url.split("/")
+    if len(parts) == 8:
+        # no subteam
+        _, _, _, user, repo, _, resource, id_ = parts
+        subteam = ""
+    elif len(parts) == 9:
+        # has subteam
+        _, _, _, user, subteam, repo, _, resource, id_ = parts
+    else:
+        raise ValueError(f"unable to parse Gitlab URL: {url}")
+
+    if (separator := GITLAB_SEPARATORS.get(resource)) is None:
+        # the `/-/` was somewhere other than where we expected
+        raise ValueError(f"unable to parse Gitlab URL: {url}")
+
+    if "/-/commit/" in url:
+        id_ = id_[:8]
+
+    link_with_subteam = (
+        f"{f'{subteam}/' if subteam else ''}{repo}{separator}{id_}"
+    )
+
+    return f"{user}/{link_with_subteam}", url
+
+
+def _fetch_titles(urls: Iterable[str], deadline: float) -> Dict[str, Optional[str]]:
+    try:
+        # deployed setup, everything is top-level
+        from enrich import fetch_titles
+    except ImportError:
+        # testing setup, everything in a subdir
+        from .enrich import fetch_titles
+
+    return fetch_titles(urls, timeout=TITLE_TIMEOUT, deadline=deadline)
+
+
+def _format_domain(url: str, parsed_url: Url) -> Tuple[str, str]:
+    global _fell_back
+    if FETCH_TITLES:
+        if title := _fetch_titles([url], TITLE_TIMEOUT).get(url):
+            # brackets in the title would end the link text early
+            return title.replace("[", "(").replace("]", ")"), url
+        # slow or down; the next paste should try again
+        _fell_back = True
+
+    # default to pulling the root domain out, if we can
+    return parsed_url.netloc, url
+
+
+class Provider:
+    """
+    A site that gets nice link text. A provider claims exact hosts and/or every
+    subdomain of a host. If more than one provider could claim a url (only
+    possible via the configurable urls), the lowest rank wins.
+    """
+
+    # built once per process and looked at on every paste
+    __slots__ = ("rank", "formatter", "hosts", "subdomains_of")
+
+    def __init__(
+        self,
+        rank: int,
+        formatter: Formatter,
+        hosts: Tuple[str, ...] = (),
+        subdomains_of: Tuple[str, ...] = (),
+    ):
+        self.rank = rank
+        self.formatter = formatter
+        self.hosts = hosts
+        self.subdomains_of = subdomains_of
+
+
+SLACK = Provider(0, _format_slack, subdomains_of=("slack.com",))
+ZAPPY = Provider(1, _format_zappy, hosts=("cdn.zappy.app",))
+JIRA = Provider(2, _format_jira, subdomains_of=("atlassian.net",))
+GITHUB = Provider(3, _format_github, hosts=("github.com",))
+GIST = Provider(4, _format_gist, hosts=("gist.github.com",))
+# should handle hosted
+GITLAB = Provider(
+    5, _format_gitlab, hosts=("gitlab.com",), subdomains_of=("gitlab.com",)
+)
+DEFAULT = Provider(6, _format_domain)
+
+PROVIDERS = [SLACK, ZAPPY, JIRA, GITHUB, GIST, GITLAB]
+
+# trie key that marks "any subdomain of the labels leading here"
+_SUBDOMAIN_KEY = ""
+
+
+def _compile_host_rules(
+    providers: Iterable[Provider],
+) -> Tuple[Dict[str, Provider], HostTrie]:
+    """
+    Builds the lookup tables used by `_lookup_host`: a dict of exact hosts and
+    a trie of subdomain rules, keyed by reversed labels (`com` -> `slack`).
+    """
+    exact: Dict[str, Provider] = {}
+    trie: HostTrie = {}
+
+    for provider in providers:
+        for host in provider.hosts:
+            exact[host] = provider
+
+        for host in provider.subdomains_of:
+            node = trie
+            for label in reversed(host.split(".")):
+                node = node.setdefault(label, {})
+            node[_SUBDOMAIN_KEY] = provider
+
+    return exact, trie
+
+
+_EXACT_HOSTS, _SUBDOMAIN_TRIE = _compile_host_rules(PROVIDERS)
+
+
+# providers already found for hosts, since most pastes are from a handful of
+# sites. Capped, in case something (like `--bulk`) sees endless distinct hosts
+_HOST_CACHE: Dict[str, Provider] = {}
+HOST_CACHE_SIZE = 4096
+
+
+def _lookup_host(host: str) -> Provider:
+    if (provider := _HOST_CACHE.get(host)) is None:
+        if len(_HOST_CACHE) >= HOST_CACHE_SIZE:
+            _HOST_CACHE.clear()
+        provider = _HOST_CACHE[host] = _find_provider(host)
+    return provider
+
+
+def _find_provider(host: str) -> Provider:
+    """
+    Finds the provider for a host. Costs one dict lookup per label in the host,
+    no matter how many providers there are. The most specific rule wins.
+    """
+    if provider := _EXACT_HOSTS.get(host):
+        return provider
+
+    found = DEFAULT
+    labels = host.split(".")
+    node = _SUBDOMAIN_TRIE
+    # stop before the leftmost label so a rule only matches _sub_domains
+    for i in range(len(labels) - 1, 0, -1):
+        # an empty label (`a..slack.com`) would find the subdomain marker itself
+        node = node.get(labels[i]) if labels[i] else None
+        if node is None:
+            break
+        found = node.get(_SUBDOMAIN_KEY, found)
+
+    # hosted gitlab instances can live anywhere, as long as they mention gitlab
+    if found is DEFAULT and "gitlab.com" in host:
+        return GITLAB
+
+    return found
+
+
+def _classify_url(parsed_url: Url) -> Provider:
+    provider = _lookup_host(parsed_url.netloc)
+
+    # configured instances can be on any host (and path), so check them separately
+    if JIRA.rank < provider.rank and JIRA_ROUTES.match(parsed_url):
+        return JIRA
+    if GITHUB.rank < provider.rank and GHE_ROUTES.match(parsed_url):
+        return GITHUB
+
+    return provider
+
+
+_rules: Optional[RuleTable] = None
+_rules_loaded = False
+
+
+def _get_rules() -> Optional[RuleTable]:
+    """
+    The user's link rules, loaded once per process. Most people won't have
+    any, so there's nothing to import unless the rules file exists.
+    """
+    global _rules, _rules_loaded
+    if not _rules_loaded:
+        if os.path.exists(RULES_PATH):
+            try:
+                # deployed setup, everything is top-level
+                from paths import cache_path
+                from rules import load_rules
+            except ImportError:
+                # testing setup, everything in a subdir
+                from .paths import cache_path
+                from .rules import load_rules
+
+            _rules = load_rules(RULES_PATH, cache_path("rules.marshal"))
+        _rules_loaded = True
+    return _rules
+
+
+def _match_rules(url: str, parsed_url: Url) -> Optional[Tuple[str, str]]:
+    if rules := _get_rules():
+        return rules.match(url, parsed_url)
+    return None
+
+
+_title_index: Optional[TitleIndex] = None
+
+
+def _get_title_index() -> TitleIndex:
+    global _title_index
+    if _title_index is None:
+        try:
+            # deployed setup, everything is top-level
+            from titles import TitleIndex
+        except ImportError:
+            # testing setup, everything in a subdir
+            from .titles import TitleIndex
+
+        os.makedirs(DATA_DIR, exist_ok=True)
+        _title_index = TitleIndex(TITLES_PATH)
+    return _title_index
+
+
+def _title_key(href: str) -> Optional[str]:
+    """
+    what the title index knows a link by, however its link text is templated:
+    the issue key for jira links, and the url without its query string,
+    anchor, or trailing slash for everything else
+    """
+    parsed_url = parse_url(href)
+    if parsed_url is None:
+        return None
+    # every jira link we make ends like this
+    if (tag := find_issue_tag(href)) and parsed_url.path.endswith(f"/browse/{tag}"):
+        return tag
+    return parsed_url.text[: parsed_url.path_end].rstrip("/")
+
+
+def _with_title(link_text: str, href: str) -> str:
+    """
+    adds the title from the local index (if there is one) to the text of a
+    link to `href`, like `xavdid/typed-install#3: Fix login`
+    """
+    if not TITLE_INDEX or not os.path.exists(TITLES_PATH):
+        return link_text
+    if (key := _title_key(href)) and (title := _get_title_index().get(key)):
+        # brackets in the title would end the link text early
+        return f"{link_text}: {title.replace('[', '(').replace(']', ')')}"
+    return link_text
+
+
+_plugins: Optional[PluginTable] = None
+_plugins_loaded = False
+
+
+def _get_plugins() -> Optional[PluginTable]:
+    """
+    The hosts claimed by provider plugins. Without a manifest, there's
+    nothing to import.
+    """
+    global _plugins, _plugins_loaded
+    if not _plugins_loaded:
+        if os.path.exists(PLUGIN_MANIFEST):
+            try:
+                # deployed setup, everything is top-level
+                from plugins import load_manifest
+            except ImportError:
+                # testing setup, everything in a subdir
+                from .plugins import load_manifest
+
+            _plugins = load_manifest(PLUGIN_MANIFEST)
+        _plugins_loaded = True
+    return _plugins
+
+
+def _match_plugins(url: str, parsed_url: Url) -> Optional[Tuple[str, str]]:
+    if plugins := _get_plugins():
+        return plugins.match(url, parsed_url)
+    return None
+
+
 def _process_url(url: str) -> Tuple[str, str]:
     """
     given a url, return a 2-tuple of the link text and target
     """
+    global _provider
+    parsed_url = parse_url(url)
+    # rough approximation, but it's probably fine
+    if parsed_url is None:
+        # might be a markdown link already? Only if that's all it is; text
+        # after the link shouldn't be dropped
+        link = parse_markdown_link(url)
+        if link and markdown_link(*link) == url.strip():
+            _provider = "link"
+            return link
 
-    def link_titled(text) -> Tuple[str, str]:
-        """
-        almost every return statement uses this except for cleaning up jira urls
-        """
-        return text, url
+        # the clipboard might be huge, and this is shown to the user
+        preview = url if len(url) <= 100 else f"{url[:100]}..."
+        raise ValueError(f"can't format non-url string: `{preview}`")
 
-    parsed_url = urlparse(url)
-    # rough approximation, but it's probably fine
-    if not bool(parsed_url.scheme and parsed_url.netloc):
-        # todo: walrus?
-        markdown_link = re.match(r"\[(.*)\]\((.*)\)", url)
-        # might be a markdown link already?
-        if markdown_link:
-            return markdown_link.groups()  # type: ignore - it's a 2-tuple if it matched
-
-        raise ValueError(f"can't format non-url string: `{url}`")
-
-    domain = parsed_url.netloc
-
-    if domain.endswith(".slack.com"):
-        # todo: check for thread?
-        return link_titled("slack")
-
-    if domain == "cdn.zappy.app":
-        return link_titled("screenshot")
-
-    if domain.endswith(".atlassian.net") or url.startswith(JIRA_URL):
-        issue_tag = find_issue_tag(url)
-        if issue_tag:
-            # don't transform links that don't match the custom url even if it's defined
-            if url.startswith(JIRA_URL):
-                return (issue_tag, f"{JIRA_URL}/browse/{issue_tag}")
-            return (issue_tag, f"{parsed_url.scheme}://{domain}/browse/{issue_tag}")
-
-        return link_titled("JIRA")
-
-    if domain == "github.com" or url.startswith(GHE_URL):
-        # special case for GHE because those gists aren't on a subdomain
-        if url.startswith(f"{GHE_URL}/gist/"):
-            return link_titled("gist")
-
-        if "/pull/" in url or "/issues/" in url:
-            # pull out the repo name nicely
-            _, _, _, user, repo, _, number = url.split("/")
-
-            return link_titled(f"{user}/{repo}#{number}")
-
-        if "/commit/" in url:
-            return link_titled("commit")
-
-        if "/blob/" in url:
-            # link to a specific folder/file; maybe with a line number
-            # https://github.com/zapier/zapier-platform/blob/asdf.../packages/core/src/checks/trigger-has-id.js#L16
-            path_parts = parsed_url.path.split("/")
-            user, repo = path_parts[1:3]
-            last_part = path_parts[-1]
-            # trailing slash in directory
-            if last_part == "":
-                last_part = path_parts[-2]
-
-            res = [f"{user}/{repo} | "]
-
-            if "." not in last_part:
-                # directory!
-                res.append("/")
-            res.append(last_part)
-
-            if parsed_url.fragment:
-                res.append(f"#{parsed_url.fragment}")
-
-            return link_titled("".join(res))
-
-        return link_titled("github")
-
-    if domain == "gist.github.com":
-        return link_titled("gist")
-
-    # should handle hosted
-    if "gitlab.com" in domain:
-        # if it's not a url we can nicely format, just bail
-        if not any(
-            [x in url for x in ["/-/issues/", "/-/merge_requests/", "/-/commit/"]]
-        ):
-            return link_titled("gitlab")
-
-        separators = {"issues": "#", "merge_requests": "!", "commit": "@"}
-
-        # https://gitlab.com/xavdid/some-project/-/issues/1
-        # https://gitlab.com/xavdid/some-project/-/merge_requests/2
-        # https://gitlab.com/xavdid/team/some-other-project/-/merge_requests/50
-        # https://gitlab.com/xavdid/team/some-other-project/-/commit/11530b842858ccc0c915507b8f27af015a247fae
-
-        # pull out the repo name nicely; may have a subteam
-        parts = url.split("/")
-        if len(parts) == 8:
-            # no subteam
-            _, _, _, user, repo, _, resource, id_ = parts
-            subteam = ""
-        elif len(parts) == 9:
-            # has subteam
-            _, _, _, user, subteam, repo, _, resource, id_ = parts
-        else:
-            raise ValueError(f"unable to parse Gitlab URL: {url}")
+    # user rules and plugins are more specific than the built in providers, so
+    # they go first
+    if res := _match_rules(url, parsed_url):
+        _provider = "rules"
+        return res
+    if res := _match_plugins(url, parsed_url):
+        _provider = "plugins"
+        return res
 
-        if "/-/commit/" in url:
-            id_ = id_[:8]
+    formatter = _classify_url(parsed_url).formatter
+    # providers are named after their formatters, like `_format_github`
+    _provider = formatter.__name__.replace("_format_", "")
+    return formatter(url, parsed_url)
 
-        link_with_subteam = (
-            f"{f'{subteam}/' if subteam else ''}{repo}{separators[resource]}{id_}"
-        )
 
-        return link_titled(f"{user}/{link_with_subteam}")
+def _split_links(input_: str) -> Optional[List[str]]:
+    """
+    Splits a clipboard holding several links (one per line, maybe already
+    bulleted, or separated by spaces or commas) into the links. Returns `None`
+    unless there's more than one, and every item is a link or a jira tag.
+    """
+    items = [item.rstrip(",") for item in input_.split() if item not in "-*"]
+    if len(items) < 2 or not all(map(_is_link_item, items)):
+        return None
+    return items
 
-    # default to pulling the root domain out, if we can
-    return link_titled(domain)
 
+def _is_link_item(item: str) -> bool:
+    return item.startswith(("https://", "http://")) or find_issue_tag(item) == item
 
-def main(input_: str) -> str:
+
+def _format_links(input_: str, items: List[str]) -> str:
+    """
+    Each link formatted on its own: a bulleted list if they were on separate
+    lines, otherwise comma separated. One that can't be formatted is left as
+    it was, rather than losing the rest.
+    """
+    links = []
+    for item in items:
+        try:
+            links.append(_format_input(item))
+        except ValueError:
+            links.append(item)
+
+    if "\n" in input_.strip():
+        return "\n".join(f"- {link}" for link in links)
+    return ", ".join(links)
+
+
+def _has_markdown_link(text: str) -> bool:
+    return any(token.kind == "link" for token in scan(text))
+
+
+def _format_input(input_: str) -> str:
+    global _provider
     # we'll almost always have urls, but we could also have plain jira tags
     # if we do, turn them into nice jira urls
     if "https:" in input_ or "http:" in input_:
         custom_result = custom_url(input_)
         if custom_result:
+            _provider = "custom_url"
             return markdown_link(*custom_result)
-        return markdown_link(*_process_url(input_))
+        if items := _split_links(input_):
+            return _format_links(input_, items)
+        try:
+            link_text, href = _process_url(input_)
+        except ValueError:
+            # a paragraph copied out of a doc, links and all: format the rest of it
+            if not _has_markdown_link(input_):
+                raise
+            return "".join(linkify_lines(input_.splitlines(keepends=True)))
+        return markdown_link(_with_title(link_text, href), href)
 
     else:
         custom_result = custom_text(input_)
         if custom_result:
+            _provider = "custom_text"
             return custom_result
         return _process_text(input_)
 
 
-if __name__ == "__main__":
+_result_cache = None
+
+
+def _get_result_cache():
+    global _result_cache
+    if _result_cache is None:
+        try:
+            # deployed setup, everything is top-level
+            from cache import ResultCache
+            from paths import cache_path
+        except ImportError:
+            # testing setup, everything in a subdir
+            from .cache import ResultCache
+            from .paths import cache_path
+
+        _result_cache = ResultCache(cache_path("results.sqlite3"), config_fingerprint())
+    return _result_cache
+
+
+def config_fingerprint() -> str:
+    """
+    changes whenever something that affects formatting does, so anything saved
+    from an earlier run can tell it's stale
+    """
+    try:
+        # deployed setup, everything is top-level
+        from cache import fingerprint
+    except ImportError:
+        # testing setup, everything in a subdir
+        from .cache import fingerprint
+
+    files = [config.__file__, __file__, RULES_PATH, PLUGIN_MANIFEST]
+    # too big to read on every run, but they only change when they're written
+    stamped = [TITLES_PATH, f"{TITLES_PATH}-wal"]
+    if isinstance(JIRA_PROJECTS, str):
+        stamped.append(JIRA_PROJECTS)
+    return fingerprint(files, stamped)
+
+
+# clipboards longer than this are only formatted if they start like a link
+LARGE_INPUT = 16 * 1024
+# ... which is decided by looking at this much of the start
+PREFIX_SCAN = 2048
+
+
+def _is_passthrough(input_: str) -> bool:
+    """
+    Huge clipboards are almost always logs or documents, which should be
+    pasted back untouched rather than searched for a tag. Only the start is
+    looked at, so this takes the same time however big the clipboard is.
+    """
+    prefix = input_[:PREFIX_SCAN].lstrip()
+    if not prefix.startswith(("https://", "http://")):
+        return True
+    # a url doesn't have spaces or lines in it, but a list of them does (like
+    # release notes); the last item might be cut off, so it's not checked
+    items = [item.rstrip(",") for item in prefix.split()[:-1] if item not in "-*"]
+    return not all(map(_is_link_item, items))
+
+
+def main(input_: str) -> str:
+    # never copied, searched or cached
+    if len(input_) > LARGE_INPUT and _is_passthrough(input_):
+        return input_
+
+    if not CACHE_RESULTS:
+        return _format_input(input_)
+
+    cache = _get_result_cache()
+    if (cached := cache.get(input_)) is not None:
+        return cached
+
+    global _fell_back
+    _fell_back = False
+    res = _format_input(input_)
+    if not _fell_back:
+        cache.set(input_, res)
+    return res
+
+
+# sentence punctuation that probably isn't part of a url it follows
+TRAILING_PUNCTUATION = ".,;:!?'\""
+
+
+def _linkify_token(token: str) -> str:
+    """
+    runs a single url or tag through `main`. Anything we can't format is left
+    as it was, since a whole document shouldn't fail because of one bad link.
+    """
+    try:
+        return main(token)
+    except ValueError:
+        return token
+
+
+def linkify_line(line: str) -> str:
+    """
+    Formats every bare url, jira tag and go/ link in a line of text, leaving
+    existing markdown links and code spans alone.
+    """
+    res = []
+    last_end = 0
+    for token in scan(line):
+        if token.kind not in LINKABLE:
+            continue
+
+        res.append(line[last_end : token.start])
+        if token.kind == "url":
+            url = token.text.rstrip(TRAILING_PUNCTUATION)
+            res.append(_linkify_token(url))
+            res.append(token.text[len(url) :])
+        else:
+            res.append(_linkify_token(token.text))
+        last_end = token.end
+
+    res.append(line[last_end:])
+    return "".join(res)
+
+
+def linkify_lines(lines: Iterable[str]) -> Iterable[str]:
+    """
+    Lazily linkifies a document, one line at a time. Fenced code blocks and
+    reference definitions are passed through untouched.
+    """
+    for line, linkable in markdown_lines(lines):
+        yield linkify_line(line) if linkable else line
+
+
+# how many lines to look ahead for titles to fetch all at once
+TITLE_BATCH_LINES = 500
+
+
+def _prefetch_titles(lines: Iterable[str]) -> Iterable[str]:
+    """
+    Passes lines through unchanged, but first fetches (and caches) titles for
+    every unknown url in the next batch of lines concurrently, rather than one
+    at a time as each is formatted.
+    """
+    from itertools import islice
+
+    it = iter(lines)
+    while batch := list(islice(it, TITLE_BATCH_LINES)):
+        urls = []
+        for token in (token for line in batch for token in scan(line)):
+            if token.kind != "url":
+                continue
+            url = token.text.rstrip(TRAILING_PUNCTUATION)
+            parsed_url = parse_url(url)
+            if parsed_url and _classify_url(parsed_url) is DEFAULT:
+                urls.append(url)
+
+        if urls:
+            # give up on the batch eventually, but not as quickly as a paste
+            _fetch_titles(urls, TITLE_TIMEOUT * 5)
+        yield from batch
+
+
+def stream(in_: TextIO, out: TextIO) -> None:
+    """
+    Linkifies a whole document. Input is read and written a line at a time, so
+    memory use doesn't grow with the size of the input.
+    """
+    lines: Iterable[str] = _prefetch_titles(in_) if FETCH_TITLES else in_
+    for line in linkify_lines(lines):
+        out.write(line)
+
+
+def paste(input_: str) -> str:
+    """
+    What Alfred should type for a clipboard. Errors are shown to the user
+    rather than raised, since there's nobody around to read a traceback.
+    """
+    global _provider
+    _provider = None
     try:
-        res = main(sys.argv[1])
+        res = main(input_)
     except Exception as e:
-        res = f"! Alfred ERR ! {e}"
-    sys.stdout.write(res)
+        return f"! Alfred ERR ! {e}"
+
+    if HISTORY:
+        _record_history(input_, res, _provider)
+    return res
+
+
+_history: Optional[History] = None
+
+
+def _get_history() -> History:
+    global _history
+    if _history is None:
+        try:
+            # deployed setup, everything is top-level
+            from history import History
+        except ImportError:
+            # testing setup, everything in a subdir
+            from .history import History
+
+        os.makedirs(DATA_DIR, exist_ok=True)
+        _history = History(HISTORY_PATH)
+    return _history
+
+
+def _record_history(input_: str, res: str, provider: Optional[str]) -> None:
+    """
+    saves a paste to the history, with the provider that formatted it and the
+    host of the link it became (if it became a single link). The provider is
+    `None` when the result came from the result cache
+    """
+    tag, host = "", ""
+    link = parse_markdown_link(res)
+    if link and markdown_link(*link) == res:
+        tag, href = link
+        if parsed_url := parse_url(href):
+            host = parsed_url.netloc
+        provider = provider or "cached"
+    else:
+        provider = "text"
+
+    try:
+        _get_history().append(provider, tag, host, input_)
+    except (OSError, ValueError):
+        # the history should never break a paste
+        pass
+
+
+def _stream_command(args: List[str]) -> None:
+    stream(sys.stdin, sys.stdout)
+
+
+def _stdin_command(args: List[str]) -> None:
+    """
+    pastes the clipboard from stdin, which (unlike argv) has no size limit.
+    A big clipboard that's passed through is streamed straight back out, so
+    it's never decoded or held in memory all at once
+    """
+    try:
+        # deployed setup, everything is top-level
+        from framing import decode, encode
+    except ImportError:
+        # testing setup, everything in a subdir
+        from .framing import decode, encode
+
+    stdin, stdout = sys.stdin.buffer, sys.stdout.buffer
+    head = stdin.read(LARGE_INPUT + 1)
+
+    if len(head) > LARGE_INPUT and _is_passthrough(decode(head[:PREFIX_SCAN])):
+        import shutil
+
+        stdout.write(head)
+        shutil.copyfileobj(stdin, stdout)
+        return
+
+    stdout.write(encode(paste(decode(head + stdin.read()))))
+
+
+def _framed_command(args: List[str]) -> None:
+    """
+    answers any number of pastes, each sent as a frame (see framing.py), until
+    stdin closes
+    """
+    try:
+        # deployed setup, everything is top-level
+        from framing import decode, encode, read_frame, write_frame
+    except ImportError:
+        # testing setup, everything in a subdir
+        from .framing import decode, encode, read_frame, write_frame
+
+    stdin, stdout = sys.stdin.buffer, sys.stdout.buffer
+    try:
+        while (body := read_frame(stdin)) is not None:
+            write_frame(stdout, encode(paste(decode(body))))
+            # the caller is waiting on this answer before sending the next paste
+            stdout.flush()
+    except ValueError as e:
+        # there's no way to find the next frame after a bad one
+        sys.exit(f"super_paste: {e}")
+
+
+def _rewrite_command(args: List[str]) -> None:
+    """
+    linkifies markdown files in place, only looking at lines that changed since
+    the last rewrite. Meant to run every time a file is saved. Folders are
+    searched for markdown files, and only changed files are looked at
+    """
+    try:
+        # deployed setup, everything is top-level
+        from document import rewrite_file, rewrite_tree
+    except ImportError:
+        # testing setup, everything in a subdir
+        from .document import rewrite_file, rewrite_tree
+
+    for path in args:
+        if not os.path.isdir(path):
+            lines, rewritten = rewrite_file(path)
+            sys.stderr.write(f"{path}: linkified {rewritten} of {lines} lines\n")
+            continue
+
+        stats = rewrite_tree(path)
+        seconds = stats["seconds"] or 1e-9
+        sys.stderr.write(
+            f"{path}: linkified {stats['linkified']:.0f} of {stats['files']:.0f} files"
+            f" in {seconds:.2f}s ({stats['files'] / seconds:,.0f} files/sec,"
+            f" {stats['bytes'] / seconds / 1024 / 1024:,.1f}MB/sec)\n"
+        )
+
+
+def _import_titles_command(args: List[str]) -> None:
+    """
+    loads issue and pull request titles from exports (JSON arrays or JSON
+    lines files; see titles.py for what's understood) into the local index
+    """
+    try:
+        # deployed setup, everything is top-level
+        from titles import iter_json, titles_from_export
+    except ImportError:
+        # testing setup, everything in a subdir
+        from .titles import iter_json, titles_from_export
+
+    index = _get_title_index()
+    for path in args:
+        start = time.perf_counter()
+        with open(path) as f:
+            records = iter_json(f)
+            count = index.add(titles_from_export(records, _title_key))
+        elapsed = time.perf_counter() - start
+        sys.stderr.write(
+            f"{path}: {count} titles in {elapsed:.1f}s ({count / elapsed:,.0f}/sec)\n"
+        )
+
+
+def _titles_command(args: List[str]) -> None:
+    """
+    searches the local title index
+    """
+    for key, title in _get_title_index().search(" ".join(args)):
+        print(f"{key}: {title}")
+
+
+def _plugins_command(args: List[str]) -> None:
+    """
+    finds installed provider plugins and saves the hosts they claim, so pastes
+    can find them without looking
+    """
+    try:
+        # deployed setup, everything is top-level
+        from plugins import build_manifest, discover
+    except ImportError:
+        # testing setup, everything in a subdir
+        from .plugins import build_manifest, discover
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    table = build_manifest(discover(), PLUGIN_MANIFEST)
+    for host, module in sorted(table.hosts.items()):
+        print(f"{host}: {module}")
+    for host, module in sorted(table.subdomains.items()):
+        print(f"*.{host}: {module}")
+    if not table:
+        print("no plugins installed")
+
+
+def _history_command(args: List[str]) -> None:
+    """
+    recent pastes, newest first. The optional argument is text to look for in
+    their link text or host
+    """
+    for entry in _get_history().search(" ".join(args)):
+        when = time.strftime("%Y-%m-%d %H:%M", time.localtime(entry.time))
+        print(f"{when}  {entry.provider:<10} {entry.tag or '-'}  {entry.input!r}")
+
+
+def _cache_stats_command(args: List[str]) -> None:
+    for name, value in _get_result_cache().stats().items():
+        print(f"{name}: {value}")
+
+
+def _bulk_command(args: List[str]) -> None:
+    """
+    formats each line of stdin as if it were pasted on its own. The optional
+    argument is the number of processes to use. With `--dedup`, each distinct
+    link is only formatted once
+    """
+    try:
+        # deployed setup, everything is top-level
+        from bulk import Deduper, convert_many
+    except ImportError:
+        # testing setup, everything in a subdir
+        from .bulk import Deduper, convert_many
+
+    deduper = Deduper() if "--dedup" in args else None
+    args = [arg for arg in args if arg != "--dedup"]
+    jobs = int(args[0]) if args else None
+    stats: Dict = {}
+    lines = (line.rstrip("\n") for line in sys.stdin)
+    for res in convert_many(lines, jobs=jobs, stats=stats, deduper=deduper):
+        sys.stdout.write(f"{res}\n")
+
+    for pid, worker in stats.items():
+        sys.stderr.write(
+            f"worker {pid}: {worker.count} inputs, {worker.per_second:,.0f}/sec\n"
+        )
+
+    if deduper and deduper.formatted:
+        # what formatting the duplicates would have cost, at the average rate
+        seconds = sum(worker.seconds for worker in stats.values())
+        saved = seconds / deduper.formatted * (deduper.total - deduper.formatted)
+        sys.stderr.write(
+            f"dedup: {deduper.total} inputs, {deduper.formatted} distinct"
+            f" ({deduper.ratio:.1f}x), saved about {saved:.2f}s of formatting\n"
+        )
+
+
+def _stats_command(args: List[str]) -> None:
+    """
+    summarizes the trace log. The optional argument is how many of the slowest
+    inputs to show
+    """
+    try:
+        # deployed setup, everything is top-level
+        from tracing import read_records, summarize
+    except ImportError:
+        # testing setup, everything in a subdir
+        from .tracing import read_records, summarize
+
+    slowest = int(args[0]) if args else 5
+    for line in summarize(read_records(TRACE_PATH), slowest=slowest):
+        print(line)
+
+
+# for running the script by hand, rather than from Alfred
+COMMANDS: Dict[str, Callable[[List[str]], None]] = {
+    "--stream": _stream_command,
+    "--rewrite": _rewrite_command,
+    "--stdin": _stdin_command,
+    "--framed": _framed_command,
+    "--bulk": _bulk_command,
+    "--import-titles": _import_titles_command,
+    "--titles": _titles_command,
+    "--plugins": _plugins_command,
+    "--history": _history_command,
+    "--cache-stats": _cache_stats_command,
+    "--stats": _stats_command,
+}
+
+
+def _install_tracing() -> None:
+    try:
+        # deployed setup, everything is top-level
+        from tracing import Tracer, install
+    except ImportError:
+        # testing setup, everything in a subdir
+        from .tracing import Tracer, install
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tracer = Tracer(TRACE_PATH)
+    tracer.startup = {
+        "interpreter_cpu": _STARTUP_CPU * 1000,
+        "load": (time.perf_counter() - _LOAD_STARTED) * 1000,
+    }
+    install(sys.modules[__name__], tracer)
+
+
+# this replaces functions above with timed versions, so it has to come last
+if TRACE:
+    _install_tracing()
+
+
+if __name__ == "__main__":
+    # with no arguments, the clipboard comes in on stdin
+    if (command := sys.argv[1] if len(sys.argv) > 1 else "--stdin") in COMMANDS:
+        COMMANDS[command](sys.argv[2:])
+    else:
+        sys.stdout.write(paste(sys.argv[1]))
@@ -0,0 +1,192 @@
+"""
+Titles for issues and pull requests, looked up locally so pastes never wait
+on the network.
+
+The index is a SQLite file, keyed by issue key for Jira (`PDE-123`) and by
+url for everything else, rather than by link text, which can be templated. A
+paste finds its title with one primary key lookup. It's filled from exports
+of GitHub, GitLab and Jira, which can be hundreds of MB: they're read one
+record at a time and written in batches, each in its own transaction, so
+memory stays flat and a huge import doesn't hold a lock on the index the
+whole time. Titles are also full text indexed, for searching.
+"""
+
+from __future__ import annotations
+
+import sqlite3
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import IO, Any, Callable, Iterable, Iterator, List, Optional, Tuple
+
+DEFAULT_BATCH_SIZE = 5000
+# how much of an export is read at a time
+CHUNK_SIZE = 1024 * 1024
+
+
+class TitleIndex:
+    def __init__(self, path: str):
+        # wait on an import rather than failing
+        self._db = sqlite3.connect(path, timeout=5, isolation_level=None)
+        self._db.executescript(
+            """
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+            CREATE TABLE IF NOT EXISTS titles (
+                id INTEGER PRIMARY KEY,
+                key TEXT NOT NULL UNIQUE,
+                title TEXT NOT NULL
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS titles_fts USING fts5 (
+                key, title, content = titles, content_rowid = id
+            );
+            CREATE TRIGGER IF NOT EXISTS titles_insert AFTER INSERT ON titles BEGIN
+                INSERT INTO titles_fts (rowid, key, title)
+                VALUES (new.id, new.key, new.title);
+            END;
+            CREATE TRIGGER IF NOT EXISTS titles_delete AFTER DELETE ON titles BEGIN
+                INSERT INTO titles_fts (titles_fts, rowid, key, title)
+                VALUES ('delete', old.id, old.key, old.title);
+            END;
+            CREATE TRIGGER IF NOT EXISTS titles_update AFTER UPDATE ON titles BEGIN
+                INSERT INTO titles_fts (titles_fts, rowid, key, title)
+                VALUES ('delete', old.id, old.key, old.title);
+                INSERT INTO titles_fts (rowid, key, title)
+                VALUES (new.id, new.key, new.title);
+            END;
+            """
+        )
+
+    def get(self, key: str) -> Optional[str]:
+        row = self._db.execute(
+            "SELECT title FROM titles WHERE key = ?", (key,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def search(self, query: str, limit: int = 20) -> List[Tuple[str, str]]:
+        """
+        `(key, title)` for the best matches of a full text query, like `login`
+        or `fix AND login`.
+        """
+        try:
+            return self._db.execute(
+                """
+                SELECT key, title FROM titles_fts WHERE titles_fts MATCH ?
+                ORDER BY rank LIMIT ?
+                """,
+                (query, limit),
+            ).fetchall()
+        except sqlite3.OperationalError as e:
+            raise ValueError(f"invalid search `{query}`: {e}") from e
+
+    def add(
+        self,
+        titles: Iterable[Tuple[str, str]],
+        batch_size: int = DEFAULT_BATCH_SIZE,
+    ) -> int:
+        """
+        Stores `(key, title)` pairs, replacing any existing title for a key.
+        Returns how many were stored.
+        """
+        from itertools import islice
+
+        count = 0
+        it = iter(titles)
+        while batch := list(islice(it, batch_size)):
+            with self._db:
+                self._db.execute("BEGIN IMMEDIATE")
+                self._db.executemany(
+                    """
+                    INSERT INTO titles (key, title) VALUES (?, ?)
+                    ON CONFLICT (key) DO UPDATE SET title = excluded.title
+                    """,
+                    batch,
+                )
+            count += len(batch)
+        return count
+
+    def __len__(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM titles").fetchone()[0]
+
+    def close(self) -> None:
+        self._db.close()
+
+
+def iter_json(f: IO[str], chunk_size: int = CHUNK_SIZE) -> Iterator[Any]:
+    """
+    The items of a JSON array, or each line of a JSON lines file, parsed one
+    at a time. Only a chunk of the file (plus the item being read) is ever in
+    memory.
+    """
+    import json
+
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    in_array = None
+    eof = False
+
+    while True:
+        # skip whatever separates items
+        while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+            pos += 1
+        if in_array is None and pos < len(buffer):
+            in_array = buffer[pos] == "["
+            pos += in_array
+            continue
+        if pos < len(buffer) and buffer[pos] == "]" and in_array:
+            return
+
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+        except ValueError:
+            # probably cut off at the end of the chunk
+            if eof:
+                if buffer[pos:].strip():
+                    raise ValueError("export isn't valid JSON") from None
+                return
+            chunk = f.read(chunk_size)
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            eof = not chunk
+            continue
+
+        if end == len(buffer) and not eof:
+            # a number at the end of a chunk might continue in the next one
+            chunk = f.read(chunk_size)
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            eof = not chunk
+            continue
+
+        pos = end
+        yield item
+
+
+def titles_from_export(
+    records: Iterable[Any], key_for_url: Callable[[str], Optional[str]]
+) -> Iterator[Tuple[str, str]]:
+    """
+    `(key, title)` for each record of an export that has both. Understands
+    GitHub issues and pull requests (`html_url`), GitLab issues and merge
+    requests (`web_url`), Jira issues (`key` and `fields.summary`), and plain
+    `{"key": ..., "title": ...}`. Keys for urls come from `key_for_url`, so
+    they're exactly what a paste of that url looks up.
+    """
+    for record in records:
+        if not isinstance(record, dict):
+            continue
+
+        if isinstance(fields := record.get("fields"), dict):
+            key, title = record.get("key"), fields.get("summary")
+        elif url := record.get("html_url") or record.get("web_url"):
+            try:
+                key = key_for_url(url)
+            except ValueError:
+                continue
+            title = record.get("title")
+        else:
+            key, title = record.get("key"), record.get("title")
+
+        if isinstance(key, str) and isinstance(title, str) and key and title:
+            yield key, title
@@ -0,0 +1,264 @@
+"""
+Opt-in tracing, for finding out why a paste was slow (or what went wrong).
+
+When `TRACE` is on in the config, super_paste swaps its own functions for
+timed wrappers, so with tracing off there's nothing extra on the hot path at
+all. Each call of `main` becomes one JSON line in a log: how long each stage
+took, which provider formatted it, and the error (with where it came from)
+instead of just its message. The log rotates so it never grows past a few
+MB, and `python3 super_paste.py --stats` summarizes it.
+"""
+
+from __future__ import annotations
+
+import os
+from time import perf_counter, time
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from types import ModuleType
+    from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+    Record = Dict[str, Any]
+
+MAX_BYTES = 1024 * 1024
+BACKUPS = 3
+# inputs are logged so slow ones can be found again, but only the start
+MAX_INPUT_CHARS = 200
+
+# functions in super_paste that are timed, and the stage they're reported as
+STAGES = {
+    "custom_url": "custom_url",
+    "custom_text": "custom_text",
+    "parse_url": "parse_url",
+    "_match_rules": "rules",
+    "_match_plugins": "plugins",
+    "_classify_url": "classify",
+    "_process_text": "text",
+}
+# the stages that run the user's own code
+HOOKS = ("custom_url", "custom_text")
+# stages that decide what formats an input, the first time they return something
+DECIDERS = frozenset(
+    {"custom_url", "custom_text", "rules", "plugins", "classify", "text"}
+)
+
+
+class Tracer:
+    """
+    Collects a record for the call of `main` in progress, and appends it to
+    the log at `path` when it's done.
+    """
+
+    def __init__(self, path: str, max_bytes: int = MAX_BYTES, backups: int = BACKUPS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.record: Optional[Record] = None
+        # added to the first record, since that's the paste that paid for it
+        self.startup: Optional[Dict[str, float]] = None
+
+    def stage(self, name: str, func: Callable) -> Callable:
+        def timed(*args, **kwargs):
+            start = perf_counter()
+            try:
+                res = func(*args, **kwargs)
+            finally:
+                if (record := self.record) is not None:
+                    stages = record["stages"]
+                    elapsed = (perf_counter() - start) * 1000
+                    stages[name] = stages.get(name, 0) + elapsed
+
+            if (
+                record is not None
+                and name in DECIDERS
+                and res
+                and "provider" not in record
+            ):
+                record["provider"] = _provider_name(name, res)
+            return res
+
+        timed.__name__ = func.__name__
+        return timed
+
+    def entry(self, func: Callable[[str], str]) -> Callable[[str], str]:
+        def traced(input_: str) -> str:
+            if self.record is not None:
+                # called from inside another traced call; it's already counted
+                return func(input_)
+
+            record: Record = {
+                "time": time(),
+                "pid": os.getpid(),
+                "input": input_[:MAX_INPUT_CHARS],
+                "length": len(input_),
+                "stages": {},
+            }
+            self.record = record
+            start = perf_counter()
+            try:
+                return func(input_)
+            except Exception as e:
+                record["error"] = f"{type(e).__name__}: {e}"
+                record["where"] = _where(e)
+                raise
+            finally:
+                record["total_ms"] = (perf_counter() - start) * 1000
+                if self.startup:
+                    record["startup"], self.startup = self.startup, None
+                self.record = None
+                self.write(record)
+
+        return traced
+
+    def write(self, record: Record) -> None:
+        import json
+
+        try:
+            with open(self.path, "a") as f:
+                f.write(json.dumps(record) + "\n")
+                size = f.tell()
+            if size > self.max_bytes:
+                self.rotate()
+        except OSError:
+            # tracing should never break a paste
+            pass
+
+    def rotate(self) -> None:
+        """
+        trace.jsonl -> trace.jsonl.1 -> trace.jsonl.2, dropping the oldest
+        """
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+
+def _provider_name(stage: str, res: Any) -> str:
+    if stage == "classify":
+        # providers are named after their formatters, like `_format_github`. The
+        # wrappers keep their names
+        return res.formatter.__name__.replace("_format_", "")
+    return stage
+
+
+def _where(e: BaseException) -> str:
+    import traceback
+
+    frames = traceback.extract_tb(e.__traceback__)
+    if not frames:
+        return ""
+    frame = frames[-1]
+    return f"{os.path.basename(frame.filename)}:{frame.lineno} in {frame.name}"
+
+
+def install(module: ModuleType, tracer: Tracer) -> Callable[[], None]:
+    """
+    Wraps `main` and each of `STAGES` in `module` (which is super_paste), plus
+    every provider's formatter. Returns a function that puts them back.
+    """
+    originals: Dict[str, Any] = {"main": module.main}
+    module.main = tracer.entry(module.main)
+    for attr, stage in STAGES.items():
+        originals[attr] = getattr(module, attr)
+        setattr(module, attr, tracer.stage(stage, originals[attr]))
+
+    formatters = {}
+    for provider in [*module.PROVIDERS, module.DEFAULT]:
+        formatters[provider] = provider.formatter
+        provider.formatter = tracer.stage("format", provider.formatter)
+
+    def uninstall() -> None:
+        for attr, original in originals.items():
+            setattr(module, attr, original)
+        for provider, formatter in formatters.items():
+            provider.formatter = formatter
+
+    return uninstall
+
+
+def read_records(path: str, backups: int = BACKUPS) -> Iterator[Record]:
+    """
+    Every record in the log and its rotated copies, oldest first.
+    """
+    import json
+
+    for name in [*(f"{path}.{i}" for i in range(backups, 0, -1)), path]:
+        try:
+            with open(name) as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        # cut off by a crash, or another process rotating the log
+                        continue
+        except FileNotFoundError:
+            continue
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def summarize(records: Iterable[Record], slowest: int = 5) -> List[str]:
+    """
+    Lines of a human readable report: percentiles for the whole call and each
+    stage, what the config's hooks cost, which providers were used, the
+    slowest inputs, and the most common errors.
+    """
+    records = list(records)
+    if not records:
+        return ["no traces yet; set TRACE = True in config.py and paste something"]
+
+    totals = [r["total_ms"] for r in records]
+    stages: Dict[str, List[float]] = {}
+    providers: Dict[str, int] = {}
+    errors: Dict[str, int] = {}
+    hook_ms = 0.0
+    for r in records:
+        for name, ms in r["stages"].items():
+            stages.setdefault(name, []).append(ms)
+            if name in HOOKS:
+                hook_ms += ms
+        provider = r.get("provider", "none")
+        providers[provider] = providers.get(provider, 0) + 1
+        if "error" in r:
+            key = f"{r['error']} ({r['where']})"
+            errors[key] = errors.get(key, 0) + 1
+
+    def row(name: str, samples: List[float]) -> str:
+        pcts = "  ".join(f"p{p} {percentile(samples, p):8.3f}" for p in (50, 90, 99))
+        return f"  {name:<16} {pcts}  max {max(samples):8.3f}"
+
+    lines = [
+        f"calls: {len(records)} ({sum(errors.values())} errors)",
+        "ms per call:",
+        row("total", totals),
+        *(row(name, samples) for name, samples in sorted(stages.items())),
+        f"config hooks: {hook_ms / sum(totals) * 100:.1f}% of all time",
+        "providers:",
+        *(
+            f"  {name:<16} {count}"
+            for name, count in sorted(providers.items(), key=lambda p: -p[1])
+        ),
+        "slowest:",
+        *(
+            f"  {r['total_ms']:8.3f}ms  {r.get('provider', 'none'):<16} {r['input']!r}"
+            for r in sorted(records, key=lambda r: -r["total_ms"])[:slowest]
+        ),
+    ]
+
+    startups = [r["startup"] for r in records if "startup" in r]
+    if startups:
+        lines.append("startup ms:")
+        for name in startups[0]:
+            lines.append(row(name, [s[name] for s in startups]))
+
+    if errors:
+        lines.append("errors:")
+        lines.extend(
+            f"  {count:>5}  {error}"
+            for error, count in sorted(errors.items(), key=lambda e: -e[1])
+        )
+    return lines
@@ -0,0 +1,83 @@
+from unittest.mock import patch
+
+import pytest
+
+from src.bulk import convert_many
+from src.canonical import Deduper
+from src.super_paste import main as main_func
+
+INPUTS = [
+    "https://github.com/xavdid/typed-install/pull/3",
+    "ABC-123",
+    "just text",
+    "https://gitlab.com/some-other-project/-/issues/50",  # can't be formatted
+    "https://neat.com",
+] * 7
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_convert_many_preserves_order(jobs):
+    expected = [
+        "[xavdid/typed-install#3](https://github.com/xavdid/typed-install/pull/3)",
+        "[ABC-123](https://test.atlassian.net/browse/ABC-123)",
+        "just text",
+        "https://gitlab.com/some-other-project/-/issues/50",
+        "[neat.com](https://neat.com)",
+    ] * 7
+
+    assert list(convert_many(INPUTS, jobs=jobs, batch_size=3)) == expected
+
+
+def test_convert_many_matches_main():
+    inputs = [i for i in INPUTS if "gitlab" not in i]
+    assert list(convert_many(inputs, jobs=2, batch_size=4)) == [
+        main_func(i) for i in inputs
+    ]
+
+
+def test_convert_many_stats():
+    stats = {}
+    list(convert_many(INPUTS, jobs=2, batch_size=3, stats=stats))
+
+    assert sum(worker.count for worker in stats.values()) == len(INPUTS)
+    assert all(worker.per_second > 0 for worker in stats.values())
+
+
+def test_convert_many_is_lazy():
+    def inputs():
+        yield "ABC-1"
+        raise AssertionError("read too far")
+
+    assert next(convert_many(inputs(), jobs=1, batch_size=1)) == (
+        "[ABC-1](https://test.atlassian.net/browse/ABC-1)"
+    )
+
+
+@patch("src.super_paste.custom_text", return_value="custom")
+def test_convert_many_uses_hooks(mocked_custom_text):
+    assert list(convert_many(["ABC-1", "x"], jobs=1)) == ["custom", "custom"]
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_convert_many_dedup(jobs):
+    inputs = [
+        "https://github.com/xavdid/typed-install/pull/3#issuecomment-1",
+        "https://test.atlassian.net/secure/RapidBoard.jspa?selectedIssue=PDE-2",
+        *INPUTS,
+        "https://test.atlassian.net/browse/PDE-2",
+        " https://neat.com",
+        "https://github.com/xavdid/typed-install/pull/3/",
+        "https://GitHub.com/xavdid/typed-install/pull/3",
+        "https://gitlab.com/a/b/-/issues/1#note_5",
+        "https://gitlab.com/a/b/-/issues/1",
+    ]
+    deduper = Deduper()
+    res = list(convert_many(inputs, jobs=jobs, batch_size=3, deduper=deduper))
+
+    # exactly what formatting each one would give, anchors and all
+    assert res == list(convert_many(inputs, jobs=1))
+    assert res[0] == (
+        "[xavdid/typed-install#3]"
+        "(https://github.com/xavdid/typed-install/pull/3#issuecomment-1)"
+    )
+    assert (deduper.total, deduper.formatted) == (len(inputs), 11)
@@ -0,0 +1,172 @@
+import os
+from unittest.mock import patch
+
+import pytest
+
+from src.cache import ResultCache, fingerprint
+from src.framing import decode
+from src.super_paste import config_fingerprint
+from src.super_paste import main as main_func
+from src.super_paste import paste
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "results.sqlite3")
+
+
+@pytest.fixture
+def cache(db_path):
+    cache = ResultCache(db_path, "abc")
+    yield cache
+    cache.close()
+
+
+def test_get_and_set(cache):
+    assert cache.get("ABC-123") is None
+    cache.set("ABC-123", "[ABC-123](...)")
+    assert cache.get("ABC-123") == "[ABC-123](...)"
+
+    assert cache.stats() == {"hits": 1, "misses": 1, "entries": 1}
+
+
+def test_shared_between_processes(cache, db_path):
+    cache.set("ABC-123", "out")
+
+    other = ResultCache(db_path, "abc")
+    assert other.get("ABC-123") == "out"
+    # counters are shared too
+    assert other.stats()["hits"] == 1
+    other.close()
+
+
+def test_new_fingerprint_misses(cache, db_path):
+    cache.set("ABC-123", "out")
+
+    other = ResultCache(db_path, "new config")
+    assert other.get("ABC-123") is None
+    other.set("DEF-456", "out")
+    other.close()
+
+    # old results are cleaned up once the new config writes
+    assert cache.stats()["entries"] == 0
+
+
+def test_ttl(db_path):
+    cache = ResultCache(db_path, "abc", ttl=60)
+    with patch("src.cache.time.time", return_value=1000):
+        cache.set("ABC-123", "out")
+
+    with patch("src.cache.time.time", return_value=1059):
+        assert cache.get("ABC-123") == "out"
+
+    with patch("src.cache.time.time", return_value=1061):
+        assert cache.get("ABC-123") is None
+
+
+def test_lru_eviction(db_path):
+    cache = ResultCache(db_path, "abc", max_entries=2)
+    with patch("src.cache.time.time", return_value=1):
+        cache.set("a", "1")
+    with patch("src.cache.time.time", return_value=2):
+        cache.set("b", "2")
+    with patch("src.cache.time.time", return_value=3):
+        # a is now more recently used than b
+        cache.get("a")
+    with patch("src.cache.time.time", return_value=4):
+        cache.set("c", "3")
+
+    fresh = ResultCache(db_path, "abc")
+    with patch("src.cache.time.time", return_value=5):
+        assert fresh.get("a") == "1"
+        assert fresh.get("b") is None
+        assert fresh.get("c") == "3"
+    assert fresh.stats()["entries"] == 2
+
+
+def test_fingerprint(tmp_path):
+    config = tmp_path / "config.py"
+    config.write_text("JIRA_URL = 'a'")
+    original = fingerprint([str(config)])
+
+    assert fingerprint([str(config)]) == original
+
+    config.write_text("JIRA_URL = 'b'")
+    assert fingerprint([str(config)]) != original
+    assert fingerprint([str(tmp_path / "missing.py")])
+
+
+@patch("src.super_paste.CACHE_RESULTS", True)
+@patch("src.super_paste._format_input", return_value="formatted")
+def test_main_uses_cache(mocked_format_input, cache):
+    with patch("src.super_paste._result_cache", cache):
+        assert main_func("ABC-123") == "formatted"
+        assert main_func("ABC-123") == "formatted"
+
+    assert mocked_format_input.call_count == 1
+
+
+@patch("src.super_paste._get_result_cache")
+def test_main_skips_cache_by_default(mocked_get_result_cache):
+    assert (
+        main_func("ABC-123") == "[ABC-123](https://test.atlassian.net/browse/ABC-123)"
+    )
+    assert not mocked_get_result_cache.called
+
+
+@patch("src.super_paste.CACHE_RESULTS", True)
+def test_invalid_utf8(cache, db_path):
+    # how --stdin, --framed and the daemon read a clipboard that isn't UTF-8
+    text = decode(b"caf\xe9 ABC-1")
+    expected = "[ABC-1](https://test.atlassian.net/browse/ABC-1)"
+    with patch("src.super_paste._result_cache", cache):
+        assert paste(text) == expected
+        assert paste(text) == expected
+
+    cache.set(text, text)
+    other = ResultCache(db_path, "abc")
+    assert other.get(text) == text
+    other.close()
+
+
+@patch("src.super_paste.CACHE_RESULTS", True)
+@patch("src.super_paste.FETCH_TITLES", True)
+def test_fallbacks_arent_cached(cache):
+    url = "https://neat.com/a"
+    with patch("src.super_paste._result_cache", cache), patch(
+        "src.super_paste._fetch_titles", return_value={}
+    ) as fetch:
+        # the fetch timed out, so this paste gets the domain...
+        assert main_func(url) == f"[neat.com]({url})"
+        # ...but the next one tries again
+        fetch.return_value = {url: "Neat"}
+        assert main_func(url) == f"[Neat]({url})"
+        assert main_func(url) == f"[Neat]({url})"
+
+    assert fetch.call_count == 2
+
+
+def test_fingerprint_stamped_files(tmp_path):
+    titles = tmp_path / "titles.sqlite3"
+    original = fingerprint([], [str(titles)])
+
+    titles.write_bytes(b"x")
+    first = fingerprint([], [str(titles)])
+    assert first != original
+
+    os.utime(titles, ns=(0, 0))
+    assert fingerprint([], [str(titles)]) != first
+
+
+def test_config_fingerprint_covers_titles_and_projects(tmp_path):
+    titles, projects = tmp_path / "titles.sqlite3", tmp_path / "projects.json"
+    with patch("src.super_paste.TITLES_PATH", str(titles)), patch(
+        "src.super_paste.JIRA_PROJECTS", str(projects)
+    ):
+        original = config_fingerprint()
+        titles.write_bytes(b"imported")
+        imported = config_fingerprint()
+        assert imported != original
+
+        projects.write_text('["ABC"]')
+        assert config_fingerprint() != imported
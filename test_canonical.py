@@ -0,0 +1,87 @@
+import random
+
+import pytest
+
+from src.bulk import convert_many
+from src.canonical import Deduper, canonical_key, canonical_url
+from test_fuzz import SEEDS, inputs, mutate
+
+
+@pytest.mark.parametrize(
+    ["urls", "canonical"],
+    [
+        (
+            [
+                "https://test.atlassian.net/browse/PDE-2572",
+                "https://test.atlassian.net/secure/RapidBoard.jspa?rapidView=13&projectKey=PDE&view=planning&selectedIssue=PDE-2572&issueLimit=100",
+            ],
+            "https://test.atlassian.net/browse/PDE-2572",
+        ),
+        (
+            [
+                "https://github.com/xavdid/typed-install/pull/3",
+                "https://github.com/xavdid/typed-install/pull/3#issuecomment-1",
+                "https://github.com/xavdid/typed-install/pull/3?w=1",
+                "https://github.com/xavdid/typed-install/pull/3;x",
+            ],
+            "https://github.com/xavdid/typed-install/pull/3",
+        ),
+    ],
+)
+def test_canonical_url(urls, canonical):
+    assert [canonical_url(url) for url in urls] == [canonical] * len(urls)
+
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        # line numbers matter
+        "https://github.com/a/b/blob/main/README.md#L16",
+        # and so do fragments on other sites, which might be routes
+        "https://neat.com/#/settings",
+        "https://neat.com/a?q=1",
+        " https://neat.com/a?q=1",
+        # these all format differently than their tidier spellings
+        "https://github.com/a/b/pull/3/",
+        "https://github.com/a/b/pull/3;x/",
+        "https://github.com/a/b?x=/commit/",
+        "https://gitlab.com/a/b/-/issues/1#note_5",
+        "https://gitlab.com/a/b/-/issues/1/",
+        "https://GitHub.com/xavdid/typed-install/pull/3",
+        "HTTPS://github.com/xavdid/typed-install/pull/3",
+        "https://NEAT.com/a",
+        "  https://github.com/xavdid/typed-install/pull/3\n",
+        " ABC-1\n",
+    ],
+)
+def test_canonical_url_keeps(url):
+    assert canonical_url(url) == url
+
+
+def test_deduper_stays_bounded():
+    deduper = Deduper(max_entries=2)
+    for i in range(5):
+        deduper.set(canonical_key(str(i)), str(i))
+    assert len(deduper.results) <= 2
+    assert deduper.get(canonical_key("4")) == "4"
+
+
+# spellings the fuzzer doesn't come up with on its own
+VARIANTS = ["", "/", "#issuecomment-1", "?w=1", ";x", ";x/", "?x=/commit/", "#L1"]
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_dedup_never_changes_the_output(seed):
+    rng = random.Random(seed)
+    corpus = list(inputs(seed))
+    for _ in range(len(corpus) // 2):
+        url = rng.choice(SEEDS) + rng.choice(VARIANTS)
+        corpus.append(url if rng.random() < 0.5 else mutate(rng, url))
+    rng.shuffle(corpus)
+
+    deduper = Deduper()
+    assert list(convert_many(corpus, jobs=1, deduper=deduper)) == list(
+        convert_many(corpus, jobs=1)
+    )
+    # some of them were actually deduped
+    assert deduper.formatted < deduper.total
@@ -0,0 +1,188 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from src.client import paste, request
+from src.daemon import PasteServer
+
+SRC = Path(__file__).parent / "src"
+
+
+@pytest.fixture
+def config_path(tmp_path):
+    path = tmp_path / "config.py"
+    path.write_text("JIRA_URL = 'https://test.atlassian.net'")
+    return str(path)
+
+
+@pytest.fixture
+def socket_path(tmp_path, config_path):
+    path = str(tmp_path / "sp.sock")
+    server = PasteServer(path, config_path=config_path)
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,))
+    thread.start()
+
+    yield path
+
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def test_request(socket_path):
+    assert (
+        request("https://github.com/xavdid/typed-install/pull/3", socket_path)
+        == "[xavdid/typed-install#3](https://github.com/xavdid/typed-install/pull/3)"
+    )
+
+
+def test_request_large_input(socket_path):
+    text = "asdf " * 100_000
+    assert request(text, socket_path) == text
+
+
+def test_request_invalid_utf8(socket_path):
+    # how client.py reads a clipboard that isn't UTF-8 from stdin
+    text = b"caf\xe9 \xff".decode("utf-8", "surrogateescape")
+    assert request(text, socket_path) == text
+
+
+def test_request_error(socket_path):
+    assert request("[bad", socket_path) == "[bad"
+    assert request("https://gitlab.com/a/-/issues/1", socket_path).startswith(
+        "! Alfred ERR !"
+    )
+
+
+def _slow_paste(text):
+    # like fetching a page title
+    time.sleep(0.75)
+    return "slow"
+
+
+@patch("src.daemon.super_paste.paste", _slow_paste)
+def test_request_waits_for_titles(socket_path):
+    with pytest.raises(OSError):
+        request("https://neat.com", socket_path)
+
+    with patch("src.client.config.FETCH_TITLES", True, create=True), patch(
+        "src.client.config.TITLE_TIMEOUT", 2.0, create=True
+    ):
+        assert request("https://neat.com", socket_path) == "slow"
+
+
+def test_request_without_daemon(tmp_path):
+    with pytest.raises(OSError):
+        request("ABC-123", str(tmp_path / "missing.sock"))
+
+
+@patch("src.client.request")
+def test_paste_uses_daemon(mocked_request):
+    mocked_request.return_value = "from the daemon"
+    assert paste("ABC-123") == "from the daemon"
+
+
+def test_paste_falls_back_in_process(tmp_path):
+    assert (
+        paste("ABC-123", str(tmp_path / "missing.sock"))
+        == "[ABC-123](https://test.atlassian.net/browse/ABC-123)"
+    )
+
+
+def test_server_cleans_up_socket(tmp_path, config_path):
+    path = str(tmp_path / "sp.sock")
+    # a stale file from a previous run doesn't stop the server from starting
+    open(path, "w").close()
+
+    server = PasteServer(path, config_path=config_path)
+    server.server_close()
+
+    assert not os.path.exists(path)
+
+
+@patch("src.daemon.importlib.reload")
+def test_reload_if_changed(mocked_reload, tmp_path, config_path):
+    server = PasteServer(str(tmp_path / "sp.sock"), config_path=config_path)
+
+    server.reload_if_changed()
+    assert not mocked_reload.called
+
+    stat = os.stat(config_path)
+    os.utime(config_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+    server.reload_if_changed()
+    assert mocked_reload.call_count == 2
+
+    # only once per edit
+    server.reload_if_changed()
+    assert mocked_reload.call_count == 2
+
+    server.server_close()
+
+
+@patch("src.daemon.importlib.reload")
+def test_reload_when_rules_change(mocked_reload, tmp_path, config_path):
+    rules_path = tmp_path / "rules.json"
+    server = PasteServer(
+        str(tmp_path / "sp.sock"), config_path=config_path, rules_path=str(rules_path)
+    )
+
+    server.reload_if_changed()
+    assert not mocked_reload.called
+
+    # creating the file counts as a change
+    rules_path.write_text("[]")
+    server.reload_if_changed()
+    assert mocked_reload.call_count == 2
+
+    server.server_close()
+
+
+def test_client_finds_daemon_started_from_a_terminal(tmp_path):
+    # the daemon is started by hand, while the client runs under Alfred, which
+    # sets its own variables (and maybe a different TMPDIR)
+    terminal = {**os.environ, "HOME": str(tmp_path), "TMPDIR": str(tmp_path)}
+    for name in ["alfred_workflow_cache", "alfred_workflow_data"]:
+        terminal.pop(name, None)
+    alfred = {
+        **terminal,
+        "alfred_workflow_cache": str(tmp_path / "cache"),
+        "alfred_workflow_data": str(tmp_path / "data"),
+        "TMPDIR": "/tmp",
+    }
+
+    daemon = subprocess.Popen([sys.executable, "daemon.py"], env=terminal, cwd=SRC)
+    try:
+        socket_path = tmp_path / ".super_paste" / "super_paste.sock"
+        for _ in range(100):
+            if socket_path.exists():
+                break
+            time.sleep(0.05)
+
+        # `request` raises if there's no daemon, rather than falling back
+        res = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "import sys, client; print(client.request(sys.argv[1]))",
+                "https://github.com/xavdid/typed-install/pull/3",
+            ],
+            capture_output=True,
+            text=True,
+            check=True,
+            env=alfred,
+            cwd=SRC,
+        )
+    finally:
+        daemon.terminate()
+        daemon.wait()
+
+    assert res.stdout == (
+        "[xavdid/typed-install#3](https://github.com/xavdid/typed-install/pull/3)\n"
+    )
@@ -0,0 +1,196 @@
+import marshal
+import os
+from unittest.mock import patch
+
+import pytest
+
+from src import super_paste
+from src.document import DocumentRewriter, rewrite_file, rewrite_tree
+
+DOC = """# Runbook
+
+See ABC-1 and https://github.com/xavdid/typed-install/pull/3.
+Already done: [ABC-2](https://test.atlassian.net/browse/ABC-2)
+Code like `ABC-3` stays, and so does <img src="https://neat.com/a.png">
+
+```
+ABC-4 https://neat.com
+```
+
+[docs]: https://neat.com/docs
+"""
+
+LINKED = """# Runbook
+
+See [ABC-1](https://test.atlassian.net/browse/ABC-1) and [xavdid/typed-install#3](https://github.com/xavdid/typed-install/pull/3).
+Already done: [ABC-2](https://test.atlassian.net/browse/ABC-2)
+Code like `ABC-3` stays, and so does <img src="https://neat.com/a.png">
+
+```
+ABC-4 https://neat.com
+```
+
+[docs]: https://neat.com/docs
+"""
+
+
+@pytest.fixture
+def counted():
+    """
+    counts how many lines actually get linkified
+    """
+    with patch(
+        "src.super_paste.linkify_line", wraps=super_paste.linkify_line
+    ) as linkify:
+        yield linkify
+
+
+def rewrite(rewriter, text):
+    return "".join(rewriter.rewrite(text.splitlines(keepends=True)))
+
+
+def test_rewrite():
+    assert rewrite(DocumentRewriter(), DOC) == LINKED
+
+
+def test_rewrite_is_idempotent():
+    assert rewrite(DocumentRewriter(), LINKED) == LINKED
+
+
+def test_only_changed_lines_are_linkified(counted):
+    rewriter = DocumentRewriter()
+    rewrite(rewriter, DOC)
+    assert counted.call_count == 7
+
+    counted.reset_mock()
+    edited = LINKED.replace("# Runbook\n", "# Runbook\n\nnew: ABC-9\n")
+    assert rewrite(rewriter, edited) == LINKED.replace(
+        "# Runbook\n",
+        "# Runbook\n\nnew: [ABC-9](https://test.atlassian.net/browse/ABC-9)\n",
+    )
+    counted.assert_called_once_with("new: ABC-9\n")
+    assert rewriter.rewritten == 1
+
+
+def test_unfenced_lines_are_linkified(counted):
+    rewriter = DocumentRewriter()
+    rewrite(rewriter, DOC)
+
+    # without its fences, the code block is prose that hasn't been seen before
+    assert "[ABC-4]" in rewrite(rewriter, LINKED.replace("```\n", ""))
+
+
+def test_rewrite_file(tmp_path, counted):
+    path = tmp_path / "README.md"
+    path.write_text(DOC.replace("\n", "\r\n"))
+    state = str(tmp_path / "state")
+
+    assert rewrite_file(str(path), state) == (11, 7)
+    assert path.read_bytes() == LINKED.replace("\n", "\r\n").encode()
+
+    # nothing to do, so the file is left alone
+    os.utime(path, ns=(0, 0))
+    assert rewrite_file(str(path), state) == (11, 0)
+    assert path.stat().st_mtime_ns == 0
+    assert sorted(os.listdir(tmp_path)) == ["README.md", "state"]
+
+
+def test_config_changes_rewrite_everything(tmp_path, counted):
+    path = tmp_path / "README.md"
+    path.write_text(DOC)
+    state = str(tmp_path / "state")
+    rewrite_file(str(path), state)
+
+    with patch("src.super_paste.config_fingerprint", return_value="new"):
+        assert rewrite_file(str(path), state) == (11, 7)
+
+
+def test_pasting_text_with_links():
+    assert super_paste.main("[a](https://neat.com), ABC-1 and https://b.com") == (
+        "[a](https://neat.com), [ABC-1](https://test.atlassian.net/browse/ABC-1)"
+        " and [b.com](https://b.com)"
+    )
+
+
+def test_rewrite_tree(tmp_path):
+    notes = tmp_path / "notes"
+    (notes / "sub").mkdir(parents=True)
+    (notes / ".git").mkdir()
+    (notes / "a.md").write_text("ABC-1\n")
+    (notes / "sub" / "b.markdown").write_text("ABC-2\n")
+    (notes / "plain.md").write_text("nothing to link\n")
+    (notes / "c.txt").write_text("ABC-3\n")
+    (notes / ".git" / "d.md").write_text("ABC-4\n")
+    index = str(tmp_path / "index")
+
+    stats = rewrite_tree(str(notes), index)
+    # only files that got new links count
+    assert (stats["files"], stats["linkified"]) == (3, 2)
+    assert (notes / "a.md").read_text() == (
+        "[ABC-1](https://test.atlassian.net/browse/ABC-1)\n"
+    )
+    assert (notes / "c.txt").read_text() == "ABC-3\n"
+    assert (notes / ".git" / "d.md").read_text() == "ABC-4\n"
+
+    with patch("src.document._rewrite_in_place") as rewrite:
+        # untouched files aren't even opened
+        with patch("src.document._file_digest") as digest:
+            assert rewrite_tree(str(notes), index)["linkified"] == 0
+        digest.assert_not_called()
+
+        # touched, but the same contents
+        os.utime(notes / "a.md", ns=(0, 0))
+        assert rewrite_tree(str(notes), index)["linkified"] == 0
+        rewrite.assert_not_called()
+
+    (notes / "sub" / "b.markdown").write_text("ABC-2 and ABC-5\n")
+    (notes / "plain.md").write_text("still nothing to link\n")
+    assert rewrite_tree(str(notes), index)["linkified"] == 1
+    assert "[ABC-5]" in (notes / "sub" / "b.markdown").read_text()
+
+
+def test_rewrite_tree_hashes_big_files(tmp_path):
+    path, index = tmp_path / "big.md", str(tmp_path / "index")
+    path.write_text("ABC-1\n" * 1000)
+    with patch("src.document.MMAP_THRESHOLD", 10):
+        assert rewrite_tree(str(tmp_path), index)["linkified"] == 1
+        os.utime(path, ns=(0, 0))
+        assert rewrite_tree(str(tmp_path), index)["linkified"] == 0
+
+
+def test_rewrite_tree_keeps_its_state_in_the_index(tmp_path, counted):
+    notes = tmp_path / "notes"
+    notes.mkdir()
+    (notes / "a.md").write_text("ABC-1\n")
+    (notes / "b.md").write_text("ABC-2\n")
+    index = str(tmp_path / "index")
+
+    # nothing is saved per file, in the cache or anywhere else
+    with patch("src.document.cache_path", side_effect=AssertionError):
+        rewrite_tree(str(notes), index)
+        assert sorted(os.listdir(tmp_path)) == ["index", "notes"]
+        assert sorted(os.listdir(notes)) == ["a.md", "b.md"]
+
+        # only the new line is linkified
+        counted.reset_mock()
+        with open(notes / "a.md", "a") as f:
+            f.write("ABC-3\n")
+        assert rewrite_tree(str(notes), index)["linkified"] == 1
+        counted.assert_called_once_with("ABC-3\n")
+
+        (notes / "b.md").unlink()
+        rewrite_tree(str(notes), index)
+
+    with open(index, "rb") as f:
+        assert list(marshal.load(f)[2]) == ["a.md"]
+
+
+def test_rewrite_tree_keeps_its_index_in_the_folder(tmp_path):
+    notes = tmp_path / "notes"
+    notes.mkdir()
+    (notes / "a.md").write_text("ABC-1\n")
+
+    with patch("src.document.cache_path", side_effect=AssertionError):
+        assert rewrite_tree(str(notes))["linkified"] == 1
+        assert rewrite_tree(str(notes))["linkified"] == 0
+    assert sorted(os.listdir(notes)) == [".super_paste.marshal", "a.md"]
@@ -0,0 +1,186 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from unittest.mock import patch
+
+import pytest
+
+from src.cache import ResultCache
+from src.enrich import fetch_titles, parse_title
+from src.super_paste import _process_url, stream
+
+PAGES = {
+    "/article": (200, "<html><head><title>A &amp; B\n  Article</title></head>"),
+    "/untitled": (200, "<html><body>nothing</body></html>"),
+    "/missing": (404, "<title>Not Found</title>"),
+    "/slow": (200, "<title>Slow</title>"),
+}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.server.connections.add(self.client_address)
+        self.server.requests += 1
+
+        if self.path == "/moved":
+            self.send_response(301)
+            self.send_header("Location", "/article")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        if self.path == "/chunked":
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for chunk in [b"<title>Chu", b"nked</title>"]:
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+            self.wfile.write(b"0\r\n\r\n")
+            return
+
+        if self.path == "/slow":
+            time.sleep(0.5)
+
+        status, body = PAGES[self.path.split("?")[0]]
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body.encode())))
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.connections = set()
+    server.requests = 0
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,))
+    thread.start()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+@pytest.fixture
+def base_url(server):
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ResultCache(str(tmp_path / "titles.sqlite3"), "titles")
+    yield cache
+    cache.close()
+
+
+def test_fetch_titles(base_url, cache):
+    urls = [f"{base_url}/{path}" for path in ["article", "untitled", "chunked"]]
+
+    assert fetch_titles(urls, cache=cache) == {
+        f"{base_url}/article": "A & B Article",
+        f"{base_url}/untitled": None,
+        f"{base_url}/chunked": "Chunked",
+    }
+
+
+def test_fetch_titles_follows_redirects(base_url, cache):
+    url = f"{base_url}/moved"
+    assert fetch_titles([url], cache=cache) == {url: "A & B Article"}
+
+
+def test_fetch_titles_leaves_out_failures(base_url, cache):
+    urls = [f"{base_url}/missing", "http://127.0.0.1:1/refused"]
+    assert fetch_titles(urls, cache=cache) == {}
+    # and doesn't cache them
+    assert cache.stats()["entries"] == 0
+
+
+def test_fetch_titles_timeout(base_url, cache):
+    start = time.perf_counter()
+    titles = fetch_titles(
+        [f"{base_url}/slow", f"{base_url}/article"], timeout=0.2, cache=cache
+    )
+
+    assert time.perf_counter() - start < 0.45
+    assert titles == {f"{base_url}/article": "A & B Article"}
+
+
+def test_fetch_titles_deadline(base_url, cache):
+    start = time.perf_counter()
+    titles = fetch_titles([f"{base_url}/slow"], timeout=5, deadline=0.2, cache=cache)
+
+    assert titles == {}
+    assert time.perf_counter() - start < 0.45
+
+
+def test_fetch_titles_reuses_connections(server, base_url, cache):
+    # more urls than connections allowed per host
+    urls = [f"{base_url}/article?page={i}" for i in range(12)]
+
+    assert set(fetch_titles(urls, cache=cache).values()) == {"A & B Article"}
+    assert server.requests == 12
+    assert len(server.connections) <= 4
+
+
+def test_fetch_titles_uses_cache(server, base_url, cache):
+    url = f"{base_url}/article"
+    fetch_titles([url], cache=cache)
+    fetch_titles([url], cache=cache)
+
+    assert server.requests == 1
+
+
+@pytest.mark.parametrize(
+    ["body", "expected"],
+    [
+        (b"<TITLE>Caps</TITLE>", "Caps"),
+        (b'<title data-x="y">Attrs</title>', "Attrs"),
+        (b"<title>  </title>", None),
+        (b"<title>unclosed", None),
+        (b"", None),
+    ],
+)
+def test_parse_title(body, expected):
+    assert parse_title(body) == expected
+
+
+@patch("src.super_paste.FETCH_TITLES", True)
+@patch("src.super_paste._fetch_titles")
+def test_process_url_with_titles(mocked_fetch_titles):
+    mocked_fetch_titles.return_value = {"https://neat.com/a": "Neat [thing]"}
+    assert _process_url("https://neat.com/a") == ("Neat (thing)", "https://neat.com/a")
+
+    # falls back to the domain
+    mocked_fetch_titles.return_value = {}
+    assert _process_url("https://neat.com/a") == ("neat.com", "https://neat.com/a")
+
+    # known providers are never fetched
+    mocked_fetch_titles.reset_mock()
+    _process_url("https://github.com/xavdid/typed-install/pull/3")
+    assert not mocked_fetch_titles.called
+
+
+@patch("src.super_paste.FETCH_TITLES", True)
+@patch("src.super_paste._fetch_titles")
+def test_stream_prefetches_titles(mocked_fetch_titles):
+    mocked_fetch_titles.return_value = {"https://neat.com": "Neat"}
+    out = StringIO()
+    stream(
+        StringIO("https://neat.com.\nhttps://github.com/a/b/pull/1 https://c.com\n"),
+        out,
+    )
+
+    # once for the whole batch, then once per url as it's formatted
+    first_call = mocked_fetch_titles.call_args_list[0]
+    assert first_call.args[0] == ["https://neat.com", "https://c.com"]
+    assert out.getvalue().startswith("[Neat](https://neat.com).\n")
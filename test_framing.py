@@ -0,0 +1,28 @@
+from io import BytesIO
+
+import pytest
+
+from src.framing import decode, encode, read_frame, write_frame
+
+
+def test_round_trip():
+    stream = BytesIO()
+    bodies = [b"https://neat.com", b"", b"multi\nline\n", "é😀".encode()]
+    for body in bodies:
+        write_frame(stream, body)
+
+    stream.seek(0)
+    assert [read_frame(stream) for _ in range(len(bodies) + 1)] == [*bodies, None]
+
+
+@pytest.mark.parametrize(
+    "data", [b"abc\nxyz", b"12", b"-1\n", b"1" * 100 + b"\nx", b"5\nabc"]
+)
+def test_invalid_frames(data):
+    with pytest.raises(ValueError):
+        read_frame(BytesIO(data))
+
+
+def test_invalid_utf8_survives():
+    data = b"caf\xe9"
+    assert encode(decode(data)) == data
@@ -0,0 +1,139 @@
+"""
+Throws lots of random and adversarial clipboards at every parsing path, to
+catch inputs that crash or freeze a paste before a user finds them.
+
+Inputs come from a seeded generator, so failures are reproducible. Set
+FUZZ_EXAMPLES to run more of them (the default keeps the suite quick):
+
+    FUZZ_EXAMPLES=1000000 pytest test_fuzz.py
+"""
+
+import os
+import random
+import time
+
+import pytest
+
+from src.patterns import parse_markdown_link, scan
+from src.super_paste import _process_text, linkify_line, main
+from test_super_paste import provider_tests
+
+EXAMPLES = int(os.environ.get("FUZZ_EXAMPLES", 3000))
+
+MB = 1024 * 1024
+
+# generous enough for a slow machine; a normal paste takes microseconds
+CEILING_SECONDS = 0.05
+# big clipboards get longer, but only linearly. A megabyte of nothing but jira
+# tags is ~175k links to format, which takes a while
+CEILING_SECONDS_PER_MB = 2.0
+
+SEEDS = [
+    url for tests in provider_tests.values() for url, _ in tests
+] + [
+    "https://test.atlassian.net/browse/ABC-123",
+    "https://hosted.git.test.com/xavdid/typed-install/pull/3",
+    "https://hosted.git.test.com/gist/abc",
+    "ABC-123",
+    "go/thing",
+    "[text](https://neat.com)",
+]
+
+# pieces that mean something to one parser or another
+PIECES = [
+    "/", "//", "://", "-/", "#", "?", ";", "@", ":", ".", "[", "]", "(", ")", "`",
+    "<", ">", " ", "\t", "\n", "pull", "issues", "blob", "commit", "gist",
+    "merge_requests", "browse", "ABC-1", "UTF-8", "go/", "https://", "http://",
+    "\x00", "é", "😀", "%20",
+]
+
+
+def mutate(rng: random.Random, text: str) -> str:
+    """
+    a handful of random edits: inserting pieces, deleting, duplicating
+    """
+    for _ in range(rng.randint(1, 5)):
+        i = rng.randint(0, len(text))
+        op = rng.random()
+        if op < 0.4:
+            text = text[:i] + rng.choice(PIECES) + text[i:]
+        elif op < 0.7:
+            text = text[:i] + text[i + rng.randint(1, 10) :]
+        elif op < 0.85:
+            text = text[:i] + text[i : i + rng.randint(1, 20)] * 2 + text[i:]
+        else:
+            text = text[:i] + chr(rng.randint(0, 0x2FFF)) + text[i:]
+    return text
+
+
+def random_input(rng: random.Random) -> str:
+    kind = rng.random()
+    if kind < 0.6:
+        return mutate(rng, rng.choice(SEEDS))
+    if kind < 0.9:
+        return "".join(rng.choice(PIECES) for _ in range(rng.randint(0, 30)))
+    return "".join(chr(rng.randint(0, 0x10FFFF)) for _ in range(rng.randint(0, 30)))
+
+
+def inputs(seed: int):
+    rng = random.Random(seed)
+    for _ in range(EXAMPLES):
+        yield random_input(rng)
+
+
+def check(func, text: str, allowed=(ValueError,)) -> None:
+    start = time.perf_counter()
+    try:
+        func(text)
+    except allowed:
+        pass
+    except Exception as e:
+        raise AssertionError(f"{func.__name__}({text[:200]!r}) raised {e!r}") from e
+
+    elapsed = time.perf_counter() - start
+    ceiling = CEILING_SECONDS + CEILING_SECONDS_PER_MB * len(text) / MB
+    assert elapsed < ceiling, f"{func.__name__}({text[:200]!r}) took {elapsed:.3f}s"
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_main(seed):
+    for text in inputs(seed):
+        # the only documented failure is a ValueError for things we can't format
+        check(main, text)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_text_and_documents(seed):
+    for text in inputs(seed):
+        # these never fail; anything unformattable is left alone
+        check(_process_text, text, allowed=())
+        check(linkify_line, text, allowed=())
+        check(parse_markdown_link, text, allowed=())
+        check(lambda text: list(scan(text)), text, allowed=())
+
+
+# each is repeated to this size; bench_super_paste.py goes much bigger
+HUGE = MB // 4
+
+ADVERSARIAL = [
+    "A",
+    "AB-",
+    "[",
+    "](",
+    "[a](",
+    "`",
+    "<https://",
+    "https://",
+    "/",
+    "go/",
+    "a" * 100 + " ",
+    "ABC-1 ",
+]
+
+
+@pytest.mark.parametrize("chunk", ADVERSARIAL)
+@pytest.mark.parametrize("prefix", ["", "https://github.com/", "[x]("])
+def test_huge_clipboards(chunk, prefix):
+    text = prefix + chunk * (HUGE // len(chunk))
+    check(main, text)
+    check(linkify_line, text, allowed=())
@@ -0,0 +1,110 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from unittest.mock import patch
+
+import pytest
+
+from src import super_paste
+from src.history import DEFAULT_SLOT_SIZE, HEADER_SIZE, History
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "history.bin")
+
+
+def test_append_and_search(path):
+    history = History(path, slots=10)
+    history.append("github", "a/b#1", "github.com", "https://github.com/a/b/pull/1", 1)
+    history.append("jira", "ABC-1", "test.atlassian.net", "ABC-1", 2)
+    history.append("text", "", "", "just text", 3)
+
+    assert [e.tag for e in history.entries()] == ["", "ABC-1", "a/b#1"]
+    assert [e.tag for e in history.search("GITHUB")] == ["a/b#1"]
+    assert [e.tag for e in history.search("abc")] == ["ABC-1"]
+    assert [e.input for e in history.search(limit=2)] == ["just text", "ABC-1"]
+    history.close()
+
+    # it's all still there for the next paste
+    (entry,) = History(path).search("a/b")
+    assert entry == (1, "github", "a/b#1", "github.com", "https://github.com/a/b/pull/1")
+
+
+def test_stays_bounded(path):
+    history = History(path, slots=3)
+    size = os.path.getsize(path)
+    for i in range(10):
+        history.append("text", f"tag {i}", "", "x" * 10_000)
+
+    assert os.path.getsize(path) == size == HEADER_SIZE + 3 * DEFAULT_SLOT_SIZE
+    entries = history.entries()
+    assert [e.tag for e in entries] == ["tag 9", "tag 8", "tag 7"]
+    # long inputs are cut to fit
+    assert entries[0].input == "x" * len(entries[0].input)
+
+
+def test_keeps_existing_layout(path):
+    History(path, slots=3).close()
+    assert History(path, slots=100).slots == 3
+
+
+def test_not_a_history_file(path):
+    with open(path, "wb") as f:
+        f.write(b"hello there")
+    with pytest.raises(ValueError):
+        History(path)
+
+
+def _append_many(path, worker):
+    history = History(path, slots=1000)
+    for i in range(100):
+        history.append("text", f"{worker}-{i}", "", "")
+    history.close()
+
+
+def test_concurrent_writers(path):
+    with ProcessPoolExecutor(4) as pool:
+        list(pool.map(_append_many, [path] * 4, range(4)))
+
+    tags = [e.tag for e in History(path).entries()]
+    # nothing was lost or overwritten
+    assert sorted(tags) == sorted(f"{w}-{i}" for w in range(4) for i in range(100))
+
+
+@patch("src.super_paste.HISTORY", True)
+def test_pastes_are_recorded(path):
+    with patch("src.super_paste.HISTORY_PATH", path), patch(
+        "src.super_paste._history", None
+    ):
+        super_paste.paste("https://github.com/a/b/pull/1")
+        super_paste.paste("hello")
+        super_paste.paste("https://gitlab.com/a/-/issues/1")  # an error
+
+        entries = super_paste._get_history().entries()
+        assert [entry[1:] for entry in entries] == [
+            ("text", "", "", "hello"),
+            ("github", "a/b#1", "github.com", "https://github.com/a/b/pull/1"),
+        ]
+        super_paste._get_history().close()
+
+
+@patch("src.super_paste.HISTORY", True)
+def test_the_provider_that_formatted_it_is_recorded(path):
+    def custom_url(url):
+        if "corp.com" in url:
+            return "corp", "https://github.com/corp"
+        return None
+
+    with patch("src.super_paste.HISTORY_PATH", path), patch(
+        "src.super_paste._history", None
+    ), patch("src.super_paste.custom_url", custom_url):
+        super_paste.paste("https://corp.com/1")
+        super_paste.paste("ABC-123")
+
+        entries = super_paste._get_history().entries()
+        # not `github`, even though that's where the link goes
+        assert [(entry.provider, entry.host) for entry in entries] == [
+            ("jira", "test.atlassian.net"),
+            ("custom_url", "github.com"),
+        ]
+        super_paste._get_history().close()
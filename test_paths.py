@@ -0,0 +1,33 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+SRC = Path(__file__).parent / "src"
+
+PRINT_DIRS = "import paths; print(paths.CACHE_DIR); print(paths.DATA_DIR)"
+
+
+def _dirs(env):
+    return subprocess.run(
+        [sys.executable, "-c", PRINT_DIRS],
+        capture_output=True,
+        text=True,
+        check=True,
+        env=env,
+        cwd=SRC,
+    ).stdout
+
+
+def test_same_dirs_with_and_without_alfred(tmp_path):
+    terminal = {**os.environ, "HOME": str(tmp_path)}
+    for name in ["alfred_workflow_cache", "alfred_workflow_data"]:
+        terminal.pop(name, None)
+    alfred = {
+        **terminal,
+        "alfred_workflow_cache": str(tmp_path / "cache"),
+        "alfred_workflow_data": str(tmp_path / "data"),
+    }
+
+    assert _dirs(terminal) == _dirs(alfred)
+    assert _dirs(terminal).startswith(str(tmp_path))
@@ -0,0 +1,68 @@
+import re
+
+import pytest
+
+from src.patterns import ISSUE_TAG, parse_markdown_link, scan
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "",
+        "[",
+        "[]()",
+        "[LINK](https://neat.com)",
+        "[LINK](https://neat.com) and more",
+        "[a](b)(c)",
+        "[a](b)](c)",
+        "[a [b]](c)",
+        "[a](b\n[c](d)",
+        "[a]\n(b)",
+        "LINK](https://neat.com)",
+        "[[[[](((",
+        "[" + "](" * 50 + ")",
+    ],
+)
+def test_parse_markdown_link_matches_regex(text):
+    """
+    this replaced a regex, so it should behave exactly like it
+    """
+    match = re.match(r"\[(.*)\]\((.*)\)", text)
+    assert parse_markdown_link(text) == (match.groups() if match else None)
+
+
+@pytest.mark.parametrize(
+    "text",
+    ["ABC-123", "xABC-123", "aaBB_CC-1 and DD-2", "A-1", "AAAA", "UTF-8"],
+)
+def test_issue_tag_matches_regex(text):
+    match = re.search(r"[A-Z_]{2,}-\d+", text)
+    tag = ISSUE_TAG.search(text)
+    assert (tag.group() if tag else None) == (match.group() if match else None)
+
+
+def test_scan():
+    text = "`ABC-1` [a](https://b.com) <https://c.com> https://d.com ABC-2 go/e"
+
+    assert [(t.kind, t.text) for t in scan(text)] == [
+        ("code", "`ABC-1`"),
+        ("link", "[a](https://b.com)"),
+        ("autolink", "<https://c.com>"),
+        ("url", "https://d.com"),
+        ("tag", "ABC-2"),
+        ("go_link", "go/e"),
+    ]
+
+
+@pytest.mark.parametrize(
+    "text", ["ago/e", "https://neat.com/go/e", "go/e/f", "abc-1", "ABC-1a"]
+)
+def test_scan_ignores_partial_tokens(text):
+    assert [t.kind for t in scan(text)] in ([], ["url"])
+
+
+def test_scan_offsets():
+    text = "see ABC-1 now"
+    (token,) = scan(text)
+
+    assert text[token.start : token.end] == token.text == "ABC-1"
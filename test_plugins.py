@@ -0,0 +1,174 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from src.plugins import PluginTable, build_manifest, discover, load_manifest
+from src.super_paste import _process_url
+
+SCRIPT = Path(__file__).parent / "src" / "super_paste.py"
+
+TICKETS = """
+HOSTS = ("tickets.corp.com",)
+
+def format(url, parsed_url):
+    return f"ticket {parsed_url.path_segment(1)}", url
+"""
+
+WIKI = """
+SUBDOMAINS_OF = ("wiki.corp.com",)
+
+def format(url, parsed_url):
+    # only pages get nice text
+    if "/pages/" in url:
+        return "wiki", url
+    return None
+"""
+
+
+@pytest.fixture
+def plugin_dir(tmp_path, monkeypatch):
+    (tmp_path / "corp_tickets.py").write_text(TICKETS)
+    (tmp_path / "corp_wiki.py").write_text(WIKI)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield tmp_path
+    for name in ["corp_tickets", "corp_wiki", "corp_broken"]:
+        sys.modules.pop(name, None)
+
+
+@pytest.fixture
+def table(plugin_dir):
+    return build_manifest(
+        [("tickets", "corp_tickets"), ("wiki", "corp_wiki")],
+        str(plugin_dir / "plugins.marshal"),
+    )
+
+
+@pytest.fixture
+def installed(plugin_dir):
+    """
+    registers the plugins like an installed package would, for `discover`
+    """
+    dist_info = plugin_dir / "corp_plugins-1.0.dist-info"
+    dist_info.mkdir()
+    (dist_info / "METADATA").write_text("Name: corp-plugins\nVersion: 1.0\n")
+    (dist_info / "entry_points.txt").write_text(
+        "[super_paste.providers]\ntickets = corp_tickets\nwiki = corp_wiki\n"
+    )
+    return plugin_dir
+
+
+def test_find():
+    table = PluginTable({"a.com": "a"}, {"b.com": "b", "x.b.com": "xb"})
+    assert table.find("a.com") == "a"
+    assert table.find("sub.a.com") is None
+    assert table.find("b.com") is None
+    assert table.find("y.b.com") == "b"
+    assert table.find("y.x.b.com") == "xb"
+
+
+def test_manifest_round_trip(table, plugin_dir):
+    loaded = load_manifest(str(plugin_dir / "plugins.marshal"))
+    assert (loaded.hosts, loaded.subdomains) == (table.hosts, table.subdomains)
+    assert not load_manifest(str(plugin_dir / "missing.marshal"))
+
+
+def test_invalid_plugins(plugin_dir):
+    (plugin_dir / "corp_broken.py").write_text("HOSTS = ('x.com',)")
+    for module in ["corp_broken", "corp_missing"]:
+        with pytest.raises(ValueError):
+            build_manifest([("broken", module)], str(plugin_dir / "m.marshal"))
+
+
+def test_plugins_go_before_providers(table):
+    with patch("src.super_paste._plugins", table), patch(
+        "src.super_paste._plugins_loaded", True
+    ):
+        assert _process_url("https://tickets.corp.com/123") == (
+            "ticket 123",
+            "https://tickets.corp.com/123",
+        )
+        assert _process_url("https://a.wiki.corp.com/pages/1")[0] == "wiki"
+        # plugins can pass
+        assert _process_url("https://a.wiki.corp.com/other")[0] == "a.wiki.corp.com"
+
+
+def test_uninstalled_plugins_are_skipped():
+    table = PluginTable({"github.com": "corp_missing"}, {})
+    with patch("src.super_paste._plugins", table), patch(
+        "src.super_paste._plugins_loaded", True
+    ):
+        assert _process_url("https://github.com/a/b/pull/1")[0] == "a/b#1"
+
+
+def test_discover():
+    class EntryPoint:
+        def __init__(self, name, value):
+            self.name, self.value = name, value
+
+    class EntryPoints(list):
+        def select(self, group):
+            return self if group == "super_paste.providers" else []
+
+    found = EntryPoints([EntryPoint("a", "pkg.a:thing"), EntryPoint("b", "pkg.b")])
+    with patch("importlib.metadata.entry_points", return_value=found):
+        assert list(discover()) == [("a", "pkg.a"), ("b", "pkg.b")]
+
+
+# pastes in a fresh process (like Alfred does), then lists what's been imported
+PASTE = """
+import sys
+import super_paste
+print(super_paste.paste(sys.argv[1]))
+print(" ".join(sys.modules))
+"""
+
+
+def _env(plugin_dir, **extra):
+    env = {**os.environ, "HOME": str(plugin_dir), "PYTHONPATH": str(plugin_dir)}
+    for name in ["alfred_workflow_cache", "alfred_workflow_data"]:
+        env.pop(name, None)
+    return {**env, **extra}
+
+
+def _imported(text, plugin_dir):
+    # Alfred sets its own folders, which shouldn't change where the manifest is
+    env = _env(
+        plugin_dir,
+        alfred_workflow_cache=str(plugin_dir / "cache"),
+        alfred_workflow_data=str(plugin_dir / "data"),
+    )
+    res = subprocess.run(
+        [sys.executable, "-c", PASTE, text],
+        capture_output=True,
+        text=True,
+        check=True,
+        env=env,
+        cwd=SCRIPT.parent,
+    )
+    out, modules = res.stdout.splitlines()
+    return out, set(modules.split())
+
+
+def test_unused_plugins_are_never_imported(installed):
+    # run by hand from a terminal, as the README says
+    res = subprocess.run(
+        [sys.executable, str(SCRIPT), "--plugins"],
+        capture_output=True,
+        text=True,
+        check=True,
+        env=_env(installed),
+    )
+    assert res.stdout == "tickets.corp.com: corp_tickets\n*.wiki.corp.com: corp_wiki\n"
+
+    out, imported = _imported("https://tickets.corp.com/123", installed)
+    assert out == "[ticket 123](https://tickets.corp.com/123)"
+    assert "corp_tickets" in imported
+    assert "corp_wiki" not in imported
+
+    out, imported = _imported("https://github.com/a/b/pull/1", installed)
+    assert out == "[a/b#1](https://github.com/a/b/pull/1)"
+    assert not {"corp_tickets", "corp_wiki", "importlib.metadata"} & imported
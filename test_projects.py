@@ -0,0 +1,62 @@
+import json
+
+import pytest
+
+from src.projects import load_projects
+
+PROJECTS = {
+    "ABC": "https://one.atlassian.net",
+    "OPS2": "https://two.atlassian.net/",
+}
+
+
+def test_find_all():
+    index = load_projects(PROJECTS, "https://default.atlassian.net")
+    text = "fixed ABC-1, OPS2-22 (not UTF-8, SHA-256, xABC-3 or ABC-4x) then ABC-5."
+
+    assert list(index.find_all(text)) == [
+        ("ABC-1", "https://one.atlassian.net"),
+        ("OPS2-22", "https://two.atlassian.net"),
+        ("ABC-5", "https://one.atlassian.net"),
+    ]
+
+
+def test_find():
+    index = load_projects(PROJECTS, "https://default.atlassian.net")
+    assert index.find("UTF-8 then ABC-1") == ("ABC-1", "https://one.atlassian.net")
+    assert index.find("UTF-8") is None
+
+
+def test_list_uses_default_url():
+    index = load_projects(["ABC"], "https://default.atlassian.net")
+    assert index.find("ABC-1") == ("ABC-1", "https://default.atlassian.net")
+
+
+@pytest.mark.parametrize(
+    "contents", [["ABC"], {"ABC": "https://x.com"}, [{"key": "ABC", "id": "1"}]]
+)
+def test_load_from_file(tmp_path, contents):
+    path = tmp_path / "projects.json"
+    path.write_text(json.dumps(contents))
+
+    index = load_projects(str(path), "https://x.com")
+    assert index.find("ABC-1") == ("ABC-1", "https://x.com")
+
+
+@pytest.mark.parametrize("projects", [3, None])
+def test_load_invalid(projects):
+    with pytest.raises(ValueError):
+        load_projects(projects, "https://x.com")
+
+
+def test_load_missing_file(tmp_path):
+    with pytest.raises(ValueError, match="couldn't load Jira projects"):
+        load_projects(str(tmp_path / "nope.json"), "https://x.com")
+
+
+def test_linear_on_huge_input():
+    index = load_projects(PROJECTS, "https://x.com")
+    # a long run of capitals with no dash can't be re-scanned from each letter
+    assert list(index.find_all("A" * 1_000_000 + " ABC-1")) == [
+        ("ABC-1", "https://one.atlassian.net")
+    ]
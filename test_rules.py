@@ -0,0 +1,125 @@
+import json
+from unittest.mock import patch
+
+import pytest
+
+from src.rules import compile_rules, load_rules
+from src.urls import parse_url
+
+RULES = [
+    {"host": "tickets.corp.com", "path": "/{project}/{id}", "tag": "{project}-{id}"},
+    {"host": "tickets.corp.com", "tag": "tickets"},
+    {"subdomains_of": "wiki.corp.com", "path": "/pages/**", "tag": "wiki: {host}"},
+    {
+        "host": "go.corp.com",
+        "path": "/*",
+        "tag": "go/{1}",
+        "href": "https://go.corp.com/{1}",
+    },
+]
+
+
+def match(table, url):
+    return table.match(url, parse_url(url))
+
+
+@pytest.mark.parametrize(
+    ["url", "expected"],
+    [
+        ("https://tickets.corp.com/ops/12", "ops-12"),
+        # falls through to the next rule for the host
+        ("https://tickets.corp.com/ops/12/comments", "tickets"),
+        ("https://eng.wiki.corp.com/pages/a/b/c", "wiki: eng.wiki.corp.com"),
+        ("https://a.b.wiki.corp.com/pages", "wiki: a.b.wiki.corp.com"),
+        # only subdomains
+        ("https://wiki.corp.com/pages/a", None),
+        ("https://eng.wiki.corp.com/blog/a", None),
+        ("https://nope.corp.com/ops/12", None),
+    ],
+)
+def test_match(url, expected):
+    res = match(compile_rules(RULES), url)
+    if expected is None:
+        assert res is None
+    else:
+        assert res == (expected, url)
+
+
+def test_match_href():
+    assert match(compile_rules(RULES), "https://go.corp.com/thing?q=1") == (
+        "go/thing",
+        "https://go.corp.com/thing",
+    )
+
+
+def test_empty_table_is_falsy():
+    assert not compile_rules([])
+    assert compile_rules(RULES)
+
+
+@pytest.mark.parametrize(
+    "rules",
+    [
+        {"host": "a.com", "tag": "a"},
+        [{"host": "a.com"}],
+        [{"tag": "a"}],
+        ["a.com"],
+    ],
+)
+def test_compile_invalid(rules):
+    with pytest.raises(ValueError):
+        compile_rules(rules)
+
+
+def test_load_missing(tmp_path):
+    assert not load_rules(str(tmp_path / "rules.json"), str(tmp_path / "cache"))
+
+
+def test_load_uses_cache(tmp_path):
+    rules_path = tmp_path / "rules.json"
+    cache_path = tmp_path / "rules.marshal"
+    rules_path.write_text(json.dumps(RULES))
+
+    table = load_rules(str(rules_path), str(cache_path))
+    assert cache_path.exists()
+
+    with patch("json.load") as mocked_load:
+        cached = load_rules(str(rules_path), str(cache_path))
+    assert not mocked_load.called
+    assert cached.hosts == table.hosts
+    assert cached.subdomains == table.subdomains
+
+
+def test_load_recompiles_when_changed(tmp_path):
+    rules_path = tmp_path / "rules.json"
+    cache_path = tmp_path / "rules.marshal"
+    rules_path.write_text(json.dumps(RULES))
+    load_rules(str(rules_path), str(cache_path))
+
+    rules_path.write_text(json.dumps([{"host": "new.com", "tag": "new"}]))
+    table = load_rules(str(rules_path), str(cache_path))
+    assert match(table, "https://new.com/") == ("new", "https://new.com/")
+    assert match(table, "https://tickets.corp.com/ops/12") is None
+
+
+def test_load_ignores_corrupt_cache(tmp_path):
+    rules_path = tmp_path / "rules.json"
+    cache_path = tmp_path / "rules.marshal"
+    rules_path.write_text(json.dumps(RULES))
+    cache_path.write_bytes(b"garbage")
+
+    assert load_rules(str(rules_path), str(cache_path))
+
+
+def test_load_invalid_json(tmp_path):
+    rules_path = tmp_path / "rules.json"
+    rules_path.write_text("[{")
+
+    with pytest.raises(ValueError, match="couldn't parse rules file"):
+        load_rules(str(rules_path), str(tmp_path / "rules.marshal"))
+
+
+def test_unknown_placeholder():
+    table = compile_rules([{"host": "a.com", "tag": "{nope}"}])
+    with pytest.raises(ValueError, match="unknown placeholder"):
+        match(table, "https://a.com/b")
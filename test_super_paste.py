@@ -1,9 +1,36 @@
+import subprocess
+import sys
+from io import StringIO
+from pathlib import Path
 from unittest.mock import patch
 
 import pytest
 
-from src.super_paste import _process_text, _process_url, find_go_link, find_issue_tag
+from src.rules import compile_rules
+from src.super_paste import (
+    DEFAULT,
+    GHE_TEMPLATE,
+    GIST,
+    GITHUB,
+    GITLAB,
+    JIRA,
+    JIRA_TEMPLATE,
+    LARGE_INPUT,
+    SLACK,
+    Instance,
+    Routes,
+    _load_instances,
+    _lookup_host,
+    _process_text,
+    _process_url,
+    find_go_link,
+    find_issue_tag,
+    linkify_line,
+    linkify_lines,
+)
 from src.super_paste import main as main_func
+from src.super_paste import stream
+from src.urls import parse_url
 
 github_tests = [
     (
@@ -20,6 +47,19 @@ github_tests = [
         "commit",
     ),
     ("https://github.com/xavdid/typed-install/pulls", "github"),
+    # extra bits after the number
+    (
+        "https://github.com/xavdid/typed-install/pull/3/files?w=1",
+        "xavdid/typed-install#3",
+    ),
+    (
+        "https://github.com/xavdid/typed-install/issues/1#issuecomment-1",
+        "xavdid/typed-install#1",
+    ),
+    ("https://github.com/xavdid/typed-install/pull/", "github"),
+    # the keywords aren't where they should be
+    ("https://github.com/xavdid/pull/3", "github"),
+    ("https://github.com/xavdid/typed-install#/blob/x", "github"),
     # folder, trailing slash
     (
         "https://github.com/zapier/zapier-platform/blob/master/packages/core/src/checks/",
@@ -58,6 +98,13 @@ github_tests = [
 ]
 
 
+def routes(url: str, template: str = JIRA_TEMPLATE):
+    """
+    a routing table with a single instance, for patching over the configured ones
+    """
+    return Routes([Instance(url, template)])
+
+
 @pytest.mark.parametrize(
     ["text", "expected"],
     [
@@ -126,89 +173,80 @@ def tag_param(tag, tests):
     return [pytest.param(*test, id=f"{tag}-{i}") for i, test in enumerate(tests)]
 
 
-@pytest.mark.parametrize(
-    ["text", "expected"],
-    [
-        *tag_param(
+# every kind of url `_process_url` knows about, with the tag it should produce.
+# These are also the benchmark corpus
+provider_tests = {
+    "slack": [
+        ("https://testing.slack.com/CABC123/p1625868226148700", "slack"),
+        (
+            "https://testing.slack.com/CABC123/p1625868226148700?thread_ts=1625836374.142200&cid=CJJJKKHKJ",
             "slack",
-            [
-                ("https://testing.slack.com/CABC123/p1625868226148700", "slack"),
-                (
-                    "https://testing.slack.com/CABC123/p1625868226148700?thread_ts=1625836374.142200&cid=CJJJKKHKJ",
-                    "slack",
-                ),
-                (
-                    "https://files.slack.com/files-tmb/T01CQK9PK7W/image_from_ios_720.png",
-                    "slack",
-                ),
-            ],
         ),
-        *tag_param(
-            "zappy",
-            [
-                (
-                    "https://cdn.zappy.app/e8ce0534c810f372effc10a1bdb87280.png",
-                    "screenshot",
-                )
-            ],
+        (
+            "https://files.slack.com/files-tmb/T01CQK9PK7W/image_from_ios_720.png",
+            "slack",
         ),
-        *tag_param("github", github_tests),
-        *tag_param(
-            "hosted_github",
-            [
-                (url.replace("https://github.com", "https://hosted.git.test.com"), tag)
-                for url, tag in github_tests
-            ],
+    ],
+    "zappy": [
+        (
+            "https://cdn.zappy.app/e8ce0534c810f372effc10a1bdb87280.png",
+            "screenshot",
+        )
+    ],
+    "github": github_tests,
+    "hosted_github": [
+        (url.replace("https://github.com", "https://hosted.git.test.com"), tag)
+        for url, tag in github_tests
+    ],
+    "gist": [
+        (
+            "https://gist.github.com/xavdid/bb2ae92d7e13aa76738e0484a062ee5e",
+            "gist",
         ),
-        *tag_param(
+        # hosted gists have a slightly different path
+        (
+            "https://hosted.git.test.com/gist/xavdid/bb2ae92d7e13aa76738e0484a062ee5e",
             "gist",
-            [
-                (
-                    "https://gist.github.com/xavdid/bb2ae92d7e13aa76738e0484a062ee5e",
-                    "gist",
-                ),
-                # hosted gists have a slightly different path
-                (
-                    "https://hosted.git.test.com/gist/xavdid/bb2ae92d7e13aa76738e0484a062ee5e",
-                    "gist",
-                ),
-            ],
         ),
-        *tag_param(
-            "gitlab",
-            [
-                (
-                    "https://gitlab.com/xavdid/some-project/-/issues/1",
-                    "xavdid/some-project#1",
-                ),
-                (
-                    "https://gitlab.com/xavdid/some-project/-/merge_requests/2",
-                    "xavdid/some-project!2",
-                ),
-                (
-                    "https://gitlab.com/xavdid/some-other-project/-/commit/11530b842858ccc0c915507b8f27af015a247fae",
-                    "xavdid/some-other-project@11530b84",
-                ),
-                (
-                    "https://gitlab.com/xavdid/team/some-other-project/-/merge_requests/50",
-                    "xavdid/team/some-other-project!50",
-                ),
-                (
-                    "https://gitlab.com/xavdid/team/some-other-project/-/commit/11530b842858ccc0c915507b8f27af015a247fae",
-                    "xavdid/team/some-other-project@11530b84",
-                ),
-                ("https://gitlab.com/xavdid/some-project/", "gitlab"),
-                ("https://gitlab.com/-/profile/account", "gitlab"),
-            ],
+    ],
+    "gitlab": [
+        (
+            "https://gitlab.com/xavdid/some-project/-/issues/1",
+            "xavdid/some-project#1",
         ),
-        *tag_param(
-            "generic",
-            [
-                ("https://neat.com/cool/whoa?asdf=asdf", "neat.com"),
-                ("https://blah.co.uk/cool/whoa?asdf=asdf", "blah.co.uk"),
-                ("https://startup.io/cool/whoa?asdf=asdf", "startup.io"),
-            ],
+        (
+            "https://gitlab.com/xavdid/some-project/-/merge_requests/2",
+            "xavdid/some-project!2",
         ),
+        (
+            "https://gitlab.com/xavdid/some-other-project/-/commit/11530b842858ccc0c915507b8f27af015a247fae",
+            "xavdid/some-other-project@11530b84",
+        ),
+        (
+            "https://gitlab.com/xavdid/team/some-other-project/-/merge_requests/50",
+            "xavdid/team/some-other-project!50",
+        ),
+        (
+            "https://gitlab.com/xavdid/team/some-other-project/-/commit/11530b842858ccc0c915507b8f27af015a247fae",
+            "xavdid/team/some-other-project@11530b84",
+        ),
+        ("https://gitlab.com/xavdid/some-project/", "gitlab"),
+        ("https://gitlab.com/-/profile/account", "gitlab"),
+    ],
+    "generic": [
+        ("https://neat.com/cool/whoa?asdf=asdf", "neat.com"),
+        ("https://blah.co.uk/cool/whoa?asdf=asdf", "blah.co.uk"),
+        ("https://startup.io/cool/whoa?asdf=asdf", "startup.io"),
+    ],
+}
+
+
+@pytest.mark.parametrize(
+    ["text", "expected"],
+    [
+        param
+        for tag, tests in provider_tests.items()
+        for param in tag_param(tag, tests)
     ],
 )
 def test_process_url_no_change(text, expected):
@@ -242,7 +280,7 @@ def test_hosted_jira(text, expected):
     assert _process_url(text) == expected
 
 
-@patch("src.super_paste.JIRA_URL", "https://asdf.com")
+@patch("src.super_paste.JIRA_ROUTES", routes("https://asdf.com"))
 @pytest.mark.parametrize(
     ["text", "expected"],
     [
@@ -269,7 +307,7 @@ def test_custom_jira(text, expected):
     assert _process_url(text) == expected
 
 
-@patch("src.super_paste.GHE_URL", "https://asdf.com")
+@patch("src.super_paste.GHE_ROUTES", routes("https://asdf.com", GHE_TEMPLATE))
 @pytest.mark.parametrize(
     ["text", "expected"],
     [
@@ -305,6 +343,206 @@ def test_custom_ghe(text, expected):
     assert _process_url(text) == expected
 
 
+@pytest.mark.parametrize(
+    ["host", "provider"],
+    [
+        ("github.com", GITHUB),
+        ("gist.github.com", GIST),
+        ("api.github.com", DEFAULT),
+        ("testing.slack.com", SLACK),
+        ("a.b.slack.com", SLACK),
+        ("slack.com", DEFAULT),  # only subdomains
+        ("test.atlassian.net", JIRA),
+        ("gitlab.com", GITLAB),
+        ("code.gitlab.com", GITLAB),
+        ("mygitlab.com", GITLAB),
+        ("neat.com", DEFAULT),
+        ("com", DEFAULT),
+        ("", DEFAULT),
+        ("testing..slack.com", SLACK),  # an empty label doesn't break the lookup
+    ],
+)
+def test_lookup_host(host, provider):
+    assert _lookup_host(host) is provider
+
+
+@patch("src.super_paste.HOST_CACHE_SIZE", 2)
+def test_host_cache_stays_small():
+    with patch("src.super_paste._HOST_CACHE", {}) as cache:
+        for host in ["a.slack.com", "github.com", "gitlab.com", "a.slack.com"]:
+            _lookup_host(host)
+        assert len(cache) <= 2
+        assert _lookup_host("a.slack.com") is SLACK
+
+
+@patch("src.super_paste.JIRA_ROUTES", routes("https://github.com/jira"))
+def test_configured_urls_beat_hosts():
+    assert _process_url("https://github.com/jira/browse/ABC-123") == (
+        "ABC-123",
+        "https://github.com/jira/browse/ABC-123",
+    )
+
+
+@patch("src.super_paste.JIRA_ROUTES", routes("https://testing.slack.com"))
+def test_configured_urls_dont_beat_earlier_providers():
+    assert _process_url("https://testing.slack.com/ABC-123")[0] == "slack"
+
+
+@patch(
+    "src.super_paste.JIRA_ROUTES",
+    Routes(
+        _load_instances(
+            "https://one.atlassian.net",
+            [
+                "https://jira.two.com/",
+                {
+                    "url": "https://corp.com/jira",
+                    "template": "{project}: {issue}",
+                    "projects": ["OPS"],
+                },
+            ],
+            JIRA_TEMPLATE,
+        )
+    ),
+)
+@pytest.mark.parametrize(
+    ["text", "expected"],
+    [
+        (
+            "https://jira.two.com/browse/ABC-1",
+            ("ABC-1", "https://jira.two.com/browse/ABC-1"),
+        ),
+        (
+            "https://corp.com/jira/browse/OPS-1",
+            ("OPS: OPS-1", "https://corp.com/jira/browse/OPS-1"),
+        ),
+        # other paths on the same host aren't jira
+        ("https://corp.com/wiki/OPS-1", ("corp.com", "https://corp.com/wiki/OPS-1")),
+    ],
+)
+def test_jira_instances(text, expected):
+    assert _process_url(text) == expected
+
+
+@patch(
+    "src.super_paste.JIRA_ROUTES",
+    Routes(
+        _load_instances(
+            "https://one.atlassian.net",
+            [
+                {
+                    "url": "https://corp.com/jira",
+                    "template": "{project}: {issue}",
+                    "projects": ["OPS"],
+                }
+            ],
+            JIRA_TEMPLATE,
+        )
+    ),
+)
+def test_jira_instances_route_tags_by_project():
+    assert _process_text("OPS-1") == (
+        "[OPS: OPS-1](https://corp.com/jira/browse/OPS-1)"
+    )
+    assert _process_text("ABC-1") == (
+        "[ABC-1](https://test.atlassian.net/browse/ABC-1)"
+    )
+
+
+@patch(
+    "src.super_paste.GHE_ROUTES",
+    Routes(
+        [
+            Instance("https://git.corp.com", "{repo}#{number}"),
+            Instance("https://corp.com/git", GHE_TEMPLATE),
+        ]
+    ),
+)
+def test_ghe_instances():
+    assert _process_url("https://git.corp.com/a/b/pull/1") == (
+        "b#1",
+        "https://git.corp.com/a/b/pull/1",
+    )
+    assert _process_url("https://corp.com/git/gist/abc")[0] == "gist"
+
+
+def test_routes_scale():
+    routes = Routes(
+        Instance(f"https://jira{i}.corp.com/{i}", JIRA_TEMPLATE) for i in range(1000)
+    )
+    # one host, one candidate, however many instances there are
+    assert len(routes.by_host["jira999.corp.com"]) == 1
+    instance = routes.match(parse_url("https://jira999.corp.com/999/browse/A-1"))
+    assert instance and instance.url == "https://jira999.corp.com/999"
+    assert routes.match(parse_url("https://jira999.corp.com/1/browse/A-1")) is None
+
+
+def test_routes_most_specific_path_wins():
+    routes = Routes(
+        [
+            Instance("https://corp.com", JIRA_TEMPLATE),
+            Instance("https://corp.com/jira", JIRA_TEMPLATE),
+        ]
+    )
+    instance = routes.match(parse_url("https://corp.com/jira/browse/A-1"))
+    assert instance and instance.url == "https://corp.com/jira"
+
+
+@patch("src.super_paste._rules_loaded", True)
+@patch(
+    "src.super_paste._rules",
+    compile_rules([{"host": "github.com", "path": "/corp/**", "tag": "internal"}]),
+)
+def test_rules_beat_providers():
+    assert _process_url("https://github.com/corp/thing") == (
+        "internal",
+        "https://github.com/corp/thing",
+    )
+    # anything the rules don't match falls through to the providers
+    assert _process_url("https://github.com/xavdid/thing")[0] == "github"
+
+
+def test_errors_dont_echo_huge_inputs():
+    with pytest.raises(ValueError) as e:
+        _process_url("a" * 1_000_000 + " https://neat.com")
+    assert len(str(e.value)) < 200
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "see ABC-123\n" * 10_000,
+        "log line https://neat.com\n" * 10_000,
+        "A" * 1_000_000,
+        "https://neat.com is a site\n" * 10_000,
+        "[x](" * 100_000,
+    ],
+)
+def test_huge_clipboards_pass_through(text):
+    # untouched, and not even copied
+    assert main_func(text) is text
+
+
+def test_huge_lists_of_links_are_still_formatted():
+    # release notes, say
+    text = "".join(
+        f"https://github.com/xavdid/typed-install/pull/{i}\n" for i in range(400)
+    )
+    assert len(text) > LARGE_INPUT
+
+    lines = main_func(text).splitlines()
+    assert len(lines) == 400
+    assert lines[-1] == (
+        "- [xavdid/typed-install#399]"
+        "(https://github.com/xavdid/typed-install/pull/399)"
+    )
+
+
+def test_huge_urls_are_still_formatted():
+    url = "https://neat.com/?q=" + "a" * 100_000
+    assert main_func(url) == f"[neat.com]({url})"
+
+
 @pytest.mark.parametrize(
     "text",
     [
@@ -312,6 +550,8 @@ def test_custom_ghe(text, expected):
         "https://gitlab.com/some-other-project/-/issues/50",
         # too many segments
         "https://gitlab.com/xavdid/subteam/thing/some-other-project/-/issues/50",
+        # right number of segments, wrong shape
+        "https://gitlab.com/-/merge_requests//ABC-1issues/#browse/a#",
     ],
 )
 def test_ivalid_gitlab_raises(text):
@@ -330,6 +570,34 @@ def test_re_paste_markdown_links(text):
     assert main_func(text) == text
 
 
+@pytest.mark.parametrize(
+    ["text", "expected"],
+    [
+        (
+            "https://github.com/a/b/pull/1\nhttps://github.com/a/b/pull/2\n",
+            "- [a/b#1](https://github.com/a/b/pull/1)\n"
+            "- [a/b#2](https://github.com/a/b/pull/2)",
+        ),
+        (
+            "- https://github.com/a/b/pull/1\n- ABC-12",
+            "- [a/b#1](https://github.com/a/b/pull/1)\n"
+            "- [ABC-12](https://test.atlassian.net/browse/ABC-12)",
+        ),
+        (
+            "https://github.com/a/b/pull/1, https://neat.com",
+            "[a/b#1](https://github.com/a/b/pull/1), [neat.com](https://neat.com)",
+        ),
+        # one bad link doesn't lose the rest
+        (
+            "https://gitlab.com/a/-/issues/1 https://neat.com",
+            "https://gitlab.com/a/-/issues/1, [neat.com](https://neat.com)",
+        ),
+    ],
+)
+def test_multiple_links(text, expected):
+    assert main_func(text) == expected
+
+
 @pytest.mark.parametrize(
     "text",
     [
@@ -434,3 +702,182 @@ def test_main_calling_pattern_url(
     # non-relevant functions aren't called
     assert not mocked_custom_text.called
     assert not mocked_process_text.called
+
+
+@pytest.mark.parametrize(
+    ["line", "expected"],
+    [
+        ("nothing to see here", "nothing to see here"),
+        (
+            "fixed in https://github.com/xavdid/typed-install/pull/3 today",
+            "fixed in [xavdid/typed-install#3](https://github.com/xavdid/typed-install/pull/3) today",
+        ),
+        (
+            "see PDE-123.",
+            "see [PDE-123](https://test.atlassian.net/browse/PDE-123).",
+        ),
+        # trailing punctuation stays outside the link
+        ("go to https://neat.com/cool.", "go to [neat.com](https://neat.com/cool)."),
+        (
+            "both https://neat.com and ABC-1",
+            "both [neat.com](https://neat.com) and [ABC-1](https://test.atlassian.net/browse/ABC-1)",
+        ),
+        # existing links, code spans and autolinks are untouched
+        ("already [neat](https://neat.com)", "already [neat](https://neat.com)"),
+        ("run `curl https://neat.com` now", "run `curl https://neat.com` now"),
+        ("<https://neat.com>", "<https://neat.com>"),
+        ("more info at go/thing", "more info at [go/thing](http://go/thing)"),
+        # tags need to be whole words
+        ("lower abc-123 and XABC-123x", "lower abc-123 and XABC-123x"),
+        # unformattable urls are left as-is
+        (
+            "https://gitlab.com/some-other-project/-/issues/50",
+            "https://gitlab.com/some-other-project/-/issues/50",
+        ),
+        # parens in a url are part of it, if they're balanced
+        (
+            "see https://en.wikipedia.org/wiki/Foo_(bar) ok",
+            "see [en.wikipedia.org](https://en.wikipedia.org/wiki/Foo_(bar)) ok",
+        ),
+        ("(see https://neat.com/a)", "(see [neat.com](https://neat.com/a))"),
+        (
+            "[wiki](https://en.wikipedia.org/wiki/Foo_(bar))",
+            "[wiki](https://en.wikipedia.org/wiki/Foo_(bar))",
+        ),
+        # shortcut and full reference links
+        ("see [ABC-1] and [docs][ABC-2]", "see [ABC-1] and [docs][ABC-2]"),
+        (
+            "- [ ] ABC-1",
+            "- [ ] [ABC-1](https://test.atlassian.net/browse/ABC-1)",
+        ),
+    ],
+)
+def test_linkify_line(line, expected):
+    assert linkify_line(line) == expected
+
+
+def test_linkify_lines_skips_code_fences():
+    lines = ["ABC-1\n", "```\n", "ABC-2\n", "```\n", "ABC-3\n"]
+
+    assert list(linkify_lines(lines)) == [
+        "[ABC-1](https://test.atlassian.net/browse/ABC-1)\n",
+        "```\n",
+        "ABC-2\n",
+        "```\n",
+        "[ABC-3](https://test.atlassian.net/browse/ABC-3)\n",
+    ]
+
+
+@patch("src.super_paste._project_index", None)
+@patch("src.super_paste.JIRA_PROJECTS", {"ABC": "https://other.atlassian.net"})
+def test_jira_projects():
+    assert _process_text("UTF-8 broke ABC-12") == (
+        "[ABC-12](https://other.atlassian.net/browse/ABC-12)"
+    )
+    assert _process_text("UTF-8 broke XYZ-12") == "UTF-8 broke XYZ-12"
+    assert linkify_line("UTF-8 broke ABC-12") == (
+        "UTF-8 broke [ABC-12](https://other.atlassian.net/browse/ABC-12)"
+    )
+
+
+def test_stream():
+    out = StringIO()
+    stream(StringIO("a https://neat.com\nb\n"), out)
+
+    assert out.getvalue() == "a [neat.com](https://neat.com)\nb\n"
+
+
+SCRIPT = Path(__file__).parent / "src" / "super_paste.py"
+
+# microseconds spent importing modules when pasting a plain jira tag, on top of
+# what the interpreter imports by itself. It measured ~13ms when recorded;
+# the slack is for slower machines. If this fails, find the new import before
+# raising the number
+IMPORT_BUDGET_US = 40_000
+
+
+def run_script(*args: str, stdin: bytes = b"") -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, str(SCRIPT), *args], input=stdin, capture_output=True
+    )
+
+
+@pytest.mark.parametrize("args", [["--stdin"], []])
+def test_stdin(args):
+    res = run_script(*args, stdin=b"https://github.com/xavdid/typed-install/pull/3")
+    assert res.stdout == (
+        b"[xavdid/typed-install#3](https://github.com/xavdid/typed-install/pull/3)"
+    )
+
+
+def test_stdin_streams_huge_clipboards():
+    # far bigger than argv allows, and not valid utf-8
+    data = b"log line ABC-123 caf\xe9\n" * 500_000
+    assert run_script("--stdin", stdin=data).stdout == data
+
+
+def frames(*bodies: str) -> bytes:
+    return b"".join(b"%d\n%s" % (len(b.encode()), b.encode()) for b in bodies)
+
+
+def test_framed():
+    res = run_script("--framed", stdin=frames("ABC-123", "multi\nline", "é"))
+
+    assert res.stdout == frames(
+        "[ABC-123](https://test.atlassian.net/browse/ABC-123)", "multi\nline", "é"
+    )
+
+
+def test_framed_invalid():
+    res = run_script("--framed", stdin=frames("ABC-123") + b"nope\n")
+
+    # everything before the bad frame was answered
+    assert res.stdout == frames("[ABC-123](https://test.atlassian.net/browse/ABC-123)")
+    assert res.returncode == 1
+    assert b"invalid frame header" in res.stderr
+
+
+def _import_times(*args: str) -> dict:
+    """
+    runs python with `-X importtime` and returns the cumulative import time of
+    every imported module, by name. Nested imports (which are already counted
+    in their parent's time) are marked with leading spaces.
+    """
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stderr
+
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        times[name[1:].rstrip()] = int(cumulative)
+    return times
+
+
+@pytest.mark.parametrize(
+    "text", ["ABC-123", "https://github.com/xavdid/typed-install/pull/3"]
+)
+def test_paste_skips_slow_imports(text):
+    imported = {name.strip() for name in _import_times(str(SCRIPT), text)}
+
+    assert "typing" not in imported
+    assert "urllib.parse" not in imported
+    # tracing is off by default, and costs nothing when it is
+    assert "tracing" not in imported
+
+
+def test_text_paste_import_budget():
+    baseline = _import_times("-c", "pass")
+    imported = _import_times(str(SCRIPT), "ABC-123")
+
+    cost = sum(
+        t
+        for name, t in imported.items()
+        if not name.startswith(" ") and name not in baseline
+    )
+    assert cost < IMPORT_BUDGET_US
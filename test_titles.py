@@ -0,0 +1,165 @@
+import json
+from io import StringIO
+from unittest.mock import patch
+
+import pytest
+
+from src.super_paste import (
+    JIRA_TEMPLATE,
+    Routes,
+    _import_titles_command,
+    _load_instances,
+    _title_key,
+    _titles_command,
+)
+from src.super_paste import main as main_func
+from src.titles import TitleIndex, iter_json, titles_from_export
+
+EXPORT = [
+    {
+        "number": 3,
+        "title": "Fix login",
+        "html_url": "https://github.com/xavdid/typed-install/pull/3",
+    },
+    {
+        "iid": 2,
+        "title": "Faster [builds]",
+        "web_url": "https://gitlab.com/xavdid/thing/-/merge_requests/2",
+    },
+    {"key": "PDE-123", "fields": {"summary": "Retry the upload"}},
+    {"key": "go/docs", "title": "The docs"},
+    # missing a title, or not a record at all
+    {"html_url": "https://github.com/xavdid/typed-install/pull/4"},
+    {"html_url": "not a url", "title": "nope"},
+    3,
+]
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = TitleIndex(str(tmp_path / "titles.sqlite3"))
+    yield index
+    index.close()
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1024])
+@pytest.mark.parametrize("lines", [True, False])
+def test_iter_json(chunk_size, lines):
+    records = [*EXPORT, 12345, "a string", [1, [2]]]
+    text = (
+        "\n".join(json.dumps(r) for r in records)
+        if lines
+        else json.dumps(records, indent=2)
+    )
+    assert list(iter_json(StringIO(text), chunk_size=chunk_size)) == records
+
+
+@pytest.mark.parametrize("text", ["", "[]", "\n\n"])
+def test_iter_json_empty(text):
+    assert list(iter_json(StringIO(text))) == []
+
+
+def test_iter_json_invalid():
+    with pytest.raises(ValueError):
+        list(iter_json(StringIO('[{"a": 1}, {"b": ')))
+
+
+def test_titles_from_export():
+    assert list(titles_from_export(EXPORT, _title_key)) == [
+        ("https://github.com/xavdid/typed-install/pull/3", "Fix login"),
+        ("https://gitlab.com/xavdid/thing/-/merge_requests/2", "Faster [builds]"),
+        ("PDE-123", "Retry the upload"),
+        ("go/docs", "The docs"),
+    ]
+
+
+def test_index(index):
+    assert index.add([("a#1", "Fix login"), ("a#2", "Add logout")], batch_size=1) == 2
+    assert index.add([("a#1", "Repair sign in")]) == 1
+    assert len(index) == 2
+
+    assert index.get("a#1") == "Repair sign in"
+    assert index.get("a#3") is None
+    assert index.search("sign") == [("a#1", "Repair sign in")]
+    # replaced titles aren't searchable anymore
+    assert index.search("login") == []
+    assert sorted(index.search("logout OR repair")) == [
+        ("a#1", "Repair sign in"),
+        ("a#2", "Add logout"),
+    ]
+
+    with pytest.raises(ValueError):
+        index.search('"')
+
+
+@patch("src.super_paste.TITLE_INDEX", True)
+def test_pastes_use_titles(tmp_path, index):
+    index.add(titles_from_export(EXPORT, _title_key))
+    path = str(tmp_path / "titles.sqlite3")
+
+    with patch("src.super_paste.TITLES_PATH", path), patch(
+        "src.super_paste._title_index", index
+    ):
+        assert main_func("https://gitlab.com/xavdid/thing/-/merge_requests/2") == (
+            "[xavdid/thing!2: Faster (builds)]"
+            "(https://gitlab.com/xavdid/thing/-/merge_requests/2)"
+        )
+        assert main_func("PDE-123") == (
+            "[PDE-123: Retry the upload](https://test.atlassian.net/browse/PDE-123)"
+        )
+        assert main_func("PDE-124") == (
+            "[PDE-124](https://test.atlassian.net/browse/PDE-124)"
+        )
+
+
+@patch("src.super_paste.TITLE_INDEX", True)
+@patch(
+    "src.super_paste.JIRA_ROUTES",
+    Routes(
+        _load_instances(
+            "https://test.atlassian.net",
+            [{"url": "https://corp.com/jira", "template": "{project}: {issue}"}],
+            JIRA_TEMPLATE,
+        )
+    ),
+)
+def test_titles_dont_depend_on_the_link_text(tmp_path, index):
+    index.add(titles_from_export(EXPORT, _title_key))
+    path = str(tmp_path / "titles.sqlite3")
+
+    with patch("src.super_paste.TITLES_PATH", path), patch(
+        "src.super_paste._title_index", index
+    ):
+        assert main_func("https://corp.com/jira/browse/PDE-123") == (
+            "[PDE: PDE-123: Retry the upload](https://corp.com/jira/browse/PDE-123)"
+        )
+        # however the url is spelled
+        assert main_func(
+            "https://github.com/xavdid/typed-install/pull/3/?w=1#issuecomment-1"
+        ) == (
+            "[xavdid/typed-install#3: Fix login]"
+            "(https://github.com/xavdid/typed-install/pull/3/?w=1#issuecomment-1)"
+        )
+
+
+@patch("src.super_paste.FETCH_TITLES", True)
+@patch("src.super_paste._fetch_titles", side_effect=AssertionError)
+def test_import_never_fetches_pages(_, tmp_path, index):
+    path = tmp_path / "export.json"
+    path.write_text(
+        json.dumps([{"title": "A page", "html_url": "https://neat.com/a/"}])
+    )
+    with patch("src.super_paste._title_index", index):
+        _import_titles_command([str(path)])
+    assert index.get("https://neat.com/a") == "A page"
+
+
+def test_search_before_any_import(tmp_path, capsys):
+    # a fresh machine, where the data folder doesn't exist yet
+    data_dir = tmp_path / "data"
+    with patch("src.super_paste.DATA_DIR", str(data_dir)), patch(
+        "src.super_paste.TITLES_PATH", str(data_dir / "titles.sqlite3")
+    ), patch("src.super_paste._title_index", None):
+        _titles_command(["login"])
+
+    assert capsys.readouterr().out == ""
@@ -0,0 +1,155 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+import src.super_paste as super_paste
+from src.tracing import Tracer, install, read_records, summarize
+
+
+@pytest.fixture
+def tracer(tmp_path):
+    tracer = Tracer(str(tmp_path / "trace.jsonl"))
+    uninstall = install(super_paste, tracer)
+    yield tracer
+    uninstall()
+
+
+def records(tracer):
+    return list(read_records(tracer.path))
+
+
+def test_records_stages_and_provider(tracer):
+    super_paste.main("https://github.com/xavdid/typed-install/pull/3")
+    super_paste.main("ABC-123")
+
+    url, text = records(tracer)
+    assert url["provider"] == "github"
+    assert url["input"] == "https://github.com/xavdid/typed-install/pull/3"
+    assert {"custom_url", "parse_url", "rules", "classify", "format"} <= set(
+        url["stages"]
+    )
+    assert url["total_ms"] >= sum(url["stages"].values())
+
+    assert text["provider"] == "text"
+    assert set(text["stages"]) == {"custom_text", "text"}
+
+
+def test_records_errors(tracer):
+    assert super_paste.paste("https://gitlab.com/a/-/issues/1").startswith(
+        "! Alfred ERR !"
+    )
+
+    (record,) = records(tracer)
+    assert record["error"].startswith("ValueError: unable to parse Gitlab URL")
+    assert record["where"].startswith("super_paste.py:")
+    assert record["where"].endswith("in _format_gitlab")
+
+
+def test_startup_only_recorded_once(tracer):
+    tracer.startup = {"load": 1.0}
+    super_paste.main("ABC-1")
+    super_paste.main("ABC-2")
+
+    first, second = records(tracer)
+    assert first["startup"] == {"load": 1.0}
+    assert "startup" not in second
+
+
+def test_nested_calls_are_one_record(tracer):
+    super_paste.linkify_line("see ABC-1 and https://neat.com")
+    # linkify_line isn't traced itself, so each token is its own call
+    assert [r["input"] for r in records(tracer)] == ["ABC-1", "https://neat.com"]
+
+
+def test_long_inputs_are_truncated(tracer):
+    super_paste.main("a" * 10_000)
+
+    (record,) = records(tracer)
+    assert len(record["input"]) == 200
+    assert record["length"] == 10_000
+
+
+def test_uninstall(tmp_path):
+    main = super_paste.main
+    formatter = super_paste.GITHUB.formatter
+
+    uninstall = install(super_paste, Tracer(str(tmp_path / "trace.jsonl")))
+    assert super_paste.main is not main
+    uninstall()
+
+    assert super_paste.main is main
+    assert super_paste.GITHUB.formatter is formatter
+
+
+def test_rotation(tmp_path):
+    path = str(tmp_path / "trace.jsonl")
+    tracer = Tracer(path, max_bytes=200, backups=2)
+    for i in range(10):
+        tracer.write({"i": i, "padding": "x" * 100})
+
+    # only the newest records survive, oldest first
+    kept = [r["i"] for r in read_records(path, backups=2)]
+    assert kept == list(range(10 - len(kept), 10))
+    assert not (tmp_path / "trace.jsonl.3").exists()
+
+
+def test_read_skips_broken_lines(tmp_path):
+    path = tmp_path / "trace.jsonl"
+    path.write_text(json.dumps({"a": 1}) + "\n{\"a\": \n")
+
+    assert list(read_records(str(path))) == [{"a": 1}]
+
+
+def test_summarize(tracer):
+    for text in ["ABC-1", "https://github.com/a/b/pull/1", "https://gitlab.com/a"]:
+        super_paste.paste(text)
+    super_paste.paste("https://gitlab.com/a/-/issues/1")
+
+    report = "\n".join(summarize(records(tracer), slowest=2))
+    assert "calls: 4 (1 errors)" in report
+    assert "config hooks:" in report
+    assert "  github           1" in report
+    assert "  gitlab           2" in report
+    assert "ValueError: unable to parse Gitlab URL" in report
+    assert report.count("ms  ") == 2
+
+
+def test_summarize_empty():
+    assert "no traces yet" in summarize([])[0]
+
+
+# what `TRACE = True` does, without editing config.py
+TRACED_PASTE = """
+import super_paste
+super_paste._install_tracing()
+super_paste.paste("ABC-123")
+"""
+
+
+def test_stats_from_a_terminal_reads_alfred_traces(tmp_path):
+    src = Path(super_paste.__file__).parent
+    terminal = {**os.environ, "HOME": str(tmp_path)}
+    for name in ["alfred_workflow_cache", "alfred_workflow_data"]:
+        terminal.pop(name, None)
+    alfred = {
+        **terminal,
+        "alfred_workflow_cache": str(tmp_path / "cache"),
+        "alfred_workflow_data": str(tmp_path / "data"),
+    }
+
+    subprocess.run(
+        [sys.executable, "-c", TRACED_PASTE], check=True, env=alfred, cwd=src
+    )
+    res = subprocess.run(
+        [sys.executable, "super_paste.py", "--stats"],
+        capture_output=True,
+        text=True,
+        check=True,
+        env=terminal,
+        cwd=src,
+    )
+    assert res.stdout.startswith("calls: 1 ")